@@ -1,106 +1,202 @@
-import json
+from dataclasses import asdict
 
+from .artifacts import ArtifactStore
+from .cache import LLMCache, set_llm_cache
 from .candidate import Candidate
+from .candidate_pool import CandidatePool, create_candidate_pool
+from .evidence import EvidenceCollector
+from .fake_llm import (
+    Cassette,
+    CassetteMode,
+    FakeBackend,
+    set_cassette,
+    set_llm_backend,
+)
 from .interview_simulator import InterviewSimulator
-from .interviewer import Interviewer
+from .interviewer import Interviewer, SummaryMode
 from .job_description import create_job_description, JobDescription
+from .metrics import interview_context, MetricsRecorder, set_metrics_recorder
+from .profiling import (
+    profile_phase,
+    Profiler,
+    set_profiler,
+)
+from .ratelimit import (
+    Priority,
+    priority_context,
+    RateLimiter,
+    set_rate_limiter,
+)
+from .routing import Route, Router, set_router
+from .hedging import Hedger, set_hedger
+from .batch import main_batch
+from .shards import main_shards, merge_shards
+from .streaming import (
+    FileSink,
+    QueueSink,
+    StdoutSink,
+    StreamHub,
+    SubscriberSink,
+    set_stream_hub,
+)
+from .runner import arun_interviews, run_interviews
+from .transcript import Transcript, Turn
 from .util import BASE_DIR, print_limit
 
 
 def main(company, job, area, years_of_experience_job, candidate_name,
          years_of_experience_candidate, work_experiences, data_dir,
-         force_reload, streaming=True):
+         force_reload, streaming=True, summary_workers=1,
+         prepersonalize=False, summary_mode=SummaryMode.FULL,
+         summary_token_budget=None,
+         memory_token_budget=None, pipelined=False):
+    """Runs every stage, loading from the artifact store in
+    `data_dir/artifacts` the ones whose inputs did not change. The outputs
+    are also written to `data_dir`."""
+    store = ArtifactStore(data_dir/'artifacts')
 
     # Create job description
     print('Creating job description...\n')
 
-    job_description_file = data_dir/'job_description.json'
-
-    if not job_description_file.exists() or force_reload:
-        job_description = create_job_description(
-            company=company,
-            job=job,
-            years_of_experience=years_of_experience_job,
-            area=area,
-            streaming=streaming
+    with profile_phase('job_description'):
+        job_key, job_description, built = store.load_or_build(
+            'job_description',
+            {
+                'company': company,
+                'job': job,
+                'years_of_experience': years_of_experience_job,
+                'area': area
+            },
+            lambda key: create_job_description(
+                company=company,
+                job=job,
+                years_of_experience=years_of_experience_job,
+                area=area,
+                streaming=streaming
+            )._asdict(),
+            force=force_reload
         )
-        job_description.save(job_description_file)
-    else:
-        with job_description_file.open('r') as file:
-            job_description = JobDescription(**json.load(file))
+    job_description = JobDescription(**job_description)
+    job_description.save(data_dir/'job_description.json')
 
-    if not streaming or job_description_file.exists():
+    if not streaming or not built:
         print_limit(job_description.text)
     print('\n\n' + '*' * 80 + '\n')
 
     # Create candidate
     print('Creating the candidate...\n')
 
-    filename = candidate_name.lower().replace(' ', '_')
-    candidate_file = data_dir/f'{filename}.json'
-
-    if not candidate_file.exists() or force_reload:
-        candidate = Candidate(
-            name=candidate_name,
-            job=job,
-            years_of_experience=years_of_experience_candidate,
-            area=area,
-            requirements=job_description.requirements,
-            work_experiences=work_experiences,
-            company=company,
-            streaming=streaming
+    with profile_phase('candidate'):
+        candidate_key, candidate, built = store.load_or_build(
+            'candidate',
+            {
+                'name': candidate_name,
+                'job': job,
+                'years_of_experience': years_of_experience_candidate,
+                'area': area,
+                'work_experiences': work_experiences,
+                'company': company
+            },
+            lambda key: Candidate(
+                name=candidate_name,
+                job=job,
+                years_of_experience=years_of_experience_candidate,
+                area=area,
+                requirements=job_description.requirements,
+                work_experiences=work_experiences,
+                company=company,
+                streaming=streaming
+            ).to_dict(),
+            deps={'job_description': job_key},
+            force=force_reload
         )
-        candidate.save(candidate_file)
-    else:
-        with candidate_file.open('r') as file:
-            candidate = Candidate(**json.load(file), streaming=streaming)
+    candidate = Candidate(**candidate, streaming=streaming,
+                          memory_token_budget=memory_token_budget)
+    filename = candidate_name.lower().replace(' ', '_')
+    candidate.save(data_dir/f'{filename}.json')
 
-    if not streaming or candidate_file.exists():
+    if not streaming or not built:
         print_limit(candidate.resume)
     print('\n\n' + '*' * 80 + '\n')
 
     # Simulate the interview
     print('Simulating the interview...\n')
 
-    full_transcript_file = data_dir/"full_transcript.txt"
-    short_transcript_file = data_dir/"short_transcript.txt"
-
-    if not short_transcript_file.exists() or force_reload:
+    # In incremental mode, the evidence of each question block is extracted
+    # during the interview
+    evidence = None
+
+    def simulate_interview(key):
+        nonlocal evidence
+        checkpoint_file = store.checkpoint_file(key)
+        # The turns it resumes from are kept next to it, where the interviews
+        # of other candidates in `data_dir` do not write
+        transcript_file = checkpoint_file.with_suffix('.jsonl')
+        if force_reload:
+            checkpoint_file.unlink(missing_ok=True)
+        # A resumed interview keeps the plan saved in the checkpoint
+        resuming = checkpoint_file.exists()
         interviewer = Interviewer(
             candidate_name=candidate_name,
             job=job,
             area=area,
             company=company,
-            streaming=streaming
+            streaming=streaming,
+            prepersonalize=prepersonalize and not resuming
         )
+        if summary_mode == SummaryMode.INCREMENTAL:
+            evidence = EvidenceCollector(interviewer)
         simulator = InterviewSimulator(
             interviewer=interviewer,
             candidate=candidate,
-            job_description=job_description
+            job_description=job_description,
+            transcript_file=transcript_file,
+            checkpoint_file=checkpoint_file,
+            pipelined=pipelined,
+            on_block_complete=(None if evidence is None
+                               else evidence.add_block)
         )
+        if simulator.load_checkpoint():
+            print('Resuming the interview...\n')
+            print_limit(simulator.full_transcript)
+            if prepersonalize:
+                interviewer.personalize_plan(background=True)
         simulator.start()
-
-        with full_transcript_file.open('w') as file:
-            file.write(simulator.full_transcript)
-        with short_transcript_file.open('w') as file:
-            file.write(simulator.short_transcript)
-        full_transcript = simulator.full_transcript
-        short_transcript = simulator.short_transcript
-    else:
-        with full_transcript_file.open('r') as file:
-            full_transcript = file.read()
-        with short_transcript_file.open('r') as file:
-            short_transcript = file.read()
+        checkpoint_file.unlink(missing_ok=True)
+        transcript_file.unlink(missing_ok=True)
+        return {
+            'full_transcript': simulator.full_transcript,
+            'short_transcript': simulator.short_transcript,
+            'turns': [asdict(turn) for turn in simulator.transcript]
+        }
+
+    with profile_phase('interview'):
+        interview_key, interview, built = store.load_or_build(
+            'interview',
+            {'candidate_name': candidate_name, 'job': job, 'area': area,
+             'company': company, 'memory_token_budget': memory_token_budget},
+            simulate_interview,
+            deps={'job_description': job_key, 'candidate': candidate_key},
+            force=force_reload
+        )
+    full_transcript = interview['full_transcript']
+    short_transcript = interview['short_transcript']
+    Transcript(path=data_dir/'transcript.jsonl').restore(
+        Turn(**turn) for turn in interview['turns']
+    )
+    if not built:
         print_limit(full_transcript)
+    with (data_dir/'full_transcript.txt').open('w') as file:
+        file.write(full_transcript)
+    with (data_dir/'short_transcript.txt').open('w') as file:
+        file.write(short_transcript)
 
     print('\n\n' + '*' * 80 + '\n')
 
     # Summarize the interview
     print('Summarizing the interview...\n')
 
-    summary_file = data_dir/'summary.txt'
-
-    if not summary_file.exists() or force_reload:
+    def summarize_interview(key):
         interviewer = Interviewer(
             candidate_name=candidate_name,
             job=job,
@@ -108,12 +204,26 @@ def main(company, job, area, years_of_experience_job, candidate_name,
             company=company,
             streaming=streaming
         )
-        summary = interviewer.summarize_interview(short_transcript)
-        with summary_file.open('w') as file:
-            file.write(summary)
-    else:
-        with summary_file.open('r') as file:
-            summary = file.read()
+        return {'summary': interviewer.summarize_interview(
+            short_transcript,
+            max_workers=summary_workers,
+            mode=summary_mode,
+            token_budget=summary_token_budget,
+            evidence=evidence
+        )}
+
+    with profile_phase('summary'):
+        _, summary, built = store.load_or_build(
+            'summary',
+            {'mode': summary_mode, 'token_budget': summary_token_budget},
+            summarize_interview,
+            deps={'interview': interview_key},
+            force=force_reload
+        )
+    summary = summary['summary']
+    with (data_dir/'summary.txt').open('w') as file:
+        file.write(summary)
+    if not built:
         print_limit(summary)
 
     print('\n\n' + '*' * 80 + '\n')
@@ -1,8 +1,38 @@
 import argparse
+from pathlib import Path
+import random
+
 from . import main
+from .cache import LLMCache, set_llm_cache
+from .fake_llm import (
+    Cassette,
+    CassetteMode,
+    FakeBackend,
+    set_cassette,
+    set_llm_backend,
+)
+from .hedging import HEDGED_STAGES, Hedger, set_hedger
+from .interviewer import SummaryMode
+from .metrics import (
+    interview_context,
+    MetricsRecorder,
+    set_metrics_recorder,
+)
+from .profiling import Profiler, set_profiler
+from .ratelimit import RateLimiter, set_rate_limiter
+from .routing import Router, set_router
+from .batch import main_batch
+from .candidate_pool import main_pool
+from .shards import main_shards
+from .stages import Stage
+from .streaming import FileSink, StdoutSink, StreamHub, set_stream_hub
 from .util import BASE_DIR
 
 
+def stage_list(value):
+    return [Stage(stage) for stage in value.split(',')]
+
+
 parser = argparse.ArgumentParser(description='AI Interviewer agent')
 parser.add_argument(
     '--company',
@@ -41,13 +71,372 @@ parser.add_argument(
     help='Number of work experiences')
 parser.add_argument(
     '--data_dir',
-    type=str,
+    type=Path,
     default=BASE_DIR/'data',
     help='Data directory path')
+parser.add_argument(
+    '--summary_workers',
+    type=int,
+    default=1,
+    help='Number of summary questions, or of map_reduce evidence '
+         'extractions, sent concurrently')
+parser.add_argument(
+    '--summary_mode',
+    type=SummaryMode,
+    choices=[mode.value for mode in SummaryMode],
+    default=SummaryMode.FULL,
+    help='full: every summary question is sent with the whole transcript. '
+         'map_reduce: the evidence of each question is extracted first, '
+         '--summary_workers at a time, and the summary questions use that '
+         'evidence only. '
+         'incremental: the evidence of each question is extracted during '
+         'the interview, and merged in one call at the end. structured: '
+         'all the summary questions are answered in one JSON call')
+parser.add_argument(
+    '--summary_token_budget',
+    type=int,
+    default=None,
+    help='Estimated prompt tokens per transcript part in map_reduce mode. '
+         'In full mode, longer transcripts switch to map_reduce')
+parser.add_argument(
+    '--memory_token_budget',
+    type=int,
+    default=None,
+    help='Estimated tokens of the conversation the candidate keeps verbatim; '
+         'older exchanges are summarized in the background, with one more LLM '
+         'call per summary. By default (or 0), the candidate keeps the last '
+         'four exchanges only')
+parser.add_argument(
+    '--prepersonalize',
+    action='store_true',
+    help='Personalize all the interview questions concurrently up front')
+parser.add_argument(
+    '--pipelined',
+    action='store_true',
+    help='Run each interview as a pipeline, personalizing the upcoming '
+         'questions while the candidate replies')
+parser.add_argument(
+    '--cache',
+    type=Path,
+    default=None,
+    help='SQLite file used to cache LLM responses across runs')
+parser.add_argument(
+    '--cache_stages',
+    type=stage_list,
+    default=None,
+    help='Comma-separated stages whose LLM responses are cached (default: '
+         'all but candidate_reply). Stages: '
+         f'{",".join(stage.value for stage in Stage)}')
+parser.add_argument(
+    '--routes',
+    type=Path,
+    default=None,
+    help='JSON file with the model, temperature, max_tokens, latency_slo '
+         '(seconds) and fallback models of each stage, by stage name, and '
+         '"default" for the others. A model whose recent latency exceeds '
+         'the latency_slo of the stage is replaced by its fallbacks for a '
+         'while')
+parser.add_argument(
+    '--hedge',
+    action='store_true',
+    help='Send a call of the hedged stages a second time when its first '
+         'token is late, and keep the first response to stream')
+parser.add_argument(
+    '--hedge_stages',
+    type=stage_list,
+    default=list(HEDGED_STAGES),
+    help='Comma-separated stages hedged by --hedge (default: '
+         f'{",".join(stage.value for stage in HEDGED_STAGES)})')
+parser.add_argument(
+    '--hedge_quantile',
+    type=float,
+    default=0.95,
+    help='With --hedge, quantile of the recent times to the first token '
+         'after which a call is sent again')
+parser.add_argument(
+    '--hedge_max_rate',
+    type=float,
+    default=0.1,
+    help='With --hedge, at most this fraction of the calls are sent again')
+parser.add_argument(
+    '--llm',
+    choices=['openai', 'fake'],
+    default='openai',
+    help='fake answers offline with canned text (no API key needed)')
+parser.add_argument(
+    '--fake_first_token_latency',
+    type=float,
+    default=0.0,
+    help='Simulated time to first token of the fake LLM, in seconds')
+parser.add_argument(
+    '--fake_token_latency',
+    type=float,
+    default=0.0,
+    help='Simulated time between tokens of the fake LLM, in seconds')
+parser.add_argument(
+    '--cassette',
+    type=Path,
+    default=None,
+    help='JSON lines file where LLM responses are recorded or replayed')
+parser.add_argument(
+    '--cassette_mode',
+    type=CassetteMode,
+    choices=[mode.value for mode in CassetteMode],
+    default=CassetteMode.REPLAY,
+    help='record: save the responses to the cassette. replay: only use '
+         'the responses in the cassette')
+parser.add_argument(
+    '--metrics_report',
+    type=Path,
+    default=None,
+    help='JSON file where the LLM call metrics (tokens, latency, time to '
+         'first token, retries per stage and interview) are written')
+parser.add_argument(
+    '--metrics_prometheus',
+    type=Path,
+    default=None,
+    help='File where the LLM call metrics are written in the Prometheus '
+         'text format')
+parser.add_argument(
+    '--profile',
+    type=Path,
+    default=None,
+    help='JSON file where the wall and CPU time of each phase and of the '
+         'LLM calls per stage are written')
+parser.add_argument(
+    '--profile_python',
+    action='store_true',
+    help='With --profile, also profile the local code with cProfile (CPU '
+         'time, so waiting for the API does not count) and write it next to '
+         'the report as collapsed stacks (.collapsed) and pstats (.pstats)')
+parser.add_argument(
+    '--profile_memory',
+    action='store_true',
+    help='With --profile, also trace the memory allocated in each phase and '
+         'the top allocation sites with tracemalloc')
+parser.add_argument(
+    '--requests_per_minute',
+    type=float,
+    default=None,
+    help='Maximum LLM requests per minute, shared by every interview')
+parser.add_argument(
+    '--tokens_per_minute',
+    type=float,
+    default=None,
+    help='Maximum LLM tokens per minute (estimated before each request), '
+         'shared by every interview')
+parser.add_argument(
+    '--rate_limit_file',
+    type=Path,
+    default=None,
+    help='File holding the rate limits state, to share them between '
+         'processes')
+parser.add_argument(
+    '--stream_file',
+    type=str,
+    default=None,
+    help='Also stream the LLM output to this file. A {session} field in the '
+         'path makes one file per interview')
+parser.add_argument(
+    '--seed',
+    type=int,
+    default=None,
+    help='Seed of the question sampling, to replay an interview')
 parser.add_argument(
     '-f', '--force-reload',
     action='store_true',
     help='Force reload data')
 
-args = parser.parse_args()
-main(**vars(args))
+
+subparsers = parser.add_subparsers(dest='command')
+batch_parser = subparsers.add_parser(
+    'batch',
+    help='Screen many candidates at once. The options above are used as '
+         'defaults for the fields missing in the candidates file')
+batch_parser.add_argument(
+    'candidates_file',
+    type=str,
+    help='JSON lines file, one candidate per line')
+batch_parser.add_argument(
+    '--max_workers',
+    type=int,
+    default=16,
+    help='Number of candidates processed in parallel')
+shards_parser = subparsers.add_parser(
+    'shards',
+    help='Screen many candidates in shards run by several worker processes, '
+         'and merge the results into results.jsonl. Run it again to resume '
+         'an interrupted batch')
+shards_parser.add_argument(
+    'candidates_file',
+    type=str,
+    help='JSON lines file, one candidate per line')
+shards_parser.add_argument(
+    '--processes',
+    type=int,
+    default=None,
+    help='Number of worker processes (default: one per CPU)')
+shards_parser.add_argument(
+    '--shard_size',
+    type=int,
+    default=4,
+    help='Number of candidates per shard')
+shards_parser.add_argument(
+    '--max_workers',
+    type=int,
+    default=4,
+    help='Number of candidates processed in parallel by each worker')
+shards_parser.add_argument(
+    '--max_attempts',
+    type=int,
+    default=3,
+    help='Number of times a shard is run before it is given up, when its '
+         'worker process dies')
+pool_parser = subparsers.add_parser(
+    'pool',
+    help='Create a pool of synthetic candidates with different resumes for '
+         'the job of the options above')
+pool_parser.add_argument(
+    'pool_file',
+    type=str,
+    help='Gzipped JSON file the pool is saved to')
+pool_parser.add_argument(
+    '--size',
+    type=int,
+    default=100,
+    help='Number of candidates')
+pool_parser.add_argument(
+    '--resumes_per_request',
+    type=int,
+    default=4,
+    help='Number of resumes created by each LLM request')
+pool_parser.add_argument(
+    '--max_workers',
+    type=int,
+    default=8,
+    help='Number of requests sent in parallel')
+pool_parser.add_argument(
+    '--similarity_threshold',
+    type=float,
+    default=0.5,
+    help='Estimated similarity from which a resume is rejected as a '
+         'near-duplicate of one in the pool')
+
+args = vars(parser.parse_args())
+command = args.pop('command')
+cache_file = args.pop('cache')
+cache_stages = args.pop('cache_stages')
+if args['memory_token_budget'] == 0:
+    args['memory_token_budget'] = None
+seed = args.pop('seed')
+if seed is not None:
+    random.seed(seed)
+llm = args.pop('llm')
+first_token_latency = args.pop('fake_first_token_latency')
+token_latency = args.pop('fake_token_latency')
+if llm == 'fake':
+    set_llm_backend(FakeBackend(first_token_latency, token_latency))
+routes_file = args.pop('routes')
+router = None
+if routes_file is not None:
+    router = Router.from_file(routes_file)
+    set_router(router)
+hedge = args.pop('hedge')
+hedge_stages = args.pop('hedge_stages')
+hedge_quantile = args.pop('hedge_quantile')
+hedge_max_rate = args.pop('hedge_max_rate')
+hedger = None
+if hedge:
+    hedger = Hedger(hedge_stages, quantile=hedge_quantile,
+                    max_rate=hedge_max_rate)
+    set_hedger(hedger)
+cassette_file = args.pop('cassette')
+cassette_mode = args.pop('cassette_mode')
+if cassette_file is not None:
+    set_cassette(Cassette(cassette_file, cassette_mode))
+
+metrics_report = args.pop('metrics_report')
+metrics_prometheus = args.pop('metrics_prometheus')
+recorder = None
+if metrics_report is not None or metrics_prometheus is not None:
+    recorder = MetricsRecorder()
+    set_metrics_recorder(recorder)
+
+profile_file = args.pop('profile')
+profile_python = args.pop('profile_python')
+profile_memory = args.pop('profile_memory')
+profiler = None
+if profile_file is not None:
+    profiler = Profiler(profile_python, profile_memory, recorder)
+    set_metrics_recorder(profiler.recorder)
+    set_profiler(profiler)
+
+requests_per_minute = args.pop('requests_per_minute')
+tokens_per_minute = args.pop('tokens_per_minute')
+rate_limit_file = args.pop('rate_limit_file')
+limiter = None
+if (requests_per_minute is not None or tokens_per_minute is not None
+        or rate_limit_file is not None):
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute,
+                          path=rate_limit_file)
+    set_rate_limiter(limiter)
+
+stream_file = args.pop('stream_file')
+stream_hub = None
+if stream_file is not None:
+    stream_hub = StreamHub([StdoutSink(), FileSink(stream_file)])
+    set_stream_hub(stream_hub)
+
+cache = None
+if cache_file is not None:
+    cache = LLMCache(cache_file, stages=cache_stages)
+    set_llm_cache(cache)
+
+if profiler is not None:
+    profiler.start()
+
+if command == 'batch':
+    main_batch(**args)
+elif command == 'shards':
+    main_shards(**args)
+elif command == 'pool':
+    main_pool(**args)
+else:
+    with interview_context(args['candidate_name']):
+        main(**args)
+
+if profiler is not None:
+    profiler.stop()
+    profiler.save(profile_file)
+    print(profiler.summary())
+
+if cache is not None:
+    for stage, stats in cache.stats().items():
+        print(f'Cache {stage}: {stats["hits"]} hits, {stats["misses"]} misses')
+
+if router is not None:
+    for stage, stats in router.stats().items():
+        models = ', '.join(f'{model} {model_stats["calls"]}'
+                           for model, model_stats in stats['models'].items())
+        print(f'Routes {stage}: {models} call(s), {stats["fallbacks"]} '
+              f'fallback(s)')
+
+if hedger is not None:
+    for stage, stats in hedger.stats().items():
+        print(f'Hedging {stage}: {stats["hedged"]} of {stats["calls"]} '
+              f'call(s) hedged, {stats["hedge_wins"]} won by the hedge, '
+              f'{stats["denied"]} over budget')
+
+if limiter is not None:
+    stats = limiter.stats()
+    print(f'Rate limiter: waited {stats["waited"]:.1f} s, '
+          f'{stats["retries"]} retries, {stats["rate_limited"]} rate limited')
+
+if stream_hub is not None:
+    stream_hub.close()
+if recorder is not None:
+    if metrics_report is not None:
+        recorder.save_json(metrics_report, include_calls=True)
+    if metrics_prometheus is not None:
+        recorder.save_prometheus(metrics_prometheus)
+    print(f'Slowest stage: {recorder.report()["slowest_stage"]}')
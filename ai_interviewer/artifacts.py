@@ -0,0 +1,176 @@
+"""Stage outputs keyed by a hash of their inputs, like a small build DAG.
+
+The key of an artifact covers the stage, its inputs, the prompt templates it
+uses, the model routes of its LLM stages (see `routing`), whether the offline
+fake backend built it (see `fake_llm`) and the keys of the artifacts it was
+built from. Changing any of them gives a new key, so only that stage and the ones downstream of it are built
+again; the others are loaded. Artifacts of every job and candidate coexist
+in one store.
+"""
+import ast
+from functools import lru_cache
+import hashlib
+import json
+from pathlib import Path
+import time
+from typing import Callable, Mapping
+
+from .fake_llm import get_llm_backend
+from .routing import get_router
+from .stages import Stage
+from .util import BASE_DIR, write_atomically
+
+ARTIFACT_VERSION = 1
+
+PROMPTS_FILE = BASE_DIR/'ai_interviewer'/'prompts.py'
+
+# Prompt templates of `prompts` used by each stage
+STAGE_PROMPTS = {
+    'job_description': ('JOB_DESCRIPTION_PROMPT',),
+    'candidate': ('RESUME_PROMPT',),
+    'interview': (
+        'CONVERSATION_TEMPLATE',
+        'MEMORY_SUMMARY_PROMPT',
+        'PERSONALIZE_PROMPT',
+        'FOLLOW_UP_PROMPT',
+        'FOLLOW_UP_WITH_IDEA_PROMPT',
+        'ANSWER_CANDIDATE_PROMPT',
+    ),
+    'summary': (
+        'SUMMARY_PROMPT',
+        'EVIDENCE_PROMPT',
+        'EVIDENCE_SUMMARY_PROMPT',
+        'EVIDENCE_MERGE_PROMPT',
+        'EVALUATION_PROMPT',
+        'RECOMMENDATION_PROMPT',
+    ),
+}
+
+# LLM stages of each artifact, whose routes are part of its key
+ARTIFACT_STAGES = {
+    'job_description': (Stage.JOB_DESCRIPTION,),
+    'candidate': (Stage.RESUME,),
+    'interview': (
+        Stage.CANDIDATE_REPLY,
+        Stage.MEMORY_SUMMARY,
+        Stage.PERSONALIZE,
+        Stage.FOLLOW_UP,
+        Stage.ANSWER_CANDIDATE,
+    ),
+    'summary': (
+        Stage.EVIDENCE,
+        Stage.EVIDENCE_MERGE,
+        Stage.CRITERION,
+        Stage.EVALUATION,
+        Stage.RECOMMENDATION,
+    ),
+}
+
+
+@lru_cache(maxsize=None)
+def prompt_sources() -> dict[str, str]:
+    """Source code of each top-level assignment of `prompts`, read without
+    importing it (and langchain)"""
+    source = PROMPTS_FILE.read_text()
+    sources = {}
+    for node in ast.parse(source).body:
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    sources[target.id] = ast.get_source_segment(source, node)
+    return sources
+
+
+def prompt_fingerprint(stage: str) -> str:
+    sources = prompt_sources()
+    return hashlib.sha256(json.dumps(
+        [sources.get(name, '') for name in STAGE_PROMPTS.get(stage, ())]
+    ).encode()).hexdigest()
+
+
+class ArtifactStore:
+    """Directory of artifacts, one JSON file per key"""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+
+    def key(
+            self,
+            stage: str,
+            inputs: Mapping,
+            deps: Mapping[str, str] | None = None
+    ) -> str:
+        payload = {
+            'version': ARTIFACT_VERSION,
+            'stage': stage,
+            'prompts': prompt_fingerprint(stage),
+            'inputs': inputs,
+            'deps': deps or {}
+        }
+        # Only routed stages change the key, so unrouted runs keep theirs
+        router = get_router()
+        models = ({} if router is None
+                  else router.settings(ARTIFACT_STAGES.get(stage, ())))
+        if len(models) > 0:
+            payload['models'] = models
+        # Canned outputs must never be loaded by a run on the real API
+        if get_llm_backend() is not None:
+            payload['backend'] = 'fake'
+        return hashlib.sha256(json.dumps(
+            payload,
+            sort_keys=True,
+            default=str
+        ).encode()).hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.root/key[:2]/f'{key}.json'
+
+    def checkpoint_file(self, key: str) -> Path:
+        """Where the build of the artifact `key` can save its progress"""
+        directory = self.root/'checkpoints'
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory/f'{key}.json'
+
+    def load(self, key: str) -> dict | None:
+        try:
+            with self.path(key).open('r') as file:
+                return json.load(file)['value']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(
+            self,
+            key: str,
+            stage: str,
+            value: dict,
+            inputs: Mapping,
+            deps: Mapping[str, str] | None = None
+    ):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomically(path, json.dumps({
+            'stage': stage,
+            'inputs': inputs,
+            'deps': deps or {},
+            'created': time.time(),
+            'value': value
+        }, default=str))
+
+    def load_or_build(
+            self,
+            stage: str,
+            inputs: Mapping,
+            build: Callable[[str], dict],
+            deps: Mapping[str, str] | None = None,
+            force: bool = False
+    ) -> tuple[str, dict, bool]:
+        """Returns the key and value of the artifact, and whether it was
+        built. `build` gets the key and returns the value; it runs when the
+        artifact is not in the store, or always with `force`."""
+        key = self.key(stage, inputs, deps)
+        value = None if force else self.load(key)
+        if value is not None:
+            return key, value, False
+        value = build(key)
+        self.save(key, stage, value, inputs, deps)
+        return key, value, True
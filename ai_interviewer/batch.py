@@ -0,0 +1,356 @@
+from concurrent.futures import as_completed, Executor, ThreadPoolExecutor
+from dataclasses import asdict
+import json
+from pathlib import Path
+
+from .artifacts import ArtifactStore
+from .candidate import Candidate
+from .evidence import EvidenceCollector
+from .interview_simulator import InterviewSimulator
+from .interviewer import Interviewer, SummaryMode
+from .job_description import create_job_description, JobDescription
+from .metrics import interview_context
+from .profiling import profile_phase
+from .ratelimit import Priority, priority_context
+from .transcript import Transcript, Turn
+from .util import slugify
+
+JOB_FIELDS = ('company', 'job', 'area', 'years_of_experience_job')
+CANDIDATE_FIELDS = (
+    'candidate_name',
+    'years_of_experience_candidate',
+    'work_experiences'
+)
+
+
+def load_candidates(candidates_file, defaults: dict) -> list[dict]:
+    """Reads one candidate per line, filling missing fields with defaults"""
+    specs = []
+    with Path(candidates_file).open('r') as file:
+        for line in file:
+            if line.strip() == '':
+                continue
+            spec = {key: defaults[key] for key in JOB_FIELDS + CANDIDATE_FIELDS}
+            spec.update(json.loads(line))
+            specs.append(spec)
+    return specs
+
+
+def job_key(spec: dict) -> tuple:
+    return tuple(spec[key] for key in JOB_FIELDS)
+
+
+def job_dir(data_dir: Path, spec: dict) -> Path:
+    return data_dir/slugify('_'.join(str(value) for value in job_key(spec)))
+
+
+def job_inputs(spec: dict) -> dict:
+    return {
+        'company': spec['company'],
+        'job': spec['job'],
+        'years_of_experience': spec['years_of_experience_job'],
+        'area': spec['area']
+    }
+
+
+def load_or_create_job_description(
+        spec: dict,
+        directory: Path,
+        store: ArtifactStore,
+        force_reload: bool = False
+) -> tuple[str, JobDescription]:
+    """The artifact key and the job description of `spec`, also written to
+    `directory`"""
+    with profile_phase('job_description'):
+        key, job_description, _ = store.load_or_build(
+            'job_description',
+            job_inputs(spec),
+            lambda key: create_job_description(
+                company=spec['company'],
+                job=spec['job'],
+                years_of_experience=spec['years_of_experience_job'],
+                area=spec['area']
+            )._asdict(),
+            force=force_reload
+        )
+    job_description = JobDescription(**job_description)
+    directory.mkdir(parents=True, exist_ok=True)
+    job_description.save(directory/'job_description.json')
+    return key, job_description
+
+
+def load_or_create_job_descriptions(
+        specs: list[dict],
+        data_dir: Path,
+        store: ArtifactStore,
+        executor: Executor,
+        force_reload: bool = False
+) -> dict[tuple, tuple[str, JobDescription]]:
+    """The artifact key and the job description of each distinct job of
+    `specs`, by `job_key`, created concurrently in `executor`"""
+    print('Creating job descriptions...\n')
+    jobs = {job_key(spec): spec for spec in specs}
+    futures = {
+        key: executor.submit(
+            load_or_create_job_description,
+            spec,
+            job_dir(data_dir, spec),
+            store,
+            force_reload
+        )
+        for key, spec in jobs.items()
+    }
+    job_descriptions = {key: future.result()
+                        for key, future in futures.items()}
+    print(f'{len(job_descriptions)} job description(s) ready.\n')
+    return job_descriptions
+
+
+def run_candidate(
+        spec: dict,
+        job_description: JobDescription,
+        directory: Path,
+        store: ArtifactStore,
+        job_description_key: str,
+        force_reload: bool = False,
+        summary_workers: int = 1,
+        prepersonalize: bool = False,
+        summary_mode: SummaryMode = SummaryMode.FULL,
+        summary_token_budget: int | None = None,
+        memory_token_budget: int | None = None,
+        pipelined: bool = False
+) -> dict:
+    """Creates, interviews and summarizes one candidate, reusing the
+    artifacts of `store` whose inputs did not change. The outputs are
+    written to `directory`."""
+    directory.mkdir(parents=True, exist_ok=True)
+
+    with profile_phase('candidate'):
+        candidate_key, candidate, _ = store.load_or_build(
+            'candidate',
+            {
+                'name': spec['candidate_name'],
+                'job': spec['job'],
+                'years_of_experience': spec['years_of_experience_candidate'],
+                'area': spec['area'],
+                'work_experiences': spec['work_experiences'],
+                'company': spec['company']
+            },
+            lambda key: Candidate(
+                name=spec['candidate_name'],
+                job=spec['job'],
+                years_of_experience=spec['years_of_experience_candidate'],
+                area=spec['area'],
+                requirements=job_description.requirements,
+                work_experiences=spec['work_experiences'],
+                company=spec['company']
+            ).to_dict(),
+            deps={'job_description': job_description_key},
+            force=force_reload
+        )
+    candidate = Candidate(**candidate,
+                          memory_token_budget=memory_token_budget)
+    candidate.save(directory/'candidate.json')
+
+    # In incremental mode, the evidence of each question block is extracted
+    # during the interview
+    evidence = None
+
+    def simulate_interview(key):
+        nonlocal evidence
+        checkpoint_file = store.checkpoint_file(key)
+        # The turns it resumes from are kept next to it
+        transcript_file = checkpoint_file.with_suffix('.jsonl')
+        if force_reload:
+            checkpoint_file.unlink(missing_ok=True)
+        resuming = checkpoint_file.exists()
+        interviewer = Interviewer(
+            candidate_name=spec['candidate_name'],
+            job=spec['job'],
+            area=spec['area'],
+            company=spec['company'],
+            prepersonalize=prepersonalize and not resuming
+        )
+        if summary_mode == SummaryMode.INCREMENTAL:
+            evidence = EvidenceCollector(interviewer)
+        simulator = InterviewSimulator(
+            interviewer=interviewer,
+            candidate=candidate,
+            job_description=job_description,
+            verbose=False,
+            transcript_file=transcript_file,
+            checkpoint_file=checkpoint_file,
+            pipelined=pipelined,
+            on_block_complete=(None if evidence is None
+                               else evidence.add_block)
+        )
+        if simulator.load_checkpoint() and prepersonalize:
+            simulator.interviewer.personalize_plan(background=True)
+        simulator.start()
+        checkpoint_file.unlink(missing_ok=True)
+        transcript_file.unlink(missing_ok=True)
+        return {
+            'full_transcript': simulator.full_transcript,
+            'short_transcript': simulator.short_transcript,
+            'turns': [asdict(turn) for turn in simulator.transcript]
+        }
+
+    with profile_phase('interview'):
+        interview_key, interview, built = store.load_or_build(
+            'interview',
+            {'candidate_name': spec['candidate_name'], 'job': spec['job'],
+             'area': spec['area'], 'company': spec['company'],
+             'memory_token_budget': memory_token_budget},
+            simulate_interview,
+            deps={'job_description': job_description_key,
+                  'candidate': candidate_key},
+            force=force_reload
+        )
+    Transcript(path=directory/'transcript.jsonl').restore(
+        Turn(**turn) for turn in interview['turns']
+    )
+    with (directory/'full_transcript.txt').open('w') as file:
+        file.write(interview['full_transcript'])
+    with (directory/'short_transcript.txt').open('w') as file:
+        file.write(interview['short_transcript'])
+
+    def summarize_interview(key):
+        interviewer = Interviewer(
+            candidate_name=spec['candidate_name'],
+            job=spec['job'],
+            area=spec['area'],
+            company=spec['company']
+        )
+        return {'summary': interviewer.summarize_interview(
+            interview['short_transcript'],
+            verbose=False,
+            max_workers=summary_workers,
+            mode=summary_mode,
+            token_budget=summary_token_budget,
+            evidence=evidence
+        )}
+
+    with profile_phase('summary'):
+        _, summary, _ = store.load_or_build(
+            'summary',
+            {'mode': summary_mode, 'token_budget': summary_token_budget},
+            summarize_interview,
+            deps={'interview': interview_key},
+            force=force_reload
+        )
+    with (directory/'summary.txt').open('w') as file:
+        file.write(summary['summary'])
+
+    return {
+        **spec,
+        'directory': str(directory),
+        'full_transcript': interview['full_transcript'],
+        'short_transcript': interview['short_transcript'],
+        'summary': summary['summary']
+    }
+
+
+def interview_id(directory: Path) -> str:
+    """The LLM metrics of a candidate are attributed to `<job>/<candidate>`"""
+    return f'{directory.parent.name}/{directory.name}'
+
+
+def run_in_interview_context(
+        spec: dict,
+        job_description: JobDescription,
+        directory: Path,
+        *args,
+        **kwargs
+) -> dict:
+    """`run_candidate`, with the LLM metrics attributed to the candidate
+    (`interview_id`) and batch priority in the rate limiter"""
+    with (interview_context(interview_id(directory)),
+          priority_context(Priority.BATCH)):
+        return run_candidate(spec, job_description, directory, *args,
+                             **kwargs)
+
+
+def candidate_directories(specs: list[dict], data_dir: Path) -> list[Path]:
+    """The output directory of each candidate, `data_dir/<job>/<candidate>`,
+    unique even if names repeat"""
+    directories = []
+    used = set()
+    for spec in specs:
+        name = slugify(spec['candidate_name'])
+        directory = job_dir(data_dir, spec)/name
+        suffix = 2
+        while directory in used:
+            directory = job_dir(data_dir, spec)/f'{name}_{suffix}'
+            suffix += 1
+        used.add(directory)
+        directories.append(directory)
+    return directories
+
+
+def main_batch(
+        candidates_file,
+        data_dir,
+        max_workers: int = 16,
+        force_reload: bool = False,
+        summary_workers: int = 1,
+        prepersonalize: bool = False,
+        summary_mode: SummaryMode = SummaryMode.FULL,
+        summary_token_budget: int | None = None,
+        memory_token_budget: int | None = None,
+        pipelined: bool = False,
+        **defaults
+):
+    """Screens every candidate in `candidates_file` (JSON lines).
+
+    Each line may override any of the job fields (company, job, area,
+    years_of_experience_job) and candidate fields (candidate_name,
+    years_of_experience_candidate, work_experiences); the command line
+    values are used for the missing ones. Job descriptions are created once
+    per distinct job, and candidates run in a pool of `max_workers` threads.
+    Outputs are written to `data_dir/<job>/<candidate>/`, and stages are
+    only run again when their inputs change (see `ArtifactStore`).
+    """
+    data_dir = Path(data_dir)
+    store = ArtifactStore(data_dir/'artifacts')
+    specs = load_candidates(candidates_file, defaults)
+    directories = candidate_directories(specs, data_dir)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        job_descriptions = load_or_create_job_descriptions(
+            specs, data_dir, store, executor, force_reload
+        )
+
+        print(f'Screening {len(specs)} candidate(s)...\n')
+        futures = {
+            executor.submit(
+                run_in_interview_context,
+                spec,
+                job_descriptions[job_key(spec)][1],
+                directory,
+                store,
+                job_descriptions[job_key(spec)][0],
+                force_reload,
+                summary_workers,
+                prepersonalize,
+                summary_mode,
+                summary_token_budget,
+                memory_token_budget,
+                pipelined
+            ): spec
+            for spec, directory in zip(specs, directories)
+        }
+
+        results = []
+        failures = 0
+        for i, future in enumerate(as_completed(futures), start=1):
+            spec = futures[future]
+            try:
+                results.append(future.result())
+                print(f'[{i}/{len(specs)}] {spec["candidate_name"]}: done')
+            except Exception as e:
+                failures += 1
+                print(f'[{i}/{len(specs)}] {spec["candidate_name"]}: '
+                      f'failed ({e!r})')
+
+    print(f'\n{len(results)} candidate(s) screened, {failures} failed.')
+    return results
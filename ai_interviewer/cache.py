@@ -0,0 +1,166 @@
+from collections import Counter
+import hashlib
+import json
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Iterable, Mapping
+
+from .stages import Stage, stage_name
+
+# Candidate replies are left out: a simulated candidate must not answer the
+# same way in every interview
+DEFAULT_CACHED_STAGES = tuple(stage for stage in Stage
+                              if stage is not Stage.CANDIDATE_REPLY)
+
+
+class LLMCache:
+    """Persistent cache of LLM responses, shared by every chain.
+
+    Responses are stored in a SQLite file, keyed by a hash of the rendered
+    prompt messages plus the model parameters (see `make_key`). Entries are
+    evicted least recently used first once `max_entries` or `max_bytes` is
+    exceeded, and expire after `ttl` seconds (`stage_ttls` overrides it per
+    stage). Only the stages in `stages` are cached; `None` caches
+    `DEFAULT_CACHED_STAGES`, every stage but the candidate replies.
+    """
+
+    def __init__(
+            self,
+            path: str | Path,
+            stages: Iterable[str] | None = None,
+            max_entries: int | None = None,
+            max_bytes: int | None = None,
+            ttl: float | None = None,
+            stage_ttls: Mapping[str, float | None] | None = None
+    ):
+        self.path = Path(path)
+        if stages is None:
+            stages = DEFAULT_CACHED_STAGES
+        self.stages = {stage_name(stage) for stage in stages}
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stage_ttls = {stage_name(stage): ttl
+                           for stage, ttl in (stage_ttls or {}).items()}
+        self.hits = Counter()
+        self.misses = Counter()
+
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            isolation_level=None
+        )
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, stage TEXT, value TEXT, size INTEGER, '
+            'created REAL, accessed REAL)'
+        )
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS responses_accessed '
+            'ON responses (accessed)'
+        )
+
+    @staticmethod
+    def make_key(messages: list, **params) -> str:
+        """Hashes `(role, content)` message pairs and the model params"""
+        payload = json.dumps(
+            {'messages': messages, 'params': params},
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def is_enabled(self, stage: str) -> bool:
+        return stage_name(stage) in self.stages
+
+    def lookup(self, key: str, stage: str) -> list[str] | None:
+        """Returns the cached generations, or `None` on a miss"""
+        stage = stage_name(stage)
+        ttl = self.stage_ttls.get(stage, self.ttl)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT value, created FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and ttl is not None and now - row[1] > ttl:
+                self._connection.execute(
+                    'DELETE FROM responses WHERE key = ?', (key,)
+                )
+                row = None
+            if row is None:
+                self.misses[stage] += 1
+                return None
+            self._connection.execute(
+                'UPDATE responses SET accessed = ? WHERE key = ?', (now, key)
+            )
+            self.hits[stage] += 1
+        return json.loads(row[0])
+
+    def update(self, key: str, stage: str, generations: list[str]):
+        value = json.dumps(generations)
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                (key, stage_name(stage), value, len(value), now, now)
+            )
+            self._evict()
+
+    def _evict(self):
+        if self.max_entries is not None:
+            self._connection.execute(
+                'DELETE FROM responses WHERE key IN ('
+                'SELECT key FROM responses ORDER BY accessed DESC '
+                'LIMIT -1 OFFSET ?)', (self.max_entries,)
+            )
+        if self.max_bytes is not None:
+            total, = self._connection.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM responses'
+            ).fetchone()
+            if total > self.max_bytes:
+                rows = self._connection.execute(
+                    'SELECT key, size FROM responses ORDER BY accessed'
+                ).fetchall()
+                evicted = []
+                for key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    evicted.append((key,))
+                    total -= size
+                self._connection.executemany(
+                    'DELETE FROM responses WHERE key = ?', evicted
+                )
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute('DELETE FROM responses')
+
+    def stats(self) -> dict:
+        """Hit/miss counters per stage"""
+        stages = sorted(set(self.hits) | set(self.misses))
+        return {
+            stage: {'hits': self.hits[stage], 'misses': self.misses[stage]}
+            for stage in stages
+        }
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+_llm_cache: LLMCache | None = None
+
+
+def set_llm_cache(cache: LLMCache | None):
+    """Sets the cache used by every `ChatModel` call"""
+    global _llm_cache
+    _llm_cache = cache
+
+
+def get_llm_cache() -> LLMCache | None:
+    return _llm_cache
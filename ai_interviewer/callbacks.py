@@ -0,0 +1,157 @@
+import threading
+import time
+from typing import Any, Dict, List
+from uuid import UUID
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.schema import LLMResult
+
+from .metrics import CallRecord, MetricsRecorder
+from .streaming import LineWrapper, StdoutSink, StreamSession
+from .util import estimate_tokens
+
+
+class StreamingCallbackHandler(BaseCallbackHandler):
+    """Line wraps the tokens at `limit` characters and streams them to a
+    `StreamSession`, flushing it at the end of every call"""
+
+    def __init__(self, session: StreamSession, limit: int = 80):
+        super().__init__()
+        self.session = session
+        self.wrapper = LineWrapper(limit)
+
+    @property
+    def line(self) -> str:
+        # Only the length of the current line is kept
+        return ' ' * self.wrapper.column
+
+    @line.setter
+    def line(self, line: str):
+        self.wrapper.column = len(line)
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        """Run on new LLM token. Only available when streaming is enabled."""
+        self.session.write(self.wrapper.wrap(token))
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        self.session.flush()
+
+    def on_llm_error(self, error: BaseException, **kwargs: Any) -> None:
+        self.session.flush()
+
+
+class StreamingStdOutLimitedCallbackHandler(StreamingCallbackHandler):
+    """Streams to stdout, wrapping lines at `limit` characters"""
+
+    def __init__(self, limit=80):
+        super().__init__(StreamSession(None, [StdoutSink()]), limit=limit)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Reports every call of a chat model to `recorder`: its stage, tokens,
+    time to first token, latency and retries.
+
+    Token counts come from the API usage when it is returned, and otherwise
+    from the streamed tokens or an estimate.
+    """
+
+    def __init__(
+            self,
+            stage: str,
+            recorder: MetricsRecorder,
+            interview: str | None = None
+    ):
+        super().__init__()
+        self.stage = stage
+        self.recorder = recorder
+        self.interview = interview
+        # run id -> [start, first token time, prompt tokens, streamed tokens,
+        # thread, thread CPU time at the start]
+        self._runs = {}
+
+    def on_llm_start(
+            self,
+            serialized: Dict[str, Any],
+            prompts: List[str],
+            *,
+            run_id: UUID,
+            **kwargs: Any
+    ) -> None:
+        prompt_tokens = sum(estimate_tokens(prompt) for prompt in prompts)
+        # The callbacks of async calls run in the event loop's executor,
+        # not in the thread making the call
+        thread = threading.current_thread()
+        if thread.name.startswith('asyncio'):
+            thread = None
+        self._runs[run_id] = [time.perf_counter(), None, prompt_tokens, 0,
+                              thread, time.thread_time()]
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID,
+                         **kwargs: Any) -> None:
+        run = self._runs.get(run_id)
+        if run is None:
+            return
+        if run[1] is None:
+            run[1] = time.perf_counter()
+        run[3] += 1
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID,
+                   **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        start, first_token, prompt_tokens, streamed_tokens = run[:4]
+        output = response.llm_output or {}
+        usage = output.get('token_usage') or {}
+        cached = output.get('cached', False)
+
+        completion_tokens = usage.get('completion_tokens')
+        if completion_tokens is None:
+            if streamed_tokens > 0 and not cached:
+                completion_tokens = streamed_tokens
+            else:
+                completion_tokens = sum(
+                    estimate_tokens(generation.text)
+                    for generations in response.generations
+                    for generation in generations
+                )
+
+        self.recorder.record(CallRecord(
+            stage=self.stage,
+            interview=self.interview,
+            prompt_tokens=usage.get('prompt_tokens', prompt_tokens),
+            completion_tokens=completion_tokens,
+            first_token_latency=(None if first_token is None
+                                 else first_token - start),
+            latency=time.perf_counter() - start,
+            retries=output.get('retries', 0),
+            cached=cached,
+            cpu_time=self._cpu_time(run),
+            model=output.get('model_name'),
+            hedged=output.get('hedged', False)
+        ))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID,
+                     **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        start, first_token, prompt_tokens, streamed_tokens = run[:4]
+        self.recorder.record(CallRecord(
+            stage=self.stage,
+            interview=self.interview,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=streamed_tokens,
+            first_token_latency=(None if first_token is None
+                                 else first_token - start),
+            latency=time.perf_counter() - start,
+            error=type(error).__name__,
+            cpu_time=self._cpu_time(run)
+        ))
+
+    @staticmethod
+    def _cpu_time(run: list) -> float | None:
+        thread, thread_time = run[4:]
+        if thread is not threading.current_thread():
+            return None
+        return time.thread_time() - thread_time
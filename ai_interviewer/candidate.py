@@ -1,15 +1,11 @@
 import json
+from typing import TYPE_CHECKING
 
-from langchain import LLMChain, ConversationChain
-from langchain.chat_models import ChatOpenAI
-from langchain.memory import ConversationBufferWindowMemory
-from langchain.prompts import PromptTemplate
-from langchain.prompts.chat import (
-    ChatPromptTemplate,
-    SystemMessagePromptTemplate,
-    HumanMessagePromptTemplate,
-)
-from .util import StreamingStdOutLimitedCallbackHandler
+from .stages import Stage
+
+if TYPE_CHECKING:
+    from langchain import ConversationChain
+    from langchain.memory.chat_memory import BaseChatMemory
 
 
 class Candidate:
@@ -24,9 +20,16 @@ class Candidate:
             company: str,
             resume: str | None = None,
             verbose: bool = False,
-            streaming: bool = False
+            streaming: bool = False,
+            memory_token_budget: int | None = None
     ):
-        """Initializes the agent"""
+        """Initializes the agent.
+
+        The candidate remembers the last four exchanges of the conversation.
+        With `memory_token_budget`, it remembers it within that many tokens
+        instead, summarizing what does not fit in the background (see
+        `RollingSummaryMemory`).
+        """
         self.name = name
         self.job = job
         self.years_of_experience = years_of_experience
@@ -36,15 +39,18 @@ class Candidate:
         self.company = company
         self.verbose = verbose
         self.streaming = streaming
+        self.memory_token_budget = memory_token_budget
         if resume is None or resume == '':
             self.resume = self.create_resume()
         else:
             self.resume = resume
-        self.conversation_chain = self.create_conversation_chain()
+        self._conversation_chain = None
+        self._restored_memory = []
+        self._restored_summary = None
 
-    def save(self, filename):
-        """Saves the candidate's data"""
-        data = {
+    def to_dict(self) -> dict:
+        """The candidate's data, as saved by `save`"""
+        return {
             "name": self.name,
             "job": self.job,
             "years_of_experience": self.years_of_experience,
@@ -54,41 +60,33 @@ class Candidate:
             "company": self.company,
             "resume": self.resume
         }
+
+    def save(self, filename):
+        """Saves the candidate's data"""
         with open(filename, "w") as file:
-            json.dump(data, file)
+            json.dump(self.to_dict(), file)
+
+    @property
+    def conversation_chain(self) -> 'ConversationChain':
+        # Built on first use, so loading a saved candidate is cheap
+        if self._conversation_chain is None:
+            self._conversation_chain = self.create_conversation_chain()
+            self._apply_restored_memory()
+        return self._conversation_chain
 
     def create_resume(self) -> str:
         """Creates the candidate's resume"""
-        system_message_prompt = SystemMessagePromptTemplate.from_template(
-            template="You are a creative assistant."
-        )
-        human_message_prompt = HumanMessagePromptTemplate.from_template(
-            template="Create a resume for {name}, a talented {job} with "
-                     "{years_of_experience} years of experience in {area}.\n"
-                     "Be detailed in experiences and accomplishments.\n"
-                     "The resume must be a good fit for the following job "
-                     "requirements:\n{requirements}\n\nThe resume must show at "
-                     "least {work_experiences} work experiences.\nUse names of "
-                     "real companies in his work experiences.\nDo not use "
-                     "{company}, {name} never worked there."
-                     "The details of the work experiences must be different.\n"
-                     "The work experiences must reflect seniority and career "
-                     "progression. Older experiences must be compatible with "
-                     "more junior roles, while recent experiences must be "
-                     "compatible with more senior roles.\nThe details of each "
-                     "work experience must be related to the company where {name} "
-                     "worked at that time."
-        )
-        chat_prompt = ChatPromptTemplate.from_messages([
-            system_message_prompt,
-            human_message_prompt
-        ])
+        from langchain import LLMChain
+
+        from .llm import create_chat_model
+        from .prompts import RESUME_PROMPT
+
         chain = LLMChain(
-            llm=ChatOpenAI(
+            llm=create_chat_model(
+                Stage.RESUME,
                 temperature=0.5,
-                streaming=self.streaming,
-                callbacks=[StreamingStdOutLimitedCallbackHandler()]
-            ), prompt=chat_prompt)
+                streaming=self.streaming
+            ), prompt=RESUME_PROMPT)
 
         return chain.predict(
             name=self.name,
@@ -100,19 +98,16 @@ class Candidate:
             company=self.company
         )
 
-    def create_conversation_chain(self) -> ConversationChain:
+    def create_conversation_chain(self) -> 'ConversationChain':
         """Creates the conversation chain, needed for the agent to talk"""
+        from langchain import ConversationChain
+        from langchain.prompts import PromptTemplate
+
+        from .llm import create_chat_model
+        from .prompts import CONVERSATION_TEMPLATE
+
         prompt = PromptTemplate(
-            template="Your name is {name}. You are being interviewed for a "
-                     "{job} position at {company} to work with {area}. "
-                     "You are a talented {job} with {years_of_experience} years "
-                     "of experience in {area}. You are talkative and provides "
-                     "lots of specific details from yourself, your work "
-                     "experience and your personality. If you do not know the "
-                     "answer to a question, you create an answer to the question "
-                     "based on your resume. Here's your resume:\n\n"
-                     "{resume}\n\n\nCurrent conversation:\n{history}\n"
-                     "Interviewer: {input}\n{name}: ",
+            template=CONVERSATION_TEMPLATE,
             input_variables=["history", "input"],
             partial_variables={
                 "name": self.name,
@@ -125,20 +120,42 @@ class Candidate:
         )
 
         conversation_chain = ConversationChain(
-            llm=ChatOpenAI(
+            llm=create_chat_model(
+                Stage.CANDIDATE_REPLY,
                 temperature=0.5,
-                streaming=self.streaming,
-                callbacks=[StreamingStdOutLimitedCallbackHandler()]
+                streaming=self.streaming
             ),
             verbose=self.verbose and not self.streaming,
-            memory=ConversationBufferWindowMemory(
+            memory=self.create_memory(),
+            prompt=prompt
+        )
+        return conversation_chain
+
+    def create_memory(self) -> 'BaseChatMemory':
+        from langchain import LLMChain
+        from langchain.memory import ConversationBufferWindowMemory
+
+        from .llm import create_chat_model
+        from .memory import RollingSummaryMemory
+        from .prompts import MEMORY_SUMMARY_PROMPT
+
+        if self.memory_token_budget is None:
+            return ConversationBufferWindowMemory(
                 human_prefix='Interviewer',
                 ai_prefix=self.name,
                 k=4
-            ),
-            prompt=prompt
+            )
+        # The summaries are written in the background: the model is
+        # created here so it is attributed to this interview
+        return RollingSummaryMemory(
+            human_prefix='Interviewer',
+            ai_prefix=self.name,
+            token_budget=self.memory_token_budget,
+            chain=LLMChain(
+                llm=create_chat_model(Stage.MEMORY_SUMMARY, temperature=0),
+                prompt=MEMORY_SUMMARY_PROMPT
+            )
         )
-        return conversation_chain
 
     def reply(self, message: str):
         """Bring the agent to life, enabling it to reply to messages"""
@@ -151,6 +168,80 @@ class Candidate:
             stop="Interviewer:"
         ).strip()
 
+    async def areply(self, message: str):
+        """Async version of `reply`, used to run many interviews at once"""
+        if self.streaming:
+            print(f'\n\n{self.name}: ')
+            self.conversation_chain.llm.callbacks[0].line = ''
+
+        if hasattr(self.memory, 'await_summary'):
+            await self.memory.await_summary()
+        output = await self.conversation_chain.apredict(
+            input=message,
+            stop="Interviewer:"
+        )
+        return output.strip()
+
     @property
     def memory(self):
         return self.conversation_chain.memory
+
+    def memory_messages(self) -> list[tuple[str, str]]:
+        """The messages of the conversation the memory still uses, as (type,
+        content) pairs: the older ones are summarized or out of its window,
+        so they are left out and the size stays bounded"""
+        if self._conversation_chain is None:
+            return list(self._restored_memory)
+        return [(message.type, message.content)
+                for message in self.memory.chat_memory.messages[
+                    self._memory_start():
+                ]]
+
+    def memory_summary(self) -> dict | None:
+        """The state of the summary of the conversation, if the memory has
+        one, relative to `memory_messages`"""
+        if self._conversation_chain is None:
+            return self._restored_summary
+        if not hasattr(self.memory, 'state'):
+            return None
+        state = self.memory.state()
+        start = self._memory_start()
+        return {
+            **state,
+            'summarized': state['summarized'] - start,
+            'pending': (None if state['pending'] is None
+                        else state['pending'] - start)
+        }
+
+    def _memory_start(self) -> int:
+        """Index of the oldest message the memory still uses"""
+        if hasattr(self.memory, 'summarized'):
+            return self.memory.summarized
+        return max(0, len(self.memory.chat_memory.messages)
+                   - 2 * self.memory.k)
+
+    def restore_memory(
+            self,
+            messages: list[tuple[str, str]],
+            summary: dict | None = None
+    ):
+        """Replaces the conversation by one from `memory_messages`, and its
+        summary by one from `memory_summary`"""
+        self._restored_memory = [tuple(message) for message in messages]
+        self._restored_summary = summary
+        if self._conversation_chain is not None:
+            self._apply_restored_memory()
+
+    def _apply_restored_memory(self):
+        chat_memory = self._conversation_chain.memory.chat_memory
+        chat_memory.clear()
+        for message_type, content in self._restored_memory:
+            if message_type == 'human':
+                chat_memory.add_user_message(content)
+            else:
+                chat_memory.add_ai_message(content)
+        if (self._restored_summary is not None
+                and hasattr(self.memory, 'restore_state')):
+            self.memory.restore_state(self._restored_summary)
+        self._restored_memory = []
+        self._restored_summary = None
@@ -0,0 +1,288 @@
+"""Pools of synthetic candidates for one job posting.
+
+`create_candidate_pool` asks for several resumes per request, so the long
+job requirements are sent once for all of them, and runs the requests in a
+pool of threads. Resumes too similar to one already in the pool (see
+`minhash`) are rejected and replaced by new candidates, so interviews are
+not spent on clones. The pool is saved to a single gzipped JSON file.
+
+    pool = create_candidate_pool(1000, job, area, company, requirements)
+    pool.save('pool.json.gz')
+    for candidate in CandidatePool.load('pool.json.gz'):
+        ...
+"""
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import json
+from pathlib import Path
+import random
+import re
+from typing import Iterator
+
+from .artifacts import ArtifactStore
+from .batch import job_dir, load_or_create_job_description
+from .candidate import Candidate
+from .minhash import MinHashIndex
+from .ratelimit import Priority, priority_context
+from .stages import Stage
+
+POOL_VERSION = 1
+
+FIRST_NAMES = (
+    'Alan', 'Ada', 'Grace', 'Linus', 'Margaret', 'Dennis', 'Barbara', 'Ken',
+    'Frances', 'Edsger', 'Radia', 'Donald', 'Shafi', 'Tim', 'Katherine',
+    'John', 'Hedy', 'Niklaus', 'Karen', 'Guido', 'Sophie', 'Bjarne', 'Anita',
+    'James', 'Joan', 'Leslie', 'Carol', 'Vint', 'Mary', 'Robert', 'Susan',
+    'Andrew', 'Fei-Fei', 'Yann', 'Daphne', 'Geoffrey', 'Cynthia', 'Judea',
+    'Regina', 'Yoshua'
+)
+
+LAST_NAMES = (
+    'Bradley', 'Lovelace', 'Hopper', 'Torvalds', 'Hamilton', 'Ritchie',
+    'Liskov', 'Thompson', 'Allen', 'Dijkstra', 'Perlman', 'Knuth',
+    'Goldwasser', 'Berners-Lee', 'Johnson', 'McCarthy', 'Lamarr', 'Wirth',
+    'Jones', 'van Rossum', 'Wilson', 'Stroustrup', 'Borg', 'Gosling',
+    'Clarke', 'Lamport', 'Shaw', 'Cerf', 'Keller', 'Tarjan', 'Kare', 'Ng',
+    'Li', 'LeCun', 'Koller', 'Hinton', 'Dwork', 'Pearl', 'Barzilay', 'Bengio'
+)
+
+
+class CandidatePool:
+    """Candidates for the same job. In the saved file, the fields they share
+    (job, area, company and requirements) appear only once."""
+
+    def __init__(
+            self,
+            job: str,
+            area: str,
+            company: str,
+            requirements: str,
+            candidates: list[Candidate] | None = None
+    ):
+        self.job = job
+        self.area = area
+        self.company = company
+        self.requirements = requirements
+        self.candidates = candidates or []
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+    def __iter__(self) -> Iterator[Candidate]:
+        return iter(self.candidates)
+
+    def save(self, filename):
+        data = {
+            'version': POOL_VERSION,
+            'job': self.job,
+            'area': self.area,
+            'company': self.company,
+            'requirements': self.requirements,
+            'candidates': [
+                [candidate.name, candidate.years_of_experience,
+                 candidate.work_experiences, candidate.resume]
+                for candidate in self.candidates
+            ]
+        }
+        with gzip.open(filename, 'wt') as file:
+            json.dump(data, file, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, filename) -> 'CandidatePool':
+        with gzip.open(filename, 'rt') as file:
+            data = json.load(file)
+        pool = cls(data['job'], data['area'], data['company'],
+                   data['requirements'])
+        pool.candidates = [
+            Candidate(
+                name=name,
+                job=pool.job,
+                years_of_experience=years_of_experience,
+                area=pool.area,
+                requirements=pool.requirements,
+                work_experiences=work_experiences,
+                company=pool.company,
+                resume=resume
+            )
+            for name, years_of_experience, work_experiences, resume
+            in data['candidates']
+        ]
+        return pool
+
+
+def candidate_names(
+        count: int,
+        generator: random.Random,
+        exclude: set[str] = frozenset()
+) -> list[str]:
+    """`count` different names, none of them in `exclude`"""
+    names = []
+    used = set(exclude)
+    while len(names) < count:
+        name = (f'{generator.choice(FIRST_NAMES)} '
+                f'{generator.choice(LAST_NAMES)}')
+        if name in used:
+            # Once the combinations run out, tell namesakes apart
+            name = f'{name} {len(used) + 1}'
+        used.add(name)
+        names.append(name)
+    return names
+
+
+def parse_resumes(text: str) -> dict[str, str]:
+    """Resumes of a `RESUMES_PROMPT` response, by candidate name"""
+    parts = re.split(r'^###[ \t]*(.+?)[ \t]*$', text, flags=re.MULTILINE)
+    return {name.strip(): f'{name.strip()}\n{resume.strip()}'
+            for name, resume in zip(parts[1::2], parts[2::2])
+            if resume.strip() != ''}
+
+
+def create_resumes(
+        specs: list[tuple[str, int, int]],
+        job: str,
+        area: str,
+        company: str,
+        requirements: str
+) -> dict[str, str]:
+    """Creates the resumes of `(name, years_of_experience,
+    work_experiences)` candidates in one request. Resumes missing from the
+    response are left out."""
+    from langchain import LLMChain
+
+    from .llm import create_chat_model
+    from .prompts import RESUMES_PROMPT
+
+    with priority_context(Priority.BATCH):
+        chain = LLMChain(
+            llm=create_chat_model(Stage.RESUMES, temperature=0.8),
+            prompt=RESUMES_PROMPT
+        )
+    resumes = parse_resumes(chain.predict(
+        job=job,
+        area=area,
+        company=company,
+        requirements=requirements,
+        candidates='\n'.join(
+            f'- {name}, {years} years of experience, {count} work experiences'
+            for name, years, count in specs
+        )
+    ))
+    return {name: resumes[name] for name, _, _ in specs if name in resumes}
+
+
+def create_candidate_pool(
+        size: int,
+        job: str,
+        area: str,
+        company: str,
+        requirements: str,
+        years_of_experience: int | tuple[int, int] = (3, 10),
+        work_experiences: int = 3,
+        resumes_per_request: int = 4,
+        max_workers: int = 8,
+        similarity_threshold: float = 0.5,
+        max_rounds: int = 5,
+        seed: int | None = None,
+        verbose: bool = True
+) -> CandidatePool:
+    """Creates `size` candidates with different resumes.
+
+    Each request creates `resumes_per_request` resumes, and `max_workers`
+    requests run at once. Resumes whose estimated similarity to one in the
+    pool reaches `similarity_threshold` are rejected; they and the resumes
+    missing from responses are asked again for new candidates, for at most
+    `max_rounds` rounds. Years of experience are drawn from the
+    `years_of_experience` range.
+    """
+    generator = random.Random(seed)
+    if isinstance(years_of_experience, int):
+        years_of_experience = (years_of_experience, years_of_experience)
+
+    pool = CandidatePool(job, area, company, requirements)
+    index = MinHashIndex(threshold=similarity_threshold)
+    used_names = set()
+    requests = rejected = missing = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for _ in range(max_rounds):
+            if len(pool) >= size:
+                break
+            names = candidate_names(size - len(pool), generator, used_names)
+            used_names.update(names)
+            specs = [(name, generator.randint(*years_of_experience),
+                      work_experiences) for name in names]
+            batches = [specs[i:i + resumes_per_request]
+                       for i in range(0, len(specs), resumes_per_request)]
+            futures = [
+                executor.submit(create_resumes, batch, job, area, company,
+                                requirements)
+                for batch in batches
+            ]
+            requests += len(futures)
+
+            # In submission order, so the same responses give the same pool
+            for batch, future in zip(batches, futures):
+                resumes = future.result()
+                for name, years, count in batch:
+                    if name not in resumes:
+                        missing += 1
+                    elif index.add(name, resumes[name]) is not None:
+                        rejected += 1
+                    else:
+                        pool.candidates.append(Candidate(
+                            name=name,
+                            job=job,
+                            years_of_experience=years,
+                            area=area,
+                            requirements=requirements,
+                            work_experiences=count,
+                            company=company,
+                            resume=resumes[name]
+                        ))
+            if verbose:
+                print(f'{len(pool)}/{size} candidate(s), {rejected} '
+                      f'near-duplicate(s) rejected, {missing} missing, in '
+                      f'{requests} request(s)')
+    return pool
+
+
+def main_pool(
+        pool_file,
+        data_dir,
+        size: int = 100,
+        resumes_per_request: int = 4,
+        max_workers: int = 8,
+        similarity_threshold: float = 0.5,
+        force_reload: bool = False,
+        **defaults
+):
+    """Creates a pool of `size` candidates for the job of the command line
+    options, and saves it to `pool_file`"""
+    data_dir = Path(data_dir)
+    spec = {key: defaults[key] for key in ('company', 'job', 'area',
+                                           'years_of_experience_job')}
+    print('Creating the job description...\n')
+    _, job_description = load_or_create_job_description(
+        spec,
+        job_dir(data_dir, spec),
+        ArtifactStore(data_dir/'artifacts'),
+        force_reload
+    )
+
+    print(f'Creating {size} candidate(s)...\n')
+    pool = create_candidate_pool(
+        size,
+        job=spec['job'],
+        area=spec['area'],
+        company=spec['company'],
+        requirements=job_description.requirements,
+        years_of_experience=defaults['years_of_experience_candidate'],
+        work_experiences=defaults['work_experiences'],
+        resumes_per_request=resumes_per_request,
+        max_workers=max_workers,
+        similarity_threshold=similarity_threshold,
+        # Drawn from `random`, so `--seed` gives the same names
+        seed=random.getrandbits(32)
+    )
+    pool.save(pool_file)
+    print(f'\n{len(pool)} candidate(s) saved to {pool_file}.')
+    return pool
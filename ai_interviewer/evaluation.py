@@ -0,0 +1,88 @@
+"""Evaluation of an interview as one JSON object.
+
+Each criterion question of `CRITERIA_AND_QUESTIONS` is a field (`q1`,
+`q2`...), and so is the overall recommendation. The model is asked for the
+fields with a JSON schema, `parse_evaluation` keeps the ones it answered
+validly, and the others can be asked again on their own. `render_evaluation`
+writes the same text as the other summary modes.
+"""
+import json
+from typing import Iterable, Iterator
+
+from .interviewer import CRITERIA_AND_QUESTIONS
+
+RECOMMENDATION = 'recommendation'
+
+
+def criterion_questions() -> Iterator[tuple[str, str, str]]:
+    """The field, criterion and question of each criterion question, in
+    order"""
+    number = 0
+    for criteria, questions in CRITERIA_AND_QUESTIONS.items():
+        for question in questions:
+            number += 1
+            yield f'q{number}', criteria, question.strip()
+
+
+def evaluation_fields() -> dict[str, str]:
+    """The description of every field, the recommendation last, so that it
+    is written after the answers it is based on"""
+    fields = {field: f'{criteria}. {question}'
+              for field, criteria, question in criterion_questions()}
+    fields[RECOMMENDATION] = (
+        'Overall recommendation of whether or not the candidate should be '
+        'hired, based on the answers above. Provide strengths and '
+        'weaknesses in your assessment.'
+    )
+    return fields
+
+
+def json_schema(fields: dict[str, str]) -> str:
+    """JSON schema of an object with the string `fields`"""
+    return json.dumps({
+        'type': 'object',
+        'properties': {
+            field: {'type': 'string', 'description': description}
+            for field, description in fields.items()
+        },
+        'required': list(fields),
+        'additionalProperties': False
+    }, indent=2)
+
+
+def parse_evaluation(text: str, fields: Iterable[str]) -> dict[str, str]:
+    """The answers of `text` to `fields` that are valid: non-empty strings
+    in a JSON object, which may be in a code block or have text around it.
+    The fields missing from the result were missing or malformed."""
+    start = text.find('{')
+    end = text.rfind('}')
+    if start == -1 or end < start:
+        return {}
+    try:
+        data = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {field: data[field].strip() for field in fields
+            if isinstance(data.get(field), str) and data[field].strip() != ''}
+
+
+def render_criteria(answers: dict[str, str]) -> str:
+    """The answers to the criterion questions, under their criteria"""
+    text = ''
+    last_criteria = None
+    for field, criteria, _ in criterion_questions():
+        if criteria != last_criteria:
+            if last_criteria is not None:
+                text = f'{text}\n'
+            text = f'{text}{criteria}:\n\n'
+            last_criteria = criteria
+        text = f'{text}{answers[field]}\n\n'
+    return f'{text}\n'
+
+
+def render_evaluation(answers: dict[str, str]) -> str:
+    """The text of the summary, like in the other summary modes"""
+    return (f'Recommendation:\n\n{answers[RECOMMENDATION]}\n\n\n'
+            f'{render_criteria(answers)}')
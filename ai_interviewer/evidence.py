@@ -0,0 +1,72 @@
+"""Evidence of each question block, extracted while the interview goes on.
+
+The simulator calls `add_block` as soon as the last turn of a behavioral
+question is done (`InterviewSimulator(on_block_complete=...)`), and the
+evidence of that block is extracted in a background thread. So when the
+interview is over, `SummaryMode.INCREMENTAL` only has to merge the evidence
+and write the recommendation.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+import contextvars
+import threading
+
+from .interviewer import DEFAULT_TOKEN_BUDGET, Interviewer
+from .ratelimit import Priority, priority_context
+from .transcript import Transcript, split_blocks
+
+
+class EvidenceCollector:
+    def __init__(
+            self,
+            interviewer: Interviewer,
+            max_workers: int = 4,
+            token_budget: int = DEFAULT_TOKEN_BUDGET
+    ):
+        """Blocks longer than `token_budget` are split in parts, like in
+        `Interviewer.extract_evidence`"""
+        self.interviewer = interviewer
+        self.token_budget = token_budget
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Evidence of each block, by the text of the block
+        self._evidence: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def add_block(self, block: str):
+        """Starts extracting the evidence of `block`, rendered like the
+        blocks of `Transcript.blocks`"""
+        with self._lock:
+            if block in self._evidence:
+                return
+            # In a copy of the caller's context, so the calls keep its
+            # interview
+            self._evidence[block] = self._executor.submit(
+                contextvars.copy_context().run,
+                self._extract,
+                block
+            )
+
+    def _extract(self, block: str) -> str:
+        # Background work: the turns of the interview go first
+        with priority_context(Priority.BATCH):
+            return self.interviewer.extract_block_evidence(
+                block,
+                self.token_budget
+            )
+
+    def evidence(self, transcript: str | Transcript) -> str:
+        """The evidence of every block of `transcript`. The blocks that were
+        not added, e.g. those done before the interview was resumed, are
+        extracted now."""
+        if isinstance(transcript, Transcript):
+            blocks = transcript.blocks()
+        else:
+            blocks = split_blocks(transcript)
+        for block in blocks:
+            self.add_block(block)
+        return '\n\n'.join(
+            f'Question {i + 1}:\n{self._evidence[block].result()}'
+            for i, block in enumerate(blocks)
+        )
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
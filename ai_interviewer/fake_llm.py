@@ -0,0 +1,304 @@
+"""Offline LLM backend and record/replay cassettes.
+
+With `set_llm_backend(FakeBackend(...))`, every chat model made by
+`create_chat_model` answers locally with canned text, after a simulated
+time to first token and per-token latency, so the whole pipeline can run and
+be measured without an API key or network.
+
+With `set_cassette(Cassette(path, mode))`, responses are recorded to a JSON
+lines file (from OpenAI or the fake backend), or replayed from it.
+"""
+from enum import Enum
+import hashlib
+import json
+from pathlib import Path
+import random
+import re
+import threading
+from typing import Callable, Mapping
+
+from .stages import Stage, stage_name
+
+JOB_DESCRIPTION_TEXT = (
+    'Job Title: Software Engineer\n\n'
+    'About the Role: You will design, build and run the systems behind our '
+    'products, working with a small team of engineers and researchers.\n\n'
+    'Responsibilities:\n'
+    '- Design, implement and test new features.\n'
+    '- Review code and mentor other engineers.\n'
+    '- Own services in production.\n\n'
+    'Requirements:\n'
+    '- 5+ years of experience as a software engineer.\n'
+    '- Strong Python skills.\n'
+    '- Experience with distributed systems.\n\n'
+    'Why Work at Acme:\n'
+    'A friendly team, hard problems and a lot of autonomy.'
+)
+
+RESUME_TEXT = (
+    'Alex Doe\n'
+    'Software Engineer\n\n'
+    'Experience:\n'
+    '- Senior Software Engineer, Initech (2019-present): led the rewrite of '
+    'the billing platform and mentored 4 engineers.\n'
+    '- Software Engineer, Globex (2016-2019): built data pipelines in '
+    'Python processing 2TB per day.\n'
+    '- Junior Developer, Hooli (2014-2016): web services and tooling.\n\n'
+    'Education:\n'
+    '- BSc in Computer Science'
+)
+
+COMPANIES = (
+    'Initech', 'Globex', 'Hooli', 'Umbrella', 'Stark Industries',
+    'Wayne Enterprises', 'Cyberdyne', 'Soylent', 'Tyrell', 'Wonka',
+    'Vandelay', 'Massive Dynamic', 'Aperture', 'Gringotts', 'Pied Piper',
+    'Dunder Mifflin'
+)
+
+ACCOMPLISHMENTS = (
+    'led the rewrite of the billing platform',
+    'built data pipelines processing 2TB per day',
+    'cut the p99 latency of the search service by 60%',
+    'mentored {number} engineers',
+    'migrated {number} services to Kubernetes',
+    'designed the feature store used by {number} models',
+    'introduced canary releases and halved the incidents',
+    'trained ranking models that raised engagement by {number}%',
+    'automated the evaluation of {number} model versions a week',
+    'owned the on-call rotation of the payments team',
+    'shipped the recommendation engine of the mobile app',
+    'reduced the cloud bill by {number}% with spot instances',
+    'wrote the internal Python style guide',
+    'built a real-time fraud detection service',
+    'scaled the messaging backend to {number} million users',
+    'ran the migration from batch to streaming analytics',
+)
+
+
+def fake_resumes(prompt: str) -> str:
+    """One resume per `- <name>, <years> years of experience, <count> work
+    experiences` line of the prompt, each picked at random from a seed of
+    the name"""
+    resumes = []
+    for name, years, count in re.findall(
+            r'^- (.+?), (\d+) years of experience, (\d+) work experiences',
+            prompt,
+            flags=re.MULTILINE
+    ):
+        generator = random.Random(name)
+        lines = [f'### {name}', 'Software Engineer', '', 'Experience:']
+        end = 2024
+        for company in generator.sample(COMPANIES, int(count)):
+            start = end - max(1, int(years) // int(count))
+            accomplishments = ', '.join(
+                accomplishment.replace('{number}',
+                                       str(generator.randint(2, 40)))
+                for accomplishment in generator.sample(ACCOMPLISHMENTS, 2)
+            )
+            lines.append(f'- Software Engineer, {company} ({start}-{end}): '
+                         f'{accomplishments}.')
+            end = start
+        lines += ['', 'Education:', '- BSc in Computer Science', '']
+        resumes.append('\n'.join(lines))
+    return '\n'.join(resumes)
+
+
+def fake_evaluation(prompt: str) -> str:
+    """Answers every field of the JSON schema at the end of the prompt"""
+    schema = json.loads(prompt[prompt.rindex('\n{') + 1:])
+    digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+    return json.dumps({
+        field: (f'The candidate gave a concrete example from Initech, where '
+                f'they split the billing platform into services and led the '
+                f'migration. ({digest})')
+        for field in schema['properties']
+    })
+
+
+# Default response of each stage. `{digest}` is replaced by a short hash of
+# the prompt, so different prompts get different, but stable, responses.
+# Functions get the prompt text.
+DEFAULT_RESPONSES = {
+    Stage.JOB_DESCRIPTION.value: JOB_DESCRIPTION_TEXT,
+    Stage.RESUME.value: RESUME_TEXT,
+    Stage.RESUMES.value: fake_resumes,
+    Stage.CANDIDATE_REPLY.value: (
+        'Sure. At Initech our billing platform kept failing under load '
+        '(case {digest}). I proposed splitting it into smaller services, '
+        'wrote the design document, and worked with two other engineers to '
+        'migrate it over three months. I learned a lot about planning '
+        'migrations, and the number of incidents dropped by half. Looking '
+        'back, I would involve the operations team earlier.'
+    ),
+    Stage.MEMORY_SUMMARY.value: (
+        'The candidate split the billing platform of Initech into services '
+        'and led the migration, which halved the incidents. ({digest})'
+    ),
+    Stage.PERSONALIZE.value: (
+        'Thinking about your time at Initech, can you tell me about a time '
+        'you had to solve a hard problem with little guidance? ({digest})'
+    ),
+    Stage.FOLLOW_UP.value: (
+        'What would you do differently if you faced that situation again? '
+        '({digest})'
+    ),
+    Stage.ANSWER_CANDIDATE.value: (
+        'Good question. The team works closely with research and ships '
+        'every week. ({digest})'
+    ),
+    Stage.EVIDENCE.value: (
+        '- General cognitive ability: split the billing platform into '
+        'services.\n- Leadership: wrote the design and led the migration.\n'
+        '- Cultural fit: reflected on involving operations earlier.\n'
+        '- Role related knowledge: Python and distributed systems. '
+        '({digest})'
+    ),
+    Stage.EVIDENCE_MERGE.value: '\n\n'.join(
+        f'{criterion}:\n\nThe candidate gave a concrete example from '
+        f'Initech, where they split the billing platform into services and '
+        f'led the migration. The evidence is positive but limited to one '
+        f'project.'
+        for criterion in ('General cognitive ability', 'Leadership',
+                          'Cultural fit', 'Role related knowledge')
+    ) + ' ({digest})',
+    Stage.CRITERION.value: (
+        'The candidate gave a concrete example from Initech, where they '
+        'split the billing platform into services and led the migration. '
+        'The evidence is positive but limited to one project. ({digest})'
+    ),
+    Stage.EVALUATION.value: fake_evaluation,
+    Stage.RECOMMENDATION.value: (
+        'The candidate should move to the next round. Strengths: ownership '
+        'and technical depth. Weaknesses: few examples outside one '
+        'project. ({digest})'
+    ),
+}
+
+Response = str | Callable[[str], str]
+
+
+class FakeBackend:
+    """Settings of the offline chat model.
+
+    `responses` overrides the text of some stages: either a template (see
+    `DEFAULT_RESPONSES`) or a function of the prompt text. Each token (a word)
+    is produced `token_latency` seconds after the previous one, and the first
+    one `first_token_latency` seconds after the call. `model_latencies`
+    overrides both for some models, as `(first_token_latency,
+    token_latency)`.
+    """
+
+    def __init__(
+            self,
+            first_token_latency: float = 0.0,
+            token_latency: float = 0.0,
+            responses: Mapping[str, Response] | None = None,
+            model_latencies: Mapping[str, tuple[float, float]] | None = None
+    ):
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.responses = {
+            **DEFAULT_RESPONSES,
+            **{stage_name(k): v for k, v in (responses or {}).items()}
+        }
+        self.model_latencies = dict(model_latencies or {})
+
+    def latencies(self, model: str) -> tuple[float, float]:
+        """Time to the first token and between tokens of `model`"""
+        return self.model_latencies.get(
+            model,
+            (self.first_token_latency, self.token_latency)
+        )
+
+    def respond(self, stage: str, prompt: str) -> str:
+        response = self.responses.get(stage_name(stage), '{digest}')
+        if callable(response):
+            return response(prompt)
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        return response.replace('{digest}', digest)
+
+    @staticmethod
+    def tokens(text: str) -> list[str]:
+        # Words with their leading space, like OpenAI's tokens
+        words = text.split(' ')
+        return words[:1] + [f' {word}' for word in words[1:]]
+
+
+class CassetteMode(str, Enum):
+    # Responses are computed as usual and appended to the cassette
+    RECORD = 'record'
+    # Responses come from the cassette only; a missing one is an error
+    REPLAY = 'replay'
+
+
+class CassetteMiss(LookupError):
+    pass
+
+
+class Cassette:
+    """Recorded LLM responses, one JSON object per line, keyed like
+    `LLMCache`"""
+
+    def __init__(
+            self,
+            path: str | Path,
+            mode: CassetteMode = CassetteMode.REPLAY
+    ):
+        self.path = Path(path)
+        self.mode = CassetteMode(mode)
+        self.responses = {}
+        self._lock = threading.Lock()
+        if self.mode == CassetteMode.REPLAY or self.path.exists():
+            with self.path.open('r') as file:
+                for line in file:
+                    if line.strip() != '':
+                        entry = json.loads(line)
+                        self.responses[entry['key']] = entry['generations']
+        if self.mode == CassetteMode.RECORD:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def lookup(self, key: str, stage: str) -> list[str] | None:
+        """The recorded generations; `None` to call the model and record"""
+        generations = self.responses.get(key)
+        if generations is None and self.mode == CassetteMode.REPLAY:
+            raise CassetteMiss(
+                f'No {stage_name(stage)} response recorded in {self.path} for '
+                f'this prompt'
+            )
+        return generations
+
+    def record(self, key: str, stage: str, generations: list[str]):
+        with self._lock:
+            if key in self.responses:
+                return
+            self.responses[key] = generations
+            with self.path.open('a') as file:
+                file.write(json.dumps({
+                    'key': key,
+                    'stage': stage_name(stage),
+                    'generations': generations
+                }) + '\n')
+
+
+_llm_backend: FakeBackend | None = None
+_cassette: Cassette | None = None
+
+
+def set_llm_backend(backend: FakeBackend | None):
+    """Makes `create_chat_model` use `backend`; `None` is OpenAI"""
+    global _llm_backend
+    _llm_backend = backend
+
+
+def get_llm_backend() -> FakeBackend | None:
+    return _llm_backend
+
+
+def set_cassette(cassette: Cassette | None):
+    """Sets the cassette used by every `ChatModel` call"""
+    global _cassette
+    _cassette = cassette
+
+
+def get_cassette() -> Cassette | None:
+    return _cassette
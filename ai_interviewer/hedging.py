@@ -0,0 +1,344 @@
+"""Hedged requests: a slow call is sent again, and the first to answer wins.
+
+    set_hedger(Hedger())
+
+Every call of a hedged stage (the turns of the interview by default) is
+given a deadline, the `quantile` of the time to the first token of its
+recent requests. When no token has arrived by then, the same request is
+sent a second time, and the first of the two to stream a token is the one
+whose tokens are kept; the other is cancelled. Non-streamed calls race to
+their whole response instead.
+
+A synchronous loser is stopped at its next streamed token, from its own
+thread. A non-streamed one has no token to stop at: its thread runs to the
+end of its request, whose response is dropped, and it is never cancelled.
+Async losers are cancelled right away, streamed or not.
+
+Hedges cost requests, so they have their own budget: each call adds
+`max_rate` of a hedge to it, up to `burst` hedges, and a hedge is only sent
+when a whole one is available. At 0.1, at most one call in ten is hedged
+over time. No call is hedged before `min_calls` requests of its stage were
+timed.
+"""
+import asyncio
+from collections import Counter, deque
+import contextvars
+import threading
+import time
+from typing import Any, Awaitable, Callable, Iterable
+
+from .metrics import percentile
+from .stages import Stage, stage_name
+
+HEDGED_STAGES = (Stage.CANDIDATE_REPLY, Stage.FOLLOW_UP, Stage.PERSONALIZE)
+
+
+class HedgeCancelled(Exception):
+    """Raised in the request that lost the race, to stop its stream"""
+
+
+class Hedger:
+    """Deadlines, budget and statistics of hedged requests. Thread-safe."""
+
+    def __init__(
+            self,
+            stages: Iterable[Stage | str] = HEDGED_STAGES,
+            quantile: float = 0.95,
+            window: int = 100,
+            min_calls: int = 10,
+            max_rate: float = 0.1,
+            burst: float = 2.0
+    ):
+        self.stages = {stage_name(stage) for stage in stages}
+        self.quantile = quantile
+        self.window = window
+        self.min_calls = min_calls
+        self.max_rate = max_rate
+        self.burst = burst
+        # stage -> times to the first token of the last requests
+        self._latencies: dict[str, deque] = {}
+        self._budget = 0.0
+        self.calls = Counter()
+        self.hedged = Counter()
+        self.hedge_wins = Counter()
+        self.denied = Counter()
+        self._lock = threading.Lock()
+
+    def is_hedged(self, stage: Stage | str) -> bool:
+        return stage_name(stage) in self.stages
+
+    def deadline(self, stage: str) -> float | None:
+        """Seconds without a first token after which a call of `stage` is
+        hedged; `None` until enough requests were timed"""
+        with self._lock:
+            latencies = self._latencies.get(stage, ())
+            if len(latencies) < self.min_calls:
+                return None
+            return percentile(list(latencies), self.quantile)
+
+    def observe(self, stage: str, first_token_latency: float):
+        with self._lock:
+            self._latencies.setdefault(
+                stage,
+                deque(maxlen=self.window)
+            ).append(first_token_latency)
+
+    def _start_call(self, stage: str):
+        with self._lock:
+            self.calls[stage] += 1
+            self._budget = min(self.burst, self._budget + self.max_rate)
+
+    def _acquire(self, stage: str) -> bool:
+        """Takes a hedge from the budget, if there is one"""
+        with self._lock:
+            if self._budget < 1:
+                self.denied[stage] += 1
+                return False
+            self._budget -= 1
+            self.hedged[stage] += 1
+            return True
+
+    def run(
+            self,
+            stage: str,
+            request: Callable[['_Attempt'], Any],
+            run_manager: Any = None
+    ) -> tuple[Any, bool]:
+        """Runs `request`, hedged after the deadline of `stage`, and returns
+        the result of the winner and whether it was hedged. `request` gets
+        the run manager its tokens must be sent to.
+
+        The loser stops at its next token. A non-streamed loser is not
+        cancelled: its thread keeps running until its response arrives,
+        after `run` returned, and the response is dropped."""
+        self._start_call(stage)
+        race = _Race(self, stage, run_manager, _Attempt)
+        deadline = self.deadline(stage)
+        if deadline is None:
+            # Nothing to hedge against yet: no thread either
+            return race.attempt().run_sync(request), False
+
+        primary = race.attempt()
+        primary.start_thread(request)
+        with race.condition:
+            race.condition.wait_for(lambda: race.decided([primary]),
+                                    timeout=deadline)
+        if not race.decided([primary]) and self._acquire(stage):
+            race.attempt(hedge=True).start_thread(request)
+        with race.condition:
+            race.condition.wait_for(lambda: race.decided(race.attempts))
+        return race.result(), len(race.attempts) > 1
+
+    async def arun(
+            self,
+            stage: str,
+            request: Callable[['_Attempt'], Awaitable[Any]],
+            run_manager: Any = None
+    ) -> tuple[Any, bool]:
+        """`run` for async requests, whose loser is cancelled right away"""
+        self._start_call(stage)
+        race = _Race(self, stage, run_manager, _AsyncAttempt)
+        deadline = self.deadline(stage)
+        if deadline is None:
+            return await race.attempt().run_async(request), False
+
+        tasks = [asyncio.create_task(race.attempt().run_async(request))]
+        try:
+            await race.wait(tasks, deadline)
+            if not race.decided(race.attempts) and self._acquire(stage):
+                tasks.append(asyncio.create_task(
+                    race.attempt(hedge=True).run_async(request)
+                ))
+            while not race.decided(race.attempts):
+                await race.wait(tasks)
+            winner = race.result_attempt()
+            for attempt, task in zip(race.attempts, tasks):
+                if attempt is not winner:
+                    task.cancel()
+            return await tasks[race.attempts.index(winner)], len(tasks) > 1
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> dict[str, dict]:
+        """Calls, hedged calls, hedges that won, hedges denied by the budget
+        and the current deadline of each stage"""
+        with self._lock:
+            stages = set(self.calls)
+        return {
+            stage: {
+                'calls': self.calls[stage],
+                'hedged': self.hedged[stage],
+                'hedge_wins': self.hedge_wins[stage],
+                'denied': self.denied[stage],
+                'deadline': self.deadline(stage)
+            }
+            for stage in sorted(stages)
+        }
+
+
+class _Race:
+    """The requests of one call, and the one whose first token came first"""
+
+    def __init__(
+            self,
+            hedger: Hedger,
+            stage: str,
+            run_manager: Any,
+            attempt_class: type['_Attempt']
+    ):
+        self.hedger = hedger
+        self.stage = stage
+        self.run_manager = run_manager
+        self.attempt_class = attempt_class
+        self.attempts: list[_Attempt] = []
+        self.winner: _Attempt | None = None
+        self.condition = threading.Condition()
+        # Set on every first token, for async calls
+        self.first_token = (asyncio.Event()
+                            if attempt_class is _AsyncAttempt else None)
+
+    def attempt(self, hedge: bool = False) -> '_Attempt':
+        attempt = self.attempt_class(self, hedge)
+        self.attempts.append(attempt)
+        return attempt
+
+    async def wait(self, tasks: list[asyncio.Task],
+                   timeout: float | None = None):
+        """Until a first token, a request is done, or `timeout`"""
+        self.first_token.clear()
+        first_token = asyncio.create_task(self.first_token.wait())
+        try:
+            await asyncio.wait([*tasks, first_token], timeout=timeout,
+                               return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            first_token.cancel()
+
+    def on_first_token(self, attempt: '_Attempt'):
+        with self.condition:
+            if self.winner is None:
+                self.winner = attempt
+                if attempt.hedge:
+                    with self.hedger._lock:
+                        self.hedger.hedge_wins[self.stage] += 1
+            self.condition.notify_all()
+        if self.first_token is not None:
+            self.first_token.set()
+
+    def on_done(self):
+        with self.condition:
+            self.condition.notify_all()
+
+    def decided(self, attempts: list['_Attempt']) -> bool:
+        """Whether there is a winner, or `attempts` are all done without
+        one"""
+        return (self.winner is not None
+                or all(attempt.done for attempt in attempts))
+
+    def result_attempt(self) -> '_Attempt':
+        # When every request failed, the first error is raised
+        return self.winner or self.attempts[0]
+
+    def result(self) -> Any:
+        attempt = self.result_attempt()
+        with self.condition:
+            self.condition.wait_for(lambda: attempt.done)
+        if attempt.error is not None:
+            raise attempt.error
+        return attempt.value
+
+
+class _Attempt:
+    """One request of a race. It is the run manager of its request: its
+    tokens go to the caller's only if it is the winner."""
+
+    def __init__(self, race: _Race, hedge: bool):
+        self.race = race
+        self.hedge = hedge
+        self.start = time.perf_counter()
+        self.first_token = False
+        self.done = False
+        self.value = None
+        self.error = None
+
+    def _token(self) -> bool:
+        """Records the first token, and stops the request if it lost.
+        Returns whether the tokens go to the caller."""
+        if not self.first_token:
+            self.first_token = True
+            # The losers' times count too, or slow requests would be missed
+            self.race.hedger.observe(self.race.stage,
+                                     time.perf_counter() - self.start)
+            self.race.on_first_token(self)
+        if self.race.winner is not self:
+            raise HedgeCancelled()
+        return self.race.run_manager is not None
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        if self._token():
+            return self.race.run_manager.on_llm_new_token(token, **kwargs)
+
+    def _finish(self, value: Any = None, error: BaseException | None = None):
+        if error is None and not self.first_token:
+            # A non-streamed response is its own first token
+            try:
+                self._token()
+            except HedgeCancelled:
+                pass
+        with self.race.condition:
+            self.value = value
+            self.error = error
+            self.done = True
+        self.race.on_done()
+
+    def run_sync(self, request: Callable[['_Attempt'], Any]) -> Any:
+        try:
+            value = request(self)
+        except BaseException as e:
+            self._finish(error=e)
+            raise
+        self._finish(value)
+        return value
+
+    def start_thread(self, request: Callable[['_Attempt'], Any]):
+        def run():
+            try:
+                self.run_sync(request)
+            except BaseException:
+                pass
+
+        # In a copy of the caller's context, for the metrics and limits
+        threading.Thread(target=contextvars.copy_context().run,
+                         args=(run,), daemon=True).start()
+
+    async def run_async(
+            self,
+            request: Callable[['_Attempt'], Awaitable[Any]]
+    ) -> Any:
+        try:
+            value = await request(self)
+        except BaseException as e:
+            self._finish(error=e)
+            raise
+        self._finish(value)
+        return value
+
+
+class _AsyncAttempt(_Attempt):
+    async def on_llm_new_token(self, token: str, **kwargs):
+        if self._token():
+            await self.race.run_manager.on_llm_new_token(token, **kwargs)
+
+
+_hedger: Hedger | None = None
+
+
+def set_hedger(hedger: Hedger | None):
+    """Hedges the calls of the chat models created from now on"""
+    global _hedger
+    _hedger = hedger
+
+
+def get_hedger() -> Hedger | None:
+    return _hedger
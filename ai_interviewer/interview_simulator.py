@@ -1,8 +1,20 @@
+import asyncio
+from dataclasses import asdict
+from functools import partial
+import json
+from pathlib import Path
+import time
+from typing import Callable
+
 from .candidate import Candidate
 from .interviewer import Interviewer
 from .job_description import JobDescription
-from .question_bank import QuestionType
-from .util import print_limit
+from .pipeline import Step, run_steps
+from .question_bank import Question, QuestionType
+from .transcript import Transcript, Turn, TurnKind
+from .util import print_limit, write_atomically
+
+CHECKPOINT_VERSION = 2
 
 
 class InterviewSimulator:
@@ -11,8 +23,33 @@ class InterviewSimulator:
             interviewer: Interviewer,
             candidate: Candidate,
             job_description: JobDescription,
-            min_follow_ups: int = 1
+            min_follow_ups: int = 1,
+            verbose: bool = True,
+            transcript_file: str | Path | None = None,
+            checkpoint_file: str | Path | None = None,
+            pipelined: bool = False,
+            max_background: int = 4,
+            on_block_complete: Callable[[str], None] | None = None
     ):
+        """With `transcript_file`, every turn is streamed to that JSON lines
+        file as it happens.
+
+        With `checkpoint_file`, the state of the interview is saved there
+        after every turn, and `load_checkpoint` resumes an interview that
+        was interrupted from its last completed turn. The turns themselves
+        are read back from `transcript_file`, which is then required.
+
+        With `pipelined`, the interview runs as steps with explicit
+        dependencies (see `_steps`): the questions still in the plan are
+        personalized, at most `max_background` at a time, while the
+        conversation goes on, instead of just before being asked. The
+        transcript is the same.
+
+        `on_block_complete` is called with the block of each behavioral
+        question (see `Transcript.blocks`) as soon as its last turn is done,
+        e.g. `EvidenceCollector.add_block` to summarize the interview while
+        it goes on.
+        """
         self.interviewer = interviewer
         self.candidate = candidate
         self.job_description = job_description
@@ -27,88 +64,318 @@ class InterviewSimulator:
             QuestionType.TECHNICAL_SKILLS,
         ]
         self.min_follow_ups = min_follow_ups
-        self.full_transcript = ''
-        self.short_transcript = ''
+        self.verbose = verbose
+        self.pipelined = pipelined
+        self.max_background = max_background
+        self.on_block_complete = on_block_complete
+        self.transcript = Transcript(
+            short_types=self.questions_with_follow_up,
+            path=transcript_file
+        )
+        if checkpoint_file is not None and transcript_file is None:
+            raise ValueError('A checkpoint_file needs a transcript_file to '
+                             'read the turns back from')
+        self.checkpoint_file = (None if checkpoint_file is None
+                                else Path(checkpoint_file))
+        self.question_index = -1
+        # The question being asked, and how many of its turns are done
+        self.question: Question | None = None
+        self.question_turns = 0
+
+    @property
+    def full_transcript(self) -> str:
+        return self.transcript.full_text
+
+    @property
+    def short_transcript(self) -> str:
+        return self.transcript.short_text
 
     @property
     def is_interview_over(self):
         return len(self.interviewer.interview_plan) == 0
 
     def start(self):
-        # Keep asking questions until the interview is over
-        while not self.is_interview_over:
-            interviewer_message = self.interviewer.ask()
+        if self.pipelined:
+            asyncio.run(self.astart())
+            return
+        # Each turn is a question, a follow-up or a candidate reply
+        while (step := self._next_step()) is not None:
+            self._turn(step)
 
-            # Before asking, we personalize behavioral questions
-            if interviewer_message.question_type in self.questions_with_follow_up:
+    def _turn(self, step: TurnKind):
+        start = time.perf_counter()
+        if step == TurnKind.QUESTION:
+            interviewer_message = self._begin_question(
+                self.interviewer.ask()
+            )
+
+            # Before asking, we personalize behavioral questions, unless
+            # the interviewer did it ahead of time
+            if self._needs_personalization(interviewer_message):
                 interviewer_message.text = self.interviewer.personalize_the_question(
                     interviewer_message.text
                 )
                 interviewer_message.is_streamed = True
 
-            # This means that the previous candidate reply contain a question
-            # from the candidate. Reply it before finishing the interview
+            # This means that the previous candidate reply contain a
+            # question from the candidate. Reply it before finishing the
+            # interview
             if self.is_interview_over:
-                answer = self.interviewer.answer_candidate(candidate_reply)
+                answer = self.interviewer.answer_candidate(
+                    self._last_turn_text()
+                )
                 interviewer_message.text = f'{answer}\n\n{interviewer_message.text}'
                 interviewer_message.is_streamed = True
 
-            self.log(
-                f'\n\nInterviewer:\n{interviewer_message.text}',
-                interviewer_message.question_type,
-                verbose=not interviewer_message.is_streamed
+            self._log_question(interviewer_message, start)
+
+        elif step == TurnKind.ANSWER:
+            # Make the candidate reply to the last question or follow-up
+            candidate_reply = self.candidate.reply(self._last_turn_text())
+            self._log_answer(candidate_reply, start)
+
+        else:
+            # If there are no follow-up questions in the bank, we
+            # generate them; otherwise, we customize them
+            follow_up = self.interviewer.generate_followup_question(
+                raw_follow_up=self._raw_follow_up(),
+                memory=self.candidate.memory
             )
+            self._log_follow_up(follow_up, start)
+
+        self._complete_block()
+        self.save_checkpoint()
 
-            # Make the candidate reply to the personalized question
-            candidate_reply = self.candidate.reply(interviewer_message.text)
-            self.log(
-                f'\n\n{self.candidate.name}:\n{candidate_reply}',
-                interviewer_message.question_type
+    async def astart(self):
+        """Async version of `start`, so many interviews can share one event
+        loop. See `ai_interviewer.runner.arun_interviews`."""
+        if self.pipelined:
+            await run_steps(self._steps(), max_background=self.max_background)
+            return
+        while (step := self._next_step()) is not None:
+            await self._aturn(step)
+
+    async def _aturn(self, step: TurnKind):
+        start = time.perf_counter()
+        if step == TurnKind.QUESTION:
+            interviewer_message = self._begin_question(
+                await self.interviewer.aask()
             )
 
-            # For the behavioral questions, let's ask follow-up questions
-            if interviewer_message.question_type in self.questions_with_follow_up:
-                # Let's define the number of follow-up questions to ask
-                num_follow_ups = max(
-                    self.min_follow_ups,
-                    len(interviewer_message.follow_ups)
+            if self._needs_personalization(interviewer_message):
+                interviewer_message.text = await self.interviewer.apersonalize_the_question(
+                    interviewer_message.text
+                )
+                interviewer_message.is_streamed = True
+
+            if self.is_interview_over:
+                answer = await self.interviewer.aanswer_candidate(
+                    self._last_turn_text()
                 )
-                for i in range(num_follow_ups):
-                    # If there are no follow-up questions in the bank, we
-                    # generate them; otherwise, we customize them
-                    if len(interviewer_message.follow_ups) == 0:
-                        follow_up = self.interviewer.generate_followup_question(
-                            raw_follow_up=None,
-                            memory=self.candidate.memory
-                        )
-                    else:
-                        follow_up = self.interviewer.generate_followup_question(
-                            raw_follow_up=interviewer_message.follow_ups[i],
-                            memory=self.candidate.memory
-                        )
-
-                    self.log(
-                        f'\n\nInterviewer follow-up:\n{follow_up}',
-                        interviewer_message.question_type
-                    )
-
-                    # Make the candidate reply to the personalized follow-up
-                    candidate_reply = self.candidate.reply(follow_up)
-                    self.log(
-                        f'\n\n{self.candidate.name}:\n{candidate_reply}',
-                        interviewer_message.question_type
-                    )
+                interviewer_message.text = f'{answer}\n\n{interviewer_message.text}'
+                interviewer_message.is_streamed = True
+
+            self._log_question(interviewer_message, start)
+
+        elif step == TurnKind.ANSWER:
+            candidate_reply = await self.candidate.areply(
+                self._last_turn_text()
+            )
+            self._log_answer(candidate_reply, start)
+
+        else:
+            follow_up = await self.interviewer.agenerate_followup_question(
+                raw_follow_up=self._raw_follow_up(),
+                memory=self.candidate.memory
+            )
+            self._log_follow_up(follow_up, start)
+
+        self._complete_block()
+        self.save_checkpoint()
+
+    def _steps(self) -> list[Step]:
+        """The rest of the interview as steps. Each turn depends on the one
+        before it: a reply needs the question, a follow-up needs the reply,
+        and the wrap-up answers the candidate's last reply. The
+        personalization of a question only depends on the plan, so it has
+        no dependencies, and the first turn of its question depends on it."""
+        steps = []
+        previous = ()
+
+        def add_turns(count: int, deps: tuple[str, ...] = ()):
+            nonlocal previous
+            for _ in range(count):
+                name = f'turn {len(steps)}'
+                steps.append(Step(name, self._anext_turn, previous + deps))
+                previous = (name,)
+                deps = ()
+
+        if self.question is not None:
+            add_turns(self._num_turns(self.question) - self.question_turns)
+        for index, question in enumerate(self.interviewer.interview_plan):
+            deps = ()
+            if self._needs_personalization(question):
+                name = f'personalize {index}'
+                steps.append(Step(
+                    name,
+                    partial(self.interviewer.apersonalize_ahead, question),
+                    background=True
+                ))
+                deps = (name,)
+            add_turns(self._num_turns(question), deps)
+        return steps
+
+    async def _anext_turn(self):
+        await self._aturn(self._next_step())
+
+    def _num_turns(self, question: Question) -> int:
+        # The question and its reply, then each follow-up and its reply
+        if question.question_type not in self.questions_with_follow_up:
+            return 2
+        num_follow_ups = max(self.min_follow_ups, len(question.follow_ups))
+        return 2 + 2 * num_follow_ups
+
+    def _next_step(self) -> TurnKind | None:
+        """The kind of the next turn, or `None` when the interview is over"""
+        if (self.question is not None
+                and self.question_turns < self._num_turns(self.question)):
+            if self.question_turns % 2 == 1:
+                return TurnKind.ANSWER
+            return TurnKind.FOLLOW_UP
+        if self.is_interview_over:
+            return None
+        return TurnKind.QUESTION
+
+    def _begin_question(self, question: Question) -> Question:
+        self.question = question
+        self.question_index += 1
+        self.question_turns = 0
+        return question
+
+    def _complete_block(self):
+        if (self.on_block_complete is None
+                or self.question.question_type
+                not in self.questions_with_follow_up
+                or self.question_turns < self._num_turns(self.question)):
+            return
+        self.on_block_complete(''.join(
+            turn.render() for turn
+            in self.transcript.select(question_index=self.question_index)
+        ))
+
+    def _needs_personalization(self, question: Question) -> bool:
+        return (question.question_type in self.questions_with_follow_up
+                and not question.is_personalized)
+
+    def _follow_up_index(self) -> int | None:
+        # Turns 2 and 3 are the first follow-up and its reply, and so on
+        if self.question_turns < 2:
+            return None
+        return (self.question_turns - 2) // 2
+
+    def _raw_follow_up(self) -> str | None:
+        if len(self.question.follow_ups) == 0:
+            return None
+        return self.question.follow_ups[self._follow_up_index()]
+
+    def _last_turn_text(self) -> str:
+        return self.transcript.turns[-1].text
+
+    def _log_question(self, question: Question, start: float):
+        self.log(
+            'Interviewer',
+            TurnKind.QUESTION,
+            question.text,
+            question.question_type,
+            latency=time.perf_counter() - start,
+            verbose=not question.is_streamed
+        )
+
+    def _log_answer(self, answer: str, start: float):
+        self.log(
+            self.candidate.name,
+            TurnKind.ANSWER,
+            answer,
+            self.question.question_type,
+            follow_up_index=self._follow_up_index(),
+            latency=time.perf_counter() - start
+        )
+
+    def _log_follow_up(self, follow_up: str, start: float):
+        self.log(
+            'Interviewer',
+            TurnKind.FOLLOW_UP,
+            follow_up,
+            self.question.question_type,
+            follow_up_index=self._follow_up_index(),
+            latency=time.perf_counter() - start
+        )
 
     def log(
             self,
-            message: str,
+            speaker: str,
+            kind: TurnKind,
+            text: str,
             question_type: QuestionType,
+            follow_up_index: int | None = None,
+            latency: float = 0.0,
             verbose: bool = False
-    ):
-        self.full_transcript = f'{self.full_transcript}{message}'
+    ) -> Turn:
+        turn = Turn(
+            speaker=speaker,
+            kind=kind,
+            text=text,
+            question_type=question_type,
+            question_index=self.question_index,
+            follow_up_index=follow_up_index,
+            timestamp=time.time(),
+            latency=latency
+        )
+        self.transcript.append(turn)
+        self.question_turns += 1
+
+        if verbose and self.verbose:
+            print_limit(turn.render())
+        return turn
+
+    def save_checkpoint(self):
+        """Writes the state of the interview to `checkpoint_file`, if any:
+        the current question and the rest of the plan, the messages the
+        candidate's memory uses and the number of turns. Its size does not
+        grow with the transcript, which is streamed to `transcript_file`."""
+        if self.checkpoint_file is None:
+            return
+        state = {
+            'version': CHECKPOINT_VERSION,
+            'question_index': self.question_index,
+            'question': None if self.question is None else asdict(self.question),
+            'question_turns': self.question_turns,
+            'plan': self.interviewer.plan_state(),
+            'memory': self.candidate.memory_messages(),
+            'memory_summary': self.candidate.memory_summary(),
+            'turns': len(self.transcript)
+        }
+        # A crash never leaves half a checkpoint
+        write_atomically(self.checkpoint_file, json.dumps(state))
 
-        if question_type in self.questions_with_follow_up:
-            self.short_transcript = f'{self.short_transcript}{message}'
+    def load_checkpoint(self) -> bool:
+        """Restores the state saved in `checkpoint_file`, so `start` goes on
+        from the last completed turn. Returns whether there was one."""
+        if self.checkpoint_file is None or not self.checkpoint_file.exists():
+            return False
+        with self.checkpoint_file.open('r') as file:
+            state = json.load(file)
+        if state.get('version') != CHECKPOINT_VERSION:
+            return False
 
-        if verbose:
-            print_limit(message)
+        self.question_index = state['question_index']
+        self.question = (None if state['question'] is None
+                         else Question(**state['question']))
+        self.question_turns = state['question_turns']
+        self.interviewer.restore_plan(state['plan'])
+        self.candidate.restore_memory(
+            state['memory'],
+            state.get('memory_summary')
+        )
+        self.transcript.reload(state['turns'])
+        return True
@@ -1,16 +1,84 @@
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+import contextvars
+from dataclasses import asdict
+from enum import Enum
 from types import MappingProxyType
+from typing import TYPE_CHECKING
 
-from langchain import LLMChain
-from langchain.chat_models import ChatOpenAI
-from langchain.prompts.chat import (
-    ChatPromptTemplate,
-    SystemMessagePromptTemplate,
-    HumanMessagePromptTemplate,
+from .question_bank import sample_questions, QuestionType, Question
+from .stages import Stage
+from .transcript import Transcript, split_blocks
+from .util import chunk_text, estimate_tokens, print_limit
+
+if TYPE_CHECKING:
+    from langchain import LLMChain
+
+    from .evidence import EvidenceCollector
+    from langchain.memory.chat_memory import BaseChatMemory
+
+
+NOT_PERSONALIZED = (QuestionType.ICE_BREAKERS, QuestionType.WRAP_UP)
+
+FINAL_INSTRUCTION = (
+    'Please support your answers with specific examples provided by '
+    'the candidate in the interview transcript. To support your '
+    'answers with specific examples, mention the companies and the '
+    'projects that he/she worked on and all details. Be critical.\n'
+    'Your answer must be no longer than 1 paragraph.'
 )
-from langchain.memory import ConversationBufferWindowMemory
 
-from .question_bank import sample_questions, QuestionType, Question
-from .util import print_limit, StreamingStdOutLimitedCallbackHandler
+CRITERIA_AND_QUESTIONS = MappingProxyType({
+    'General cognitive ability': (
+        'Please describe how well or not the candidate '
+        'demonstrated general cognitive ability. ',
+        'Describe how well or not the candidate is a good problem '
+        'solver.',
+        'Describe how well the candidate can learn and adapt to '
+        'situations. '
+    ),
+    'Leadership': (
+        'Please describe how well or not the candidate demonstrated '
+        'leadership. ',
+        'Describe how well or not the candidate demonstrated the '
+        'ability to set a vision, energize the team to accomplish '
+        'that vision, and enable the team by removing obstacles.',
+        'Describe how well or not the candidate collaborates well in '
+        'a team. '
+    ),
+    'Cultural fit': (
+        'Please describe how well or not the candidate demonstrated '
+        'intellectual humility. ',
+        'Describe how well or not the candidate demonstrated '
+        'conscientiousness and acted as an owner. ',
+        'Describe how well or not the candidate demonstrated comfort '
+        'with ambiguity. '
+    ),
+    'Role related knowledge': (
+        'Please describe how well or not the candidate demonstrated '
+        '{job} skills, specifically in the area of {area}. ',
+    )
+})
+
+# Prompt tokens for a transcript part in the map step of the summary
+DEFAULT_TOKEN_BUDGET = 3000
+# Transcript parts whose evidence is extracted at once, by default
+DEFAULT_EVIDENCE_WORKERS = 8
+
+
+class SummaryMode(str, Enum):
+    # Every criterion question is sent with the whole transcript
+    FULL = 'full'
+    # The evidence of each question block is extracted first, in parallel,
+    # and the criterion questions are sent with that evidence only
+    MAP_REDUCE = 'map_reduce'
+    # Like MAP_REDUCE, but the evidence of each block is extracted as soon
+    # as the block is done (see `EvidenceCollector`), and merged into the
+    # answers of every criterion question in one call
+    INCREMENTAL = 'incremental'
+    # Every criterion question and the recommendation are answered in one
+    # call, as a JSON object (see `evaluation`)
+    STRUCTURED = 'structured'
 
 
 class Interviewer:
@@ -30,14 +98,21 @@ class Interviewer:
                 QuestionType.SYSTEMS_THINKING: 0,
                 QuestionType.TECHNICAL_SKILLS: 1
             }),
-            streaming: bool = False
+            streaming: bool = False,
+            prepersonalize: bool = False,
+            personalization_workers: int = 8
     ):
+        """With `prepersonalize`, the bank questions of the interview plan are
+        personalized concurrently in the background right away, instead of
+        one by one just before being asked (see `personalize_plan`)."""
         self.candidate_name = candidate_name
         self.first_name = candidate_name.split(' ')[0]
         self.job = job,
         self.area = area
         self.company = company
         self.streaming = streaming
+        self._chains = {}
+        self._personalizations = {}
 
         ice_breakers = [
             f"Hi! Welcome, {self.first_name}!",
@@ -63,36 +138,130 @@ class Interviewer:
 
         self.interview_plan += wrap_up
 
+        if prepersonalize:
+            self.personalize_plan(
+                max_workers=personalization_workers,
+                background=True
+            )
+
     def ask(self):
         if len(self.interview_plan) > 0:
-            return self.interview_plan.pop(0)
+            question = self.interview_plan.pop(0)
+            future = self._personalizations.pop(id(question), None)
+            if future is not None:
+                question.text = future.result()
+                question.is_personalized = True
+            return question
         else:
             return None
 
-    def personalize_the_question(self, question: str) -> str:
-        system_message_prompt = SystemMessagePromptTemplate.from_template(
-            template="You are an interviewer working at {company}. You are "
-                     "interviewing {name} for a {job} position. This is "
-                     "an ongoing interview. You are in the middle of it.\n"
-                     "Rewrite the question below, considering this. Do not "
-                     "change the meaning of the question. You may or may not "
-                     "mention the candidate's name. Make it friendly.\n\n"
-        )
-        human_message_prompt = HumanMessagePromptTemplate.from_template(
-            template="Question: {question}"
+    async def aask(self):
+        """Async version of `ask`, which does not block the event loop while
+        waiting for a background personalization"""
+        if len(self.interview_plan) > 0:
+            question = self.interview_plan.pop(0)
+            future = self._personalizations.pop(id(question), None)
+            if future is not None:
+                if isinstance(future, Future):
+                    future = asyncio.wrap_future(future)
+                question.text = await future
+                question.is_personalized = True
+            return question
+        else:
+            return None
+
+    def plan_state(self) -> list[dict]:
+        """The rest of the interview plan as dicts, with the background
+        personalizations already finished applied"""
+        plan = []
+        for question in self.interview_plan:
+            state = asdict(question)
+            future = self._personalizations.get(id(question))
+            if (future is not None and future.done() and not future.cancelled()
+                    and future.exception() is None):
+                state['text'] = future.result()
+                state['is_personalized'] = True
+            plan.append(state)
+        return plan
+
+    def restore_plan(self, plan: list[dict]):
+        """Replaces the interview plan by one from `plan_state`"""
+        self.interview_plan = [Question(**state) for state in plan]
+        self._personalizations = {}
+
+    def personalize_plan(
+            self,
+            max_workers: int = 8,
+            background: bool = False
+    ):
+        """Personalizes every bank question of the interview plan at once.
+
+        The personalization only depends on the company, job and candidate
+        name, so it does not have to wait for the interview to reach each
+        question. With `background`, this returns right away and `ask` waits
+        for the question it returns, if it is not ready yet.
+        """
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        for question in self._questions_to_personalize():
+            # In a copy of the caller's context, so the models created there
+            # keep its interview and priority
+            self._personalizations[id(question)] = executor.submit(
+                contextvars.copy_context().run,
+                self._personalize_silently,
+                question.text
+            )
+        executor.shutdown(wait=not background)
+
+    async def apersonalize_plan(self, background: bool = False):
+        """Async version of `personalize_plan`"""
+        tasks = []
+        for question in self._questions_to_personalize():
+            task = asyncio.create_task(
+                self._apersonalize_silently(question.text)
+            )
+            self._personalizations[id(question)] = task
+            tasks.append(task)
+        if not background:
+            await asyncio.gather(*tasks)
+
+    async def apersonalize_ahead(self, question: Question):
+        """Personalizes `question`, still in the interview plan, in place, so
+        `aask` returns it as it is. Does nothing if it is not to be
+        personalized or `personalize_plan` is already doing it."""
+        if not any(other is question
+                   for other in self._questions_to_personalize()):
+            return
+        question.text = await self._apersonalize_silently(question.text)
+        question.is_personalized = True
+
+    def _questions_to_personalize(self) -> list[Question]:
+        return [question for question in self.interview_plan
+                if question.question_type not in NOT_PERSONALIZED
+                and not question.is_personalized
+                and id(question) not in self._personalizations]
+
+    def _personalize_silently(self, question: str) -> str:
+        # Not streamed: concurrent outputs would interleave on stdout
+        chain = self._chain(Stage.PERSONALIZE, 'PERSONALIZE_PROMPT', False)
+        return chain.predict(
+            company=self.company,
+            job=self.job,
+            name=self.candidate_name,
+            question=question
         )
-        chat_prompt = ChatPromptTemplate.from_messages([
-            system_message_prompt,
-            human_message_prompt
-        ])
-
-        chain = LLMChain(llm=ChatOpenAI(
-            temperature=0.5,
-            streaming=self.streaming,
-            callbacks=[StreamingStdOutLimitedCallbackHandler()]
-        ), prompt=chat_prompt
+
+    async def _apersonalize_silently(self, question: str) -> str:
+        chain = self._chain(Stage.PERSONALIZE, 'PERSONALIZE_PROMPT', False)
+        return await chain.apredict(
+            company=self.company,
+            job=self.job,
+            name=self.candidate_name,
+            question=question
         )
 
+    def personalize_the_question(self, question: str) -> str:
+        chain = self._personalize_chain()
+
         if self.streaming:
             print(f'\n\nInterviewer: ')
 
@@ -104,84 +273,74 @@ class Interviewer:
         )
         return output
 
+    async def apersonalize_the_question(self, question: str) -> str:
+        chain = self._personalize_chain()
+
+        if self.streaming:
+            print(f'\n\nInterviewer: ')
+
+        output = await chain.apredict(
+            company=self.company,
+            job=self.job,
+            name=self.candidate_name,
+            question=question
+        )
+        return output
+
+    def _personalize_chain(self) -> 'LLMChain':
+        return self._chain(Stage.PERSONALIZE, 'PERSONALIZE_PROMPT')
+
     def generate_followup_question(
             self,
             raw_follow_up: str | None,
-            memory: ConversationBufferWindowMemory | str,
+            memory: 'BaseChatMemory | str',
     ) -> str:
-        if isinstance(memory, ConversationBufferWindowMemory):
-            history = memory.load_memory_variables({})[memory.memory_key]
-        elif isinstance(memory, str):
-            history = memory
+        chain = self._followup_chain(raw_follow_up)
 
-        if raw_follow_up == '' or raw_follow_up is None:
-            system_message_prompt = SystemMessagePromptTemplate.from_template(
-                template="You are an interviewer working at {company}. You are "
-                         "interviewing {name} for a {job} position.\n"
-                         "You must ask a follow-up question related to the "
-                         "conversation so far. The follow-up question must be "
-                         "related to {name}'s last answer.\n"
-            )
-        else:
-            system_message_prompt = SystemMessagePromptTemplate.from_template(
-                template="You are an interviewer working at {company}. You are "
-                         "interviewing {name} for a {job} position.\n"
-                         "You must ask a follow-up question related to the "
-                         "conversation so far. The follow-up question must be "
-                         "related to {name}'s last answer.\n"
-                         "Use this follow-up question idea, and adapt it to "
-                         "the context of the current interview.\n\n"
-                         "Follow-up question idea:\n{raw_follow_up}\n"
-            )
+        if self.streaming:
+            print('\n\nInterviewer: ')
 
-        human_message_prompt = HumanMessagePromptTemplate.from_template(
-            template="Conversation so far:\n{history}"
-        )
-        chat_prompt = ChatPromptTemplate.from_messages([
-            system_message_prompt,
-            human_message_prompt
-        ])
-
-        chain = LLMChain(llm=ChatOpenAI(
-            temperature=0.5,
-            streaming=self.streaming,
-            callbacks=[StreamingStdOutLimitedCallbackHandler()]
-        ), prompt=chat_prompt
+        output = chain.predict(
+            company=self.company,
+            job=self.job,
+            name=self.candidate_name,
+            history=self._history(memory),
+            raw_follow_up=raw_follow_up
         )
+        return output
+
+    async def agenerate_followup_question(
+            self,
+            raw_follow_up: str | None,
+            memory: 'BaseChatMemory | str',
+    ) -> str:
+        chain = self._followup_chain(raw_follow_up)
 
         if self.streaming:
             print('\n\nInterviewer: ')
 
-        output = chain.predict(
+        output = await chain.apredict(
             company=self.company,
             job=self.job,
             name=self.candidate_name,
-            history=history,
+            history=self._history(memory),
             raw_follow_up=raw_follow_up
         )
         return output
 
+    @staticmethod
+    def _history(memory: 'BaseChatMemory | str') -> str:
+        if isinstance(memory, str):
+            return memory
+        return memory.load_memory_variables({})[memory.memory_key]
+
+    def _followup_chain(self, raw_follow_up: str | None) -> 'LLMChain':
+        if raw_follow_up == '' or raw_follow_up is None:
+            return self._chain(Stage.FOLLOW_UP, 'FOLLOW_UP_PROMPT')
+        return self._chain(Stage.FOLLOW_UP, 'FOLLOW_UP_WITH_IDEA_PROMPT')
+
     def answer_candidate(self, question: str) -> str:
-        system_message_prompt = SystemMessagePromptTemplate.from_template(
-            template="You are an interviewer working at {company}. You are "
-                     "interviewing {name} for a {job} position.\n"
-                     "Answer the questions that the candidate is asking."
-                     "Be creative. Give a detailed answer.\n\n"
-        )
-        human_message_prompt = HumanMessagePromptTemplate.from_template(
-            template="{name}: {question}\nInterviewer:"
-        )
-        chat_prompt = ChatPromptTemplate.from_messages([
-            system_message_prompt,
-            human_message_prompt
-        ])
-
-        chain = LLMChain(llm=ChatOpenAI(
-            temperature=0.5,
-            streaming=self.streaming,
-            callbacks=[StreamingStdOutLimitedCallbackHandler()]
-        ), prompt=chat_prompt
-        )
+        chain = self._answer_chain()
 
         if self.streaming:
             print('\n\nInterviewer: ')
@@ -194,84 +353,97 @@ class Interviewer:
         )
         return output
 
+    async def aanswer_candidate(self, question: str) -> str:
+        chain = self._answer_chain()
+
+        if self.streaming:
+            print('\n\nInterviewer: ')
+
+        output = await chain.apredict(
+            company=self.company,
+            job=self.job,
+            name=self.candidate_name,
+            question=question
+        )
+        return output
+
+    def _answer_chain(self) -> 'LLMChain':
+        return self._chain(Stage.ANSWER_CANDIDATE, 'ANSWER_CANDIDATE_PROMPT')
+
     def summarize_interview(
             self,
-            transcript: str,
+            transcript: str | Transcript,
             num_words: int = 200,
-            verbose: bool = True
+            verbose: bool = True,
+            max_workers: int = 1,
+            mode: SummaryMode = SummaryMode.FULL,
+            token_budget: int | None = None,
+            evidence: 'EvidenceCollector | None' = None,
+            max_reasks: int = 2
     ) -> str:
-        summary = ''
+        """Answers every question in `CRITERIA_AND_QUESTIONS` about the
+        transcript and closes with an overall recommendation.
+
+        With `max_workers` > 1 the criterion questions, which do not depend
+        on each other, are sent concurrently. Their answers are put back in
+        order before the recommendation, so the summary is the same as in the
+        sequential mode. Answers are printed when they are all done instead
+        of streamed, to avoid interleaving.
+
+        In `SummaryMode.MAP_REDUCE` the criterion questions are sent with the
+        evidence from `extract_evidence` instead of the whole transcript.
+        In `SummaryMode.FULL`, a transcript longer than `token_budget` is
+        summarized that way too.
+
+        In `SummaryMode.INCREMENTAL` the evidence comes from `evidence`, which
+        extracted it during the interview, and the criterion questions are
+        all answered in one call. Without `evidence`, it is extracted now.
+
+        In `SummaryMode.STRUCTURED` the criterion questions and the
+        recommendation are all answered in one call with the transcript.
+        The fields missing from its answer, or malformed, are asked again
+        up to `max_reasks` times, and then each on its own.
+        """
+        if isinstance(transcript, Transcript):
+            text = transcript.short_text
+        else:
+            text = transcript
+        if (mode == SummaryMode.FULL and token_budget is not None
+                and estimate_tokens(text) > token_budget):
+            mode = SummaryMode.MAP_REDUCE
+
+        if mode == SummaryMode.INCREMENTAL:
+            return self._summarize_evidence(
+                transcript,
+                evidence,
+                verbose,
+                token_budget or DEFAULT_TOKEN_BUDGET
+            )
 
-        system_message_prompt = SystemMessagePromptTemplate.from_template(
-            template="You are an interviewer working at {company}. You just "
-                     "interviewed {name} for a {job} position.\n"
-                     "You have the interview transcript.\n"
-                     "Your objective is to summarize the interview, "
-                     "answering questions about it.\n"
-                     "Your answers must only be based on the interview "
-                     "transcript. If you cannot answer the questions, "
-                     "just say that there is not enough evidence in the "
-                     "interview to assertively answer the questions.\n"
-                     "Your answer must be no longer than 1 paragraph.\n\n"
-        )
-        human_message_prompt = HumanMessagePromptTemplate.from_template(
-            template="Interview transcript:\n\n{transcript}\n\n\n"
-                     "Based on the interview transcript, answer the following "
-                     "question:\n{question}\n{final_instruction}"
-        )
-        chat_prompt = ChatPromptTemplate.from_messages([
-            system_message_prompt,
-            human_message_prompt
-        ])
-
-        chain = LLMChain(llm=ChatOpenAI(
-            temperature=0.5,
-            streaming=self.streaming,
-            callbacks=[StreamingStdOutLimitedCallbackHandler()]
-        ), prompt=chat_prompt
-        )
+        if mode == SummaryMode.STRUCTURED:
+            summary = self._summarize_structured(text, max_reasks)
+            if verbose:
+                print_limit(summary)
+            return summary
+
+        prompt = 'SUMMARY_PROMPT'
+        if mode == SummaryMode.MAP_REDUCE:
+            text = self.extract_evidence(
+                transcript,
+                token_budget=token_budget or DEFAULT_TOKEN_BUDGET,
+                max_workers=max_workers
+            )
+            prompt = 'EVIDENCE_SUMMARY_PROMPT'
 
-        final_instruction = (
-            'Please support your answers with specific examples provided by '
-            'the candidate in the interview transcript. To support your '
-            'answers with specific examples, mention the companies and the '
-            'projects that he/she worked on and all details. Be critical.\n'
-            'Your answer must be no longer than 1 paragraph.'
-        )
+        if max_workers > 1:
+            return self._summarize_interview_concurrently(
+                text, num_words, verbose, max_workers, prompt
+            )
 
-        criteria_and_questions = {
-            'General cognitive ability': [
-                'Please describe how well or not the candidate '
-                'demonstrated general cognitive ability. ',
-                'Describe how well or not the candidate is a good problem '
-                'solver.',
-                'Describe how well the candidate can learn and adapt to '
-                'situations. '
-            ],
-            'Leadership': [
-                'Please describe how well or not the candidate demonstrated '
-                'leadership. ',
-                'Describe how well or not the candidate demonstrated the '
-                'ability to set a vision, energize the team to accomplish '
-                'that vision, and enable the team by removing obstacles.',
-                'Describe how well or not the candidate collaborates well in '
-                'a team. '
-            ],
-            'Cultural fit': [
-                'Please describe how well or not the candidate demonstrated '
-                'intellectual humility. ',
-                'Describe how well or not the candidate demonstrated '
-                'conscientiousness and acted as an owner. ',
-                'Describe how well or not the candidate demonstrated comfort '
-                'with ambiguity. '
-            ],
-            'Role related knowledge': [
-                'Please describe how well or not the candidate demonstrated '
-                '{job} skills, specifically in the area of {area}. '
-            ]
-        }
-
-        for criteria, questions in criteria_and_questions.items():
+        summary = ''
+        chain = self._summary_chain(streaming=self.streaming, prompt=prompt)
+
+        for criteria, questions in CRITERIA_AND_QUESTIONS.items():
             summary = f'{summary}{criteria}:\n\n'
             if verbose:
                 print_limit(f'{criteria}:\n\n')
@@ -284,10 +456,10 @@ class Interviewer:
                     job=self.job,
                     area=self.area,
                     name=self.candidate_name,
-                    transcript=transcript,
+                    transcript=text,
                     question=question,
                     num_words=num_words,
-                    final_instruction=final_instruction
+                    final_instruction=FINAL_INSTRUCTION
                 ).strip()
                 summary = f'{summary}{output}\n\n'
                 if verbose and not self.streaming:
@@ -307,36 +479,251 @@ class Interviewer:
         summary = f'Recommendation:\n\n{overall}\n\n\n{summary}'
         return summary
 
-    def overall_recommendation(self, summary):
-        system_message_prompt = SystemMessagePromptTemplate.from_template(
-            template="You are an interviewer working at {company}. You just "
-                     "interviewed {name} for a {job} position, to work with "
-                     "{area}.\nYou have the interview summary.\n"
-                     "Your objective is to generate 1 paragraph with an "
-                     "overall recommendation of whether or not the candidate "
-                     "should be hired. Your answer must be no longer than 1 "
-                     "paragraph.\n\n"
-        )
-        human_message_prompt = HumanMessagePromptTemplate.from_template(
-            template="Interview summary:\n\n{summary}\n\n\n"
-                     "Based on the interview summary, please provide an "
-                     "overall recommendation of whether or not the candidate "
-                     "should be hired. Provide strengths and weaknesses in "
-                     "your assessment. Be critical. Your answer must be no "
-                     "longer than 1 paragraph."
+    def _summarize_interview_concurrently(
+            self,
+            transcript: str,
+            num_words: int,
+            verbose: bool,
+            max_workers: int,
+            prompt: str = 'SUMMARY_PROMPT'
+    ) -> str:
+        chain = self._summary_chain(streaming=False, prompt=prompt)
+
+        def answer(question):
+            return chain.predict(
+                company=self.company,
+                job=self.job,
+                area=self.area,
+                name=self.candidate_name,
+                transcript=transcript,
+                question=question,
+                num_words=num_words,
+                final_instruction=FINAL_INSTRUCTION
+            ).strip()
+
+        questions = [question
+                     for questions in CRITERIA_AND_QUESTIONS.values()
+                     for question in questions]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # map keeps the answers in the order of the questions
+            outputs = iter(executor.map(answer, questions))
+
+        summary = ''
+        for criteria, questions in CRITERIA_AND_QUESTIONS.items():
+            summary = f'{summary}{criteria}:\n\n'
+            if verbose:
+                print_limit(f'{criteria}:\n\n')
+            for _ in questions:
+                output = next(outputs)
+                summary = f'{summary}{output}\n\n'
+                if verbose:
+                    print_limit(f'{output}\n\n')
+            summary = f'{summary}\n'
+            if verbose:
+                print(' ')
+
+        overall = self.overall_recommendation(summary)
+        if verbose and not self.streaming:
+            print_limit(f'\n\nRecommendation:\n\n{overall}')
+
+        summary = f'Recommendation:\n\n{overall}\n\n\n{summary}'
+        return summary
+
+    def _summarize_structured(self, transcript: str, max_reasks: int) -> str:
+        from .evaluation import (
+            criterion_questions,
+            evaluation_fields,
+            json_schema,
+            parse_evaluation,
+            RECOMMENDATION,
+            render_criteria,
+            render_evaluation,
         )
-        chat_prompt = ChatPromptTemplate.from_messages([
-            system_message_prompt,
-            human_message_prompt
-        ])
-
-        chain = LLMChain(llm=ChatOpenAI(
-            temperature=0.5,
-            streaming=self.streaming,
-            callbacks=[StreamingStdOutLimitedCallbackHandler()]
-        ), prompt=chat_prompt
+
+        # Not streamed: the JSON is rendered when it is complete
+        chain = self._chain(Stage.EVALUATION, 'EVALUATION_PROMPT', False)
+        fields = evaluation_fields()
+        answers = {}
+        missing = fields
+        for _ in range(1 + max_reasks):
+            output = chain.predict(
+                company=self.company,
+                job=self.job,
+                area=self.area,
+                name=self.candidate_name,
+                transcript=transcript,
+                schema=json_schema(missing)
+            )
+            answers.update(parse_evaluation(output, missing))
+            missing = {field: description
+                       for field, description in fields.items()
+                       if field not in answers}
+            if len(missing) == 0:
+                return render_evaluation(answers)
+
+        # Left unanswered: the questions are asked one by one, like in
+        # SummaryMode.FULL
+        summary_chain = self._summary_chain(streaming=False)
+        for field, _, question in criterion_questions():
+            if field in missing:
+                answers[field] = summary_chain.predict(
+                    company=self.company,
+                    job=self.job,
+                    area=self.area,
+                    name=self.candidate_name,
+                    transcript=transcript,
+                    question=question,
+                    final_instruction=FINAL_INSTRUCTION
+                ).strip()
+        if RECOMMENDATION in missing:
+            answers[RECOMMENDATION] = self._chain(
+                Stage.RECOMMENDATION, 'RECOMMENDATION_PROMPT', False
+            ).predict(
+                company=self.company,
+                job=self.job,
+                area=self.area,
+                name=self.candidate_name,
+                summary=render_criteria(answers)
+            ).strip()
+        return render_evaluation(answers)
+
+    def _summarize_evidence(
+            self,
+            transcript: str | Transcript,
+            evidence: 'EvidenceCollector | None',
+            verbose: bool,
+            token_budget: int
+    ) -> str:
+        if evidence is None:
+            from .evidence import EvidenceCollector
+
+            evidence = EvidenceCollector(self, token_budget=token_budget)
+        text = evidence.evidence(transcript)
+        evidence.close()
+
+        chain = self._chain(Stage.EVIDENCE_MERGE, 'EVIDENCE_MERGE_PROMPT')
+        summary = chain.predict(
+            company=self.company,
+            job=self.job,
+            area=self.area,
+            name=self.candidate_name,
+            criteria=self._criteria(),
+            evidence=text
+        ).strip()
+        if verbose and not self.streaming:
+            print_limit(f'{summary}\n\n')
+        if self.streaming:
+            print('\n')
+
+        overall = self.overall_recommendation(summary)
+        if verbose and not self.streaming:
+            print_limit(f'\n\nRecommendation:\n\n{overall}')
+
+        summary = f'Recommendation:\n\n{overall}\n\n\n{summary}\n\n'
+        return summary
+
+    def extract_evidence(
+            self,
+            transcript: str | Transcript,
+            token_budget: int = DEFAULT_TOKEN_BUDGET,
+            max_workers: int = DEFAULT_EVIDENCE_WORKERS
+    ) -> str:
+        """Map step of the map-reduce summary: extracts the evidence for
+        every criterion from each question block of the transcript.
+
+        Blocks longer than `token_budget` are split in parts. The parts are
+        sent concurrently, `max_workers` at a time. If the evidence itself is
+        longer than `token_budget`, it is condensed again the same way.
+        """
+        if isinstance(transcript, Transcript):
+            blocks = transcript.blocks()
+        else:
+            blocks = split_blocks(transcript)
+        parts = [part for block in blocks
+                 for part in chunk_text(block, token_budget)]
+
+        evidence = self._extract_evidence(parts, max_workers)
+        while estimate_tokens(evidence) > token_budget:
+            condensed_parts = chunk_text(evidence, token_budget)
+            if len(condensed_parts) >= len(parts):
+                break
+            parts = condensed_parts
+            evidence = self._extract_evidence(parts, max_workers)
+        return evidence
+
+    def extract_block_evidence(
+            self,
+            block: str,
+            token_budget: int = DEFAULT_TOKEN_BUDGET
+    ) -> str:
+        """The evidence of one question block, split in parts if it is
+        longer than `token_budget`"""
+        return self._extract_evidence(chunk_text(block, token_budget), 1)
+
+    @staticmethod
+    def _criteria() -> str:
+        return '\n'.join(
+            f'- {criteria}: {" ".join(q.strip() for q in questions)}'
+            for criteria, questions in CRITERIA_AND_QUESTIONS.items()
         )
 
+    def _extract_evidence(self, parts: list[str], max_workers: int) -> str:
+        if len(parts) == 0:
+            return ''
+        chain = self._chain(Stage.EVIDENCE, 'EVIDENCE_PROMPT', streaming=False)
+        criteria = self._criteria()
+
+        def extract(part):
+            return chain.predict(
+                company=self.company,
+                job=self.job,
+                area=self.area,
+                name=self.candidate_name,
+                criteria=criteria,
+                transcript=part
+            ).strip()
+
+        workers = min(len(parts), max_workers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            outputs = list(executor.map(extract, parts))
+        return '\n\n'.join(f'Part {i + 1}:\n{output}'
+                           for i, output in enumerate(outputs))
+
+    def _summary_chain(
+            self,
+            streaming: bool,
+            prompt: str = 'SUMMARY_PROMPT'
+    ) -> 'LLMChain':
+        return self._chain(Stage.CRITERION, prompt, streaming)
+
+    def _chain(
+            self,
+            stage: Stage,
+            prompt: str,
+            streaming: bool | None = None
+    ) -> 'LLMChain':
+        """Returns the chain for the `prompt` template of `prompts`, built on
+        first use and then reused by every turn of this interviewer"""
+        if streaming is None:
+            streaming = self.streaming
+        key = (stage, prompt, streaming)
+        if key not in self._chains:
+            from langchain import LLMChain
+
+            from . import prompts
+            from .llm import create_chat_model
+
+            self._chains[key] = LLMChain(llm=create_chat_model(
+                stage,
+                temperature=0.5,
+                streaming=streaming
+            ), prompt=getattr(prompts, prompt)
+            )
+        return self._chains[key]
+
+    def overall_recommendation(self, summary):
+        chain = self._chain(Stage.RECOMMENDATION, 'RECOMMENDATION_PROMPT')
+
         if self.streaming:
             print('\nRecommendation: \n')
 
@@ -0,0 +1,509 @@
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+import time
+from typing import Any, List, Optional
+
+import aiohttp
+from langchain.callbacks.manager import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain.chat_models import ChatOpenAI
+from langchain.schema import AIMessage, BaseMessage, ChatGeneration, ChatResult
+import openai
+from pydantic import root_validator
+
+from .cache import get_llm_cache, LLMCache
+from .callbacks import (
+    MetricsCallbackHandler,
+    StreamingCallbackHandler,
+    StreamingStdOutLimitedCallbackHandler,
+)
+from .fake_llm import CassetteMode, get_cassette, get_llm_backend
+from .hedging import get_hedger
+from .metrics import current_interview, get_metrics_recorder
+from .ratelimit import current_priority, get_rate_limiter, Priority
+from .routing import get_router, Route
+from .stages import Stage
+from .streaming import get_stream_hub
+from .util import estimate_tokens
+
+# Requests sent by the model call in progress, retries included
+_attempts: ContextVar[list[int] | None] = ContextVar('attempts', default=None)
+# Model the router chose for the call in progress
+_model: ContextVar[str | None] = ContextVar('model', default=None)
+
+
+# Errors after which a request is sent again
+RETRYABLE_ERRORS = (
+    openai.error.Timeout,
+    openai.error.APIError,
+    openai.error.APIConnectionError,
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+)
+
+# Completion tokens counted for a request without `max_tokens`
+DEFAULT_COMPLETION_TOKENS = 256
+
+
+class _CountingClient:
+    """Wraps the OpenAI client to count the requests of each call, and to
+    send them through the rate limiter, if any"""
+
+    def __init__(self, client: Any, priority: Priority = Priority.INTERACTIVE):
+        self.client = client
+        self.priority = priority
+
+    def _count(self):
+        attempts = _attempts.get()
+        if attempts is not None:
+            attempts[0] += 1
+
+    @staticmethod
+    def _tokens(kwargs: dict) -> int:
+        """Tokens the request may use, counted before sending it"""
+        prompt_tokens = sum(estimate_tokens(message.get('content') or '')
+                            for message in kwargs.get('messages', []))
+        completion_tokens = (kwargs.get('max_tokens')
+                             or DEFAULT_COMPLETION_TOKENS)
+        return prompt_tokens + completion_tokens * kwargs.get('n', 1)
+
+    def create(self, **kwargs: Any) -> Any:
+        def send():
+            self._count()
+            return self.client.create(**kwargs)
+
+        limiter = get_rate_limiter()
+        if limiter is None:
+            return send()
+        return limiter.call(send, self._tokens(kwargs), self.priority,
+                            retry_on=RETRYABLE_ERRORS)
+
+    async def acreate(self, **kwargs: Any) -> Any:
+        async def send():
+            self._count()
+            return await self.client.acreate(**kwargs)
+
+        limiter = get_rate_limiter()
+        if limiter is None:
+            return await send()
+        return await limiter.acall(send, self._tokens(kwargs), self.priority,
+                                   retry_on=RETRYABLE_ERRORS)
+
+
+class ChatModel(ChatOpenAI):
+    """`ChatOpenAI` that knows which pipeline stage it serves, so calls can
+    be cached per stage, and the priority of its requests in the rate
+    limiter.
+
+    With a `router`, each call goes to the model it selects for the stage,
+    and its latency is reported back to it. With a `hedger`, slow requests
+    are sent twice (see `hedging`). The `llm_output` of every call has its
+    `model_name`, `retries` and whether it was `hedged`, and `cached` when
+    the response came from the cache or a cassette.
+    """
+    stage: str = ''
+    priority: Priority = Priority.INTERACTIVE
+    # `Router` of the model's calls
+    router: Any = None
+    # `Hedger` of the model's calls
+    hedger: Any = None
+
+    @root_validator(skip_on_failure=True)
+    def count_attempts(cls, values: dict) -> dict:
+        if not isinstance(values.get('client'), _CountingClient):
+            values['client'] = _CountingClient(
+                values.get('client'),
+                values.get('priority', Priority.INTERACTIVE)
+            )
+        return values
+
+    def _cache_key(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]]
+    ) -> str:
+        return LLMCache.make_key(
+            [(message.type, message.content) for message in messages],
+            stop=stop,
+            **self._cache_params()
+        )
+
+    def _cache_params(self) -> dict:
+        """Parameters of the call in progress that its response depends on"""
+        return {
+            'model': self._model(),
+            'temperature': self.temperature,
+            'max_tokens': self.max_tokens,
+            'n': self.n
+        }
+
+    def _model(self) -> str:
+        """The model of the call in progress"""
+        return _model.get() or self.model_name
+
+    def _create_message_dicts(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]]
+    ) -> tuple[list[dict], dict]:
+        message_dicts, params = super()._create_message_dicts(messages, stop)
+        params['model'] = self._model()
+        return message_dicts, params
+
+    def _result(
+            self,
+            generations: list[str],
+            cached: bool = False
+    ) -> ChatResult:
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=text))
+                         for text in generations],
+            llm_output={'token_usage': {}, 'model_name': self._model(),
+                        'cached': cached}
+        )
+
+    def _combine_llm_outputs(self, llm_outputs: List[Optional[dict]]) -> dict:
+        outputs = [output for output in llm_outputs if output is not None]
+        combined = super()._combine_llm_outputs(outputs)
+        combined['retries'] = sum(output.get('retries', 0)
+                                  for output in outputs)
+        combined['cached'] = any(output.get('cached', False)
+                                 for output in outputs)
+        combined['hedged'] = any(output.get('hedged', False)
+                                 for output in outputs)
+        # The routed model, not the default one of the chat model
+        for output in outputs:
+            if 'model_name' in output:
+                combined['model_name'] = output['model_name']
+        return combined
+
+    def _with_retries(self, result: ChatResult, attempts: int) -> ChatResult:
+        result.llm_output = {
+            'token_usage': {},
+            **(result.llm_output or {}),
+            'model_name': self._model(),
+            'retries': max(0, attempts - 1)
+        }
+        return result
+
+    @contextmanager
+    def _routing(self):
+        """Selects the model of the call inside the context, if routed, and
+        yields it"""
+        model = None
+        if self.router is not None:
+            model = self.router.select(self.stage) or self.model_name
+        token = _model.set(model)
+        try:
+            yield model
+        finally:
+            _model.reset(token)
+
+    def _observe(self, model: str | None, start: float):
+        if model is not None:
+            self.router.observe(self.stage, model,
+                                time.perf_counter() - start)
+
+    @staticmethod
+    def _generations(result: ChatResult) -> list[str]:
+        return [generation.message.content
+                for generation in result.generations]
+
+    def _replay(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]]
+    ) -> tuple[str | None, list[str] | None]:
+        """Looks the call up in the cache and then in the cassette. Returns
+        the key (`None` when neither is used) and the generations found"""
+        cache = get_llm_cache()
+        cassette = get_cassette()
+        if cassette is None and (cache is None
+                                 or not cache.is_enabled(self.stage)):
+            return None, None
+
+        key = self._cache_key(messages, stop)
+        generations = None
+        if cache is not None and cache.is_enabled(self.stage):
+            generations = cache.lookup(key, self.stage)
+            if (generations is not None and cassette is not None
+                    and cassette.mode == CassetteMode.RECORD):
+                # Recorded too, so that the cassette replays without the cache
+                cassette.record(key, self.stage, generations)
+        if generations is None and cassette is not None:
+            generations = cassette.lookup(key, self.stage)
+        return key, generations
+
+    def _store(self, key: str | None, result: ChatResult):
+        if key is None:
+            return
+        generations = self._generations(result)
+        cache = get_llm_cache()
+        if cache is not None and cache.is_enabled(self.stage):
+            cache.update(key, self.stage, generations)
+        cassette = get_cassette()
+        if cassette is not None:
+            cassette.record(key, self.stage, generations)
+
+    def _generate(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[CallbackManagerForLLMRun] = None,
+            **kwargs: Any
+    ) -> ChatResult:
+        with self._routing() as model:
+            key, generations = self._replay(messages, stop)
+            if generations is not None:
+                if self.streaming and run_manager:
+                    run_manager.on_llm_new_token(generations[0])
+                return self._result(generations, cached=True)
+
+            attempts = [0]
+            token = _attempts.set(attempts)
+            start = time.perf_counter()
+            try:
+                result = self._complete(messages, stop, run_manager)
+            finally:
+                _attempts.reset(token)
+                self._observe(model, start)
+            self._with_retries(result, attempts[0])
+            self._store(key, result)
+            return result
+
+    async def _agenerate(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+            **kwargs: Any
+    ) -> ChatResult:
+        with self._routing() as model:
+            key, generations = self._replay(messages, stop)
+            if generations is not None:
+                if self.streaming and run_manager:
+                    await run_manager.on_llm_new_token(generations[0])
+                return self._result(generations, cached=True)
+
+            attempts = [0]
+            token = _attempts.set(attempts)
+            start = time.perf_counter()
+            try:
+                result = await self._acomplete(messages, stop, run_manager)
+            finally:
+                _attempts.reset(token)
+                self._observe(model, start)
+            self._with_retries(result, attempts[0])
+            self._store(key, result)
+            return result
+
+    def _complete(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]],
+            run_manager: Optional[CallbackManagerForLLMRun]
+    ) -> ChatResult:
+        """The model call behind the cache and the cassette, hedged if the
+        model has a hedger"""
+        if self.hedger is None:
+            return self._request(messages, stop, run_manager)
+
+        def request(attempt):
+            if attempt.hedge:
+                # The hedge is not a retry of the call
+                _attempts.set(None)
+            return self._request(messages, stop, attempt)
+
+        result, hedged = self.hedger.run(self.stage, request, run_manager)
+        result.llm_output = {**(result.llm_output or {}), 'hedged': hedged}
+        return result
+
+    async def _acomplete(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]],
+            run_manager: Optional[AsyncCallbackManagerForLLMRun]
+    ) -> ChatResult:
+        if self.hedger is None:
+            return await self._arequest(messages, stop, run_manager)
+
+        async def request(attempt):
+            if attempt.hedge:
+                _attempts.set(None)
+            return await self._arequest(messages, stop, attempt)
+
+        result, hedged = await self.hedger.arun(self.stage, request,
+                                                run_manager)
+        result.llm_output = {**(result.llm_output or {}), 'hedged': hedged}
+        return result
+
+    def _request(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]],
+            run_manager: Optional[CallbackManagerForLLMRun]
+    ) -> ChatResult:
+        """One request to the API"""
+        return super()._generate(messages, stop, run_manager)
+
+    async def _arequest(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]],
+            run_manager: Optional[AsyncCallbackManagerForLLMRun]
+    ) -> ChatResult:
+        return await super()._agenerate(messages, stop, run_manager)
+
+
+class FakeChatModel(ChatModel):
+    """`ChatModel` answered locally by a `FakeBackend`, with its simulated
+    latencies. Tokens are streamed to the callbacks like OpenAI's."""
+    backend: Any = None
+
+    def _text(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]]
+    ) -> list[str]:
+        prompt = '\n\n'.join(message.content for message in messages)
+        text = self.backend.respond(self.stage, prompt)
+        if isinstance(stop, str):
+            stop = [stop]
+        for sequence in stop or []:
+            text = text.split(sequence)[0]
+        return self.backend.tokens(text)[:self.max_tokens]
+
+    def _cache_params(self) -> dict:
+        # Canned responses must never be replayed as the real model's, from a
+        # cache or a cassette shared with real runs
+        return {**super()._cache_params(), 'backend': 'fake'}
+
+    def _request(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]],
+            run_manager: Optional[CallbackManagerForLLMRun]
+    ) -> ChatResult:
+        tokens = self._text(messages, stop)
+        first_token_latency, token_latency = self.backend.latencies(
+            self._model()
+        )
+        time.sleep(first_token_latency)
+        for i, token in enumerate(tokens):
+            if i > 0:
+                time.sleep(token_latency)
+            if self.streaming and run_manager:
+                run_manager.on_llm_new_token(token)
+        return self._result([''.join(tokens)])
+
+    async def _arequest(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]],
+            run_manager: Optional[AsyncCallbackManagerForLLMRun]
+    ) -> ChatResult:
+        tokens = self._text(messages, stop)
+        first_token_latency, token_latency = self.backend.latencies(
+            self._model()
+        )
+        await asyncio.sleep(first_token_latency)
+        for i, token in enumerate(tokens):
+            if i > 0:
+                await asyncio.sleep(token_latency)
+            if self.streaming and run_manager:
+                await run_manager.on_llm_new_token(token)
+        return self._result([''.join(tokens)])
+
+
+def create_chat_model(
+        stage: Stage,
+        temperature: float = 0.5,
+        streaming: bool = False
+) -> ChatModel:
+    """Creates the chat model used by `stage`, on the backend set with
+    `set_llm_backend`, with the route of the stage in the router set with
+    `set_router` and hedged by the hedger set with `set_hedger`, if any. Its
+    tokens are streamed to the hub set with `set_stream_hub`, or else to
+    stdout, and its calls are reported to the metrics recorder set with
+    `set_metrics_recorder`, if any. Its requests go through the limiter set
+    with `set_rate_limiter`, which then also retries them."""
+    hub = get_stream_hub()
+    if hub is None:
+        callbacks = [StreamingStdOutLimitedCallbackHandler()]
+    else:
+        callbacks = [StreamingCallbackHandler(
+            hub.session(current_interview.get()),
+            limit=hub.limit
+        )]
+    recorder = get_metrics_recorder()
+    if recorder is not None:
+        callbacks.append(MetricsCallbackHandler(
+            stage.value,
+            recorder,
+            interview=current_interview.get()
+        ))
+
+    router = get_router()
+    route = Route() if router is None else router.route(stage)
+    hedger = get_hedger()
+    kwargs = {
+        'router': router,
+        'hedger': (hedger if hedger is not None and hedger.is_hedged(stage)
+                   else None)
+    }
+    if route.model is not None:
+        kwargs['model_name'] = route.model
+    if route.temperature is not None:
+        temperature = route.temperature
+    if route.max_tokens is not None:
+        kwargs['max_tokens'] = route.max_tokens
+
+    backend = get_llm_backend()
+    if backend is not None:
+        return FakeChatModel(
+            stage=stage.value,
+            temperature=temperature,
+            streaming=streaming,
+            callbacks=callbacks,
+            backend=backend,
+            openai_api_key='offline',
+            **kwargs
+        )
+    # Replaying a cassette needs no API key
+    cassette = get_cassette()
+    if cassette is not None and cassette.mode == CassetteMode.REPLAY:
+        kwargs['openai_api_key'] = 'offline'
+    # The limiter retries requests itself, each one after admission
+    if get_rate_limiter() is not None:
+        kwargs['max_retries'] = 1
+    return ChatModel(
+        stage=stage.value,
+        priority=current_priority.get(),
+        temperature=temperature,
+        streaming=streaming,
+        callbacks=callbacks,
+        **kwargs
+    )
+
+
+@asynccontextmanager
+async def pooled_http_session(limit: int = 100):
+    """Shares one keep-alive HTTP session between the async OpenAI calls made
+    inside the context, instead of opening a new one per call.
+
+    The sync calls already reuse a session per thread.
+    """
+    if openai.aiosession.get() is not None:
+        yield openai.aiosession.get()
+        return
+
+    connector = aiohttp.TCPConnector(limit=limit)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        token = openai.aiosession.set(session)
+        try:
+            yield session
+        finally:
+            openai.aiosession.reset(token)
@@ -0,0 +1,142 @@
+"""Conversation memory with a token budget.
+
+The most recent exchanges are kept verbatim. Once they exceed
+`token_budget` tokens, the oldest ones are folded into a running summary
+until they fit in half of it. The summary is written by an LLM call in a
+background thread, while the interview goes on, and is committed when the
+next exchange is saved. So the history in each prompt only depends on the
+conversation, not on how fast the summary was written, and the messages
+being summarized stay in it verbatim meanwhile. Prompts stay about the same
+size however long the interview is, and nothing is simply forgotten.
+"""
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+from typing import Any, Dict, List
+
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain.schema import get_buffer_string
+from pydantic import PrivateAttr
+
+from .util import estimate_tokens
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _summary_executor() -> ThreadPoolExecutor:
+    # Shared by every memory, so many interviews do not mean many threads
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=8)
+        return _executor
+
+
+class RollingSummaryMemory(BaseChatMemory):
+    """`chat_memory` holds every message; the first `summarized` of them are
+    replaced by `summary` in the history. `chain` is an `LLMChain` with the
+    `MEMORY_SUMMARY_PROMPT` prompt."""
+    human_prefix: str = 'Human'
+    ai_prefix: str = 'AI'
+    memory_key: str = 'history'
+    token_budget: int = 1000
+    summary_words: int = 150
+    chain: Any = None
+    summary: str = ''
+    summarized: int = 0
+    # Summary being written in the background, and the messages it covers
+    _pending: Future | None = PrivateAttr(default=None)
+    _pending_cutoff: int = PrivateAttr(default=0)
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, str]:
+        history = get_buffer_string(
+            self.chat_memory.messages[self.summarized:],
+            human_prefix=self.human_prefix,
+            ai_prefix=self.ai_prefix
+        )
+        if self.summary != '':
+            history = (f'Summary of the earlier conversation: '
+                       f'{self.summary}\n{history}')
+        return {self.memory_key: history}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]):
+        super().save_context(inputs, outputs)
+        self.commit()
+        messages = self.chat_memory.messages[self.summarized:]
+        if (sum(estimate_tokens(message.content) for message in messages)
+                > self.token_budget):
+            self._summarize_until(self._cutoff(self.token_budget // 2))
+
+    def clear(self):
+        self.commit()
+        super().clear()
+        self.summary = ''
+        self.summarized = 0
+
+    def _cutoff(self, budget: int) -> int:
+        """Index of the oldest message of the most recent exchanges that fit
+        in `budget`, keeping at least the last one"""
+        messages = self.chat_memory.messages
+        cutoff = len(messages)
+        tokens = 0
+        while cutoff > self.summarized:
+            start = max(self.summarized, cutoff - 2)
+            tokens += sum(estimate_tokens(message.content)
+                          for message in messages[start:cutoff])
+            if tokens > budget and cutoff < len(messages):
+                break
+            cutoff = start
+        return cutoff
+
+    def _summarize_until(self, cutoff: int):
+        if cutoff <= self.summarized:
+            return
+        new_lines = get_buffer_string(
+            self.chat_memory.messages[self.summarized:cutoff],
+            human_prefix=self.human_prefix,
+            ai_prefix=self.ai_prefix
+        )
+        self._pending_cutoff = cutoff
+        self._pending = _summary_executor().submit(
+            self.chain.predict,
+            name=self.ai_prefix,
+            summary=self.summary or 'Nothing yet.',
+            new_lines=new_lines,
+            num_words=self.summary_words
+        )
+
+    def commit(self):
+        """Waits for the summary being written, if any, and puts it in the
+        history"""
+        if self._pending is None:
+            return
+        self.summary = self._pending.result().strip()
+        self.summarized = self._pending_cutoff
+        self._pending = None
+
+    async def await_summary(self):
+        """Waits for the summary being written without blocking the event
+        loop, so that `commit` does not either"""
+        if self._pending is not None:
+            await asyncio.wrap_future(self._pending)
+
+    def state(self) -> dict:
+        """The summary and the messages it covers, plus those of the summary
+        being written, to resume the memory with `restore_state`"""
+        return {
+            'summary': self.summary,
+            'summarized': self.summarized,
+            'pending': self._pending_cutoff if self._pending else None
+        }
+
+    def restore_state(self, state: dict):
+        self.summary = state['summary']
+        self.summarized = state['summarized']
+        self._pending = None
+        if state.get('pending') is not None:
+            self._summarize_until(state['pending'])
@@ -0,0 +1,209 @@
+"""Per-call LLM metrics, aggregated per stage, per interview and per batch.
+
+Set a recorder with `set_metrics_recorder(MetricsRecorder())`: every chat
+model made by `create_chat_model` then reports its calls to it, through a
+`MetricsCallbackHandler`. Calls made inside `interview_context(id)` are
+attributed to that interview.
+"""
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+import json
+import math
+from pathlib import Path
+import threading
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+current_interview: ContextVar[str | None] = ContextVar(
+    'current_interview',
+    default=None
+)
+
+
+@contextmanager
+def interview_context(interview_id: str):
+    """Attributes the LLM calls of the chat models created inside the
+    context to `interview_id`"""
+    token = current_interview.set(interview_id)
+    try:
+        yield
+    finally:
+        current_interview.reset(token)
+
+
+@dataclass(slots=True)
+class CallRecord:
+    stage: str
+    interview: str | None
+    prompt_tokens: int
+    completion_tokens: int
+    # Seconds from the request to the first streamed token; `None` when the
+    # call was not streamed
+    first_token_latency: float | None
+    latency: float
+    retries: int = 0
+    cached: bool = False
+    error: str | None = None
+    # CPU seconds of the calling thread during the call: the framework's own
+    # work, while the rest of `latency` is spent waiting for the API. `None`
+    # for async calls, whose callbacks run in other threads
+    cpu_time: float | None = None
+    # Model that answered, when known
+    model: str | None = None
+    # Whether a second request was sent because the first one was slow
+    hedged: bool = False
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile; 0 for no values"""
+    if len(values) == 0:
+        return 0.0
+    values = sorted(values)
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+def aggregate(calls: list[CallRecord]) -> dict:
+    latencies = [call.latency for call in calls]
+    first_token_latencies = [call.first_token_latency for call in calls
+                             if call.first_token_latency is not None]
+    return {
+        'calls': len(calls),
+        'cached': sum(call.cached for call in calls),
+        'errors': sum(call.error is not None for call in calls),
+        'retries': sum(call.retries for call in calls),
+        'hedged': sum(call.hedged for call in calls),
+        'prompt_tokens': sum(call.prompt_tokens for call in calls),
+        'completion_tokens': sum(call.completion_tokens for call in calls),
+        'latency': {
+            'total': sum(latencies),
+            **{f'p{round(q * 100)}': percentile(latencies, q)
+               for q in QUANTILES}
+        },
+        'first_token_latency': {
+            f'p{round(q * 100)}': percentile(first_token_latencies, q)
+            for q in QUANTILES
+        },
+        'models': dict(Counter(call.model for call in calls
+                               if call.model is not None))
+    }
+
+
+def by_stage(calls: list[CallRecord]) -> dict[str, dict]:
+    stages = defaultdict(list)
+    for call in calls:
+        stages[call.stage].append(call)
+    return {stage: aggregate(stage_calls)
+            for stage, stage_calls in stages.items()}
+
+
+class MetricsRecorder:
+    """Collects the `CallRecord` of every LLM call. Thread-safe."""
+
+    def __init__(self):
+        self.calls: list[CallRecord] = []
+        self._lock = threading.Lock()
+
+    def record(self, call: CallRecord):
+        with self._lock:
+            self.calls.append(call)
+
+    def report(self) -> dict:
+        """Totals and per-stage aggregates for the whole batch and for each
+        interview, plus the stage with the most time spent in calls"""
+        with self._lock:
+            calls = list(self.calls)
+
+        interviews = defaultdict(list)
+        for call in calls:
+            if call.interview is not None:
+                interviews[call.interview].append(call)
+
+        stages = by_stage(calls)
+        slowest = max(stages, key=lambda s: stages[s]['latency']['total'],
+                      default=None)
+        return {
+            'total': aggregate(calls),
+            'stages': stages,
+            'slowest_stage': slowest,
+            'interviews': {
+                interview: {
+                    'total': aggregate(interview_calls),
+                    'stages': by_stage(interview_calls)
+                }
+                for interview, interview_calls in interviews.items()
+            }
+        }
+
+    def save_json(self, path: str | Path, include_calls: bool = False):
+        report = self.report()
+        if include_calls:
+            with self._lock:
+                report['calls'] = [asdict(call) for call in self.calls]
+        with Path(path).open('w') as file:
+            json.dump(report, file, indent=2)
+
+    def to_prometheus(self) -> str:
+        """The per-stage metrics in the Prometheus text exposition format"""
+        stages = self.report()['stages']
+        lines = []
+
+        def add(name, kind, description, samples):
+            lines.append(f'# HELP ai_interviewer_{name} {description}')
+            lines.append(f'# TYPE ai_interviewer_{name} {kind}')
+            for suffix, labels, value in samples:
+                labels = ','.join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f'ai_interviewer_{name}{suffix}{{{labels}}} '
+                             f'{value:g}')
+
+        for name, key, description in (
+                ('llm_latency_seconds', 'latency', 'LLM call latency'),
+                ('llm_first_token_seconds', 'first_token_latency',
+                 'LLM time to first token')
+        ):
+            samples = []
+            for stage, metrics in stages.items():
+                for q in QUANTILES:
+                    samples.append(('', {'stage': stage, 'quantile': q},
+                                    metrics[key][f'p{round(q * 100)}']))
+                if key == 'latency':
+                    samples.append(('_sum', {'stage': stage},
+                                    metrics[key]['total']))
+                    samples.append(('_count', {'stage': stage},
+                                    metrics['calls']))
+            add(name, 'summary', description, samples)
+
+        add('llm_tokens_total', 'counter', 'LLM tokens', [
+            ('', {'stage': stage, 'type': kind}, metrics[f'{kind}_tokens'])
+            for stage, metrics in stages.items()
+            for kind in ('prompt', 'completion')
+        ])
+        for name, key, description in (
+                ('llm_retries_total', 'retries', 'LLM call retries'),
+                ('llm_errors_total', 'errors', 'Failed LLM calls'),
+                ('llm_cached_total', 'cached', 'LLM calls served by a cache'),
+                ('llm_hedged_total', 'hedged', 'LLM calls sent twice')
+        ):
+            add(name, 'counter', description, [
+                ('', {'stage': stage}, metrics[key])
+                for stage, metrics in stages.items()
+            ])
+        return '\n'.join(lines) + '\n'
+
+    def save_prometheus(self, path: str | Path):
+        with Path(path).open('w') as file:
+            file.write(self.to_prometheus())
+
+
+_metrics_recorder: MetricsRecorder | None = None
+
+
+def set_metrics_recorder(recorder: MetricsRecorder | None):
+    """Sets the recorder of every chat model created from now on"""
+    global _metrics_recorder
+    _metrics_recorder = recorder
+
+
+def get_metrics_recorder() -> MetricsRecorder | None:
+    return _metrics_recorder
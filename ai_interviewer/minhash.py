@@ -0,0 +1,95 @@
+"""Near-duplicate detection of texts with word shingles and MinHash.
+
+Each text is reduced to `num_perm` minima of its hashed word shingles; the
+fraction of minima two signatures share estimates the Jaccard similarity of
+their shingle sets. Signatures are indexed by bands (locality-sensitive
+hashing), so a new text is only compared with those sharing a band.
+"""
+import hashlib
+import random
+import re
+
+# Mersenne prime, larger than the 32-bit shingle hashes
+_PRIME = (1 << 61) - 1
+
+
+def shingles(text: str, size: int = 5) -> set[int]:
+    """32-bit hashes of the runs of `size` words of `text`, ignoring case
+    and punctuation"""
+    words = re.findall(r'\w+', text.lower())
+    if len(words) < size:
+        words = words + [''] * (size - len(words))
+    return {
+        int.from_bytes(hashlib.blake2b(
+            ' '.join(words[i:i + size]).encode(),
+            digest_size=4
+        ).digest(), 'little')
+        for i in range(len(words) - size + 1)
+    }
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5,
+                 seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        generator = random.Random(seed)
+        self._permutations = [
+            (generator.randrange(1, _PRIME), generator.randrange(0, _PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, text: str) -> tuple[int, ...]:
+        values = shingles(text, self.shingle_size)
+        return tuple(min((a * value + b) % _PRIME for value in values)
+                     for a, b in self._permutations)
+
+
+def similarity(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the texts of two signatures"""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class MinHashIndex:
+    """Signatures of the texts kept so far. `bands` must divide `num_perm`;
+    more bands find pairs of lower similarity, at the cost of more
+    comparisons."""
+
+    def __init__(self, threshold: float = 0.5, num_perm: int = 64,
+                 bands: int = 16, shingle_size: int = 5):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self.rows = num_perm // bands
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = {}
+
+    def _bands(self, signature: tuple[int, ...]):
+        for i, bucket in enumerate(self.buckets):
+            yield bucket, signature[i * self.rows:(i + 1) * self.rows]
+
+    def find(self, text: str) -> str | None:
+        """The key of a kept text similar to `text`, if any"""
+        return self._find(self.hasher.signature(text))
+
+    def _find(self, signature: tuple[int, ...]) -> str | None:
+        seen = set()
+        for bucket, band in self._bands(signature):
+            for key in bucket.get(band, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                if similarity(signature, self.signatures[key]) >= self.threshold:
+                    return key
+        return None
+
+    def add(self, key: str, text: str) -> str | None:
+        """Keeps `text` unless it is similar to a kept one, whose key is
+        returned instead"""
+        signature = self.hasher.signature(text)
+        duplicate = self._find(signature)
+        if duplicate is not None:
+            return duplicate
+        self.signatures[key] = signature
+        for bucket, band in self._bands(signature):
+            bucket.setdefault(band, []).append(key)
+        return None
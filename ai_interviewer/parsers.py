@@ -0,0 +1,20 @@
+from langchain.schema import BaseOutputParser
+
+from .job_description import JobDescription
+
+
+class JobDescriptionOutputParser(BaseOutputParser):
+    def parse(self, text: str) -> JobDescription:
+        title = text.split('Job Title:')[1].split('\n\n')[0].strip()
+        about = text.split('About the Role:')[1].split('\n\n')[0].strip()
+        responsibilities = text.split('Responsibilities:')[1].split('\n\n')[0].strip()
+        requirements = text.split('Requirements:')[1].split('\n\n')[0].strip()
+        why = text.split('Why Work at')[1].split(':\n')[1].split('\n\n')[0].strip()
+        return JobDescription(
+            title=title,
+            about=about,
+            responsibilities=responsibilities,
+            requirements=requirements,
+            why=why,
+            text=text
+        )
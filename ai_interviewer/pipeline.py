@@ -0,0 +1,61 @@
+"""Steps with explicit dependencies, each run as soon as they are done.
+
+    results = await run_steps([
+        Step('personalize', personalize, background=True),
+        Step('ask', ask, deps=('personalize',)),
+        Step('reply', reply, deps=('ask',)),
+    ])
+
+Background steps (work off the critical path) run at most
+`max_background` at a time; the others start right away once their
+dependencies are done.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterable
+
+
+@dataclass
+class Step:
+    name: str
+    run: Callable[[], Awaitable[Any]]
+    deps: tuple[str, ...] = ()
+    background: bool = False
+
+
+async def run_steps(
+        steps: Iterable[Step],
+        max_background: int = 4
+) -> dict[str, Any]:
+    """Runs `steps` and returns their results by name. If a step fails, the
+    others are cancelled and its error is raised."""
+    steps = list(steps)
+    names = {step.name for step in steps}
+    for step in steps:
+        missing = set(step.deps) - names
+        if missing:
+            raise ValueError(f'Step {step.name} depends on unknown steps '
+                             f'{sorted(missing)}')
+
+    semaphore = asyncio.Semaphore(max_background)
+    tasks = {}
+
+    async def run(step: Step) -> Any:
+        for dep in step.deps:
+            await tasks[dep]
+        if step.background:
+            async with semaphore:
+                return await step.run()
+        return await step.run()
+
+    # Every task exists before any of them runs, so deps can be looked up
+    for step in steps:
+        tasks[step.name] = asyncio.ensure_future(run(step))
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+    return {name: task.result() for name, task in tasks.items()}
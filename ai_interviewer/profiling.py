@@ -0,0 +1,297 @@
+"""Where the time of a run goes: wall and CPU time per phase and LLM call.
+
+    profiler = Profiler(python=True, memory=True)
+    set_profiler(profiler)
+    profiler.start()
+    with profile_phase('interview'):
+        ...
+    profiler.stop()
+    profiler.save('profile.json')
+
+Phases are named parts of the run (`profile_phase`, a no-op without a
+profiler), timed with the wall clock and the CPU time of the process, which
+includes the background threads. The LLM calls come from the profiler's
+`MetricsRecorder`: most of their wall time is spent waiting for the API,
+and the CPU time of the thread that made them is the framework's own work.
+
+With `python`, cProfile runs in every thread started after `start`, timed
+with the CPU clock of the thread so that waiting for the network does not
+count: it profiles the local code only. `save` writes it as collapsed
+stacks (`profile.collapsed`, for flamegraph.pl or speedscope) and pstats
+(`profile.pstats`). With `memory`, tracemalloc records the memory allocated
+in each phase, the peak and the top allocation sites.
+"""
+from collections import defaultdict
+import cProfile
+from contextlib import contextmanager
+import json
+from pathlib import Path
+import pstats
+import threading
+import time
+import tracemalloc
+
+from .metrics import CallRecord, MetricsRecorder
+
+
+def _label(function: tuple[str, int, str]) -> str:
+    filename, line, name = function
+    if filename == '~':
+        return name
+    return f'{name} ({Path(filename).name}:{line})'
+
+
+def collapsed_stacks(
+        stats: pstats.Stats,
+        min_share: float = 1e-4,
+        max_depth: int = 100
+) -> dict[str, float]:
+    """Seconds spent in each stack of `stats`, as `caller;callee` strings.
+
+    cProfile keeps the time of each function per caller, not per stack, so
+    the time of a function is split between the stacks leading to it in
+    proportion to the time of each caller. Stacks under `min_share` of the
+    total time are dropped.
+    """
+    functions = stats.stats
+    min_seconds = min_share * sum(values[2] for values in functions.values())
+    callees = defaultdict(list)
+    for function, (_, _, _, _, callers) in functions.items():
+        for caller, edge in callers.items():
+            callees[caller].append((function, edge))
+
+    stacks = defaultdict(float)
+
+    def visit(function, stack: list[str], path: set, scale: float):
+        own_time, total_time = functions[function][2:4]
+        stacks[';'.join(stack)] += own_time * scale
+        if len(stack) >= max_depth:
+            return
+        for callee, (_, _, _, edge_time) in callees[function]:
+            callee_total = functions[callee][3]
+            seconds = edge_time * scale
+            # Recursion is folded into the first call
+            if (callee in path or callee_total <= 0
+                    or seconds < min_seconds):
+                continue
+            path.add(callee)
+            visit(callee, stack + [_label(callee)], path,
+                  seconds / callee_total)
+            path.remove(callee)
+
+    for function, (_, _, _, _, callers) in functions.items():
+        if len(callers) == 0:
+            visit(function, [_label(function)], {function}, 1.0)
+    return {stack: seconds for stack, seconds in stacks.items()
+            if seconds >= min_seconds}
+
+
+class Profiler:
+    def __init__(
+            self,
+            python: bool = False,
+            memory: bool = False,
+            recorder: MetricsRecorder | None = None
+    ):
+        """`recorder` receives the LLM calls; set it with
+        `set_metrics_recorder` too"""
+        self.python = python
+        self.memory = memory
+        self.recorder = MetricsRecorder() if recorder is None else recorder
+        # name -> [count, wall time, CPU time, max wall time, memory]
+        self._phases = {}
+        self._profiles: list[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._start = None
+        self._wall_time = 0.0
+        self._cpu_time = 0.0
+        self._memory_peak = 0
+        self._snapshot = None
+
+    def start(self):
+        self._start = (time.perf_counter(), time.process_time())
+        if self.memory:
+            tracemalloc.start()
+        if self.python:
+            # Each new thread starts its own profile on its first event
+            threading.setprofile(self._profile_thread)
+            self._profile_thread()
+
+    def _profile_thread(self, *args):
+        profile = cProfile.Profile(time.thread_time)
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+
+    def stop(self):
+        if self.python:
+            threading.setprofile(None)
+            # Only the current thread's profile can be disabled; the others
+            # are read as they are
+            self._profiles[0].disable()
+        if self.memory:
+            self._memory_peak = tracemalloc.get_traced_memory()[1]
+            self._snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        wall, cpu = self._start
+        self._wall_time = time.perf_counter() - wall
+        self._cpu_time = time.process_time() - cpu
+
+    @contextmanager
+    def phase(self, name: str):
+        memory = tracemalloc.get_traced_memory()[0] if self.memory else 0
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            if self.memory and tracemalloc.is_tracing():
+                memory = tracemalloc.get_traced_memory()[0] - memory
+            with self._lock:
+                phase = self._phases.setdefault(name, [0, 0.0, 0.0, 0.0, 0])
+                phase[0] += 1
+                phase[1] += wall
+                phase[2] += cpu
+                phase[3] = max(phase[3], wall)
+                phase[4] += memory
+
+    def stats(self) -> pstats.Stats | None:
+        """The Python profile of every thread"""
+        with self._lock:
+            profiles = list(self._profiles)
+        if len(profiles) == 0:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            # A thread's profile with no calls yet cannot be read
+            try:
+                stats.add(profile)
+            except TypeError:
+                pass
+        return stats
+
+    def report(self) -> dict:
+        """Wall and CPU time of the run, of each phase and of the LLM calls
+        per stage, plus the memory and Python profile summaries when
+        enabled"""
+        with self._lock:
+            phases = {name: list(values)
+                      for name, values in self._phases.items()}
+        report = {
+            'wall_time': self._wall_time,
+            'cpu_time': self._cpu_time,
+            'phases': {
+                name: {
+                    'count': count,
+                    'wall_time': wall,
+                    'cpu_time': cpu,
+                    'max_wall_time': max_wall,
+                    **({'memory_allocated': memory} if self.memory else {})
+                }
+                for name, (count, wall, cpu, max_wall, memory)
+                in phases.items()
+            },
+            'llm': _llm_times(self.recorder.calls)
+        }
+        if self.memory and self._snapshot is not None:
+            report['memory'] = {
+                'peak': self._memory_peak,
+                'top': [
+                    {'where': f'{stat.traceback[0].filename}:'
+                              f'{stat.traceback[0].lineno}',
+                     'size': stat.size,
+                     'count': stat.count}
+                    for stat in self._snapshot.statistics('lineno')[:10]
+                ]
+            }
+        stats = self.stats()
+        if stats is not None:
+            functions = sorted(stats.stats.items(),
+                               key=lambda item: item[1][2], reverse=True)
+            report['python'] = {
+                'cpu_time': sum(values[2] for values in stats.stats.values()),
+                'top': [
+                    {'function': _label(function), 'calls': values[1],
+                     'own_cpu_time': values[2],
+                     'cumulative_cpu_time': values[3]}
+                    for function, values in functions[:20]
+                ]
+            }
+        return report
+
+    def save(self, path: str | Path):
+        """Writes `report` to the JSON file `path` and, with `python`, the
+        profile next to it with the `.collapsed` and `.pstats` suffixes"""
+        path = Path(path)
+        with path.open('w') as file:
+            json.dump(self.report(), file, indent=2)
+        stats = self.stats()
+        if stats is not None:
+            stats.dump_stats(path.with_suffix('.pstats'))
+            with path.with_suffix('.collapsed').open('w') as file:
+                for stack, seconds in collapsed_stacks(stats).items():
+                    # Integer microseconds, as flame graph tools expect
+                    file.write(f'{stack} {round(seconds * 1e6)}\n')
+
+    def summary(self) -> str:
+        """A few lines for the end of the run"""
+        report = self.report()
+        lines = [f'Profile: {report["wall_time"]:.2f} s wall, '
+                 f'{report["cpu_time"]:.2f} s CPU']
+        for name, phase in report['phases'].items():
+            lines.append(f'  {name:<16} {phase["wall_time"]:8.2f} s wall '
+                         f'{phase["cpu_time"]:8.2f} s CPU '
+                         f'({phase["count"]}x)')
+        llm = report['llm']['total']
+        lines.append(f'  {"LLM calls":<16} {llm["wall_time"]:8.2f} s wall '
+                     f'{llm["cpu_time"]:8.2f} s CPU '
+                     f'({llm["calls"]} calls, {llm["waiting"]:.2f} s waiting '
+                     f'for the API)')
+        return '\n'.join(lines)
+
+
+def _llm_times(calls: list[CallRecord]) -> dict:
+    def times(calls: list[CallRecord]) -> dict:
+        timed = [call for call in calls if call.cpu_time is not None]
+        return {
+            'calls': len(calls),
+            'wall_time': sum(call.latency for call in calls),
+            # Only sync calls have a CPU time
+            'cpu_time': sum(call.cpu_time for call in timed),
+            'waiting': sum(call.latency - call.cpu_time for call in timed)
+        }
+
+    stages = defaultdict(list)
+    for call in calls:
+        stages[call.stage].append(call)
+    return {
+        'total': times(calls),
+        'stages': {stage: times(stage_calls)
+                   for stage, stage_calls in stages.items()}
+    }
+
+
+_profiler: Profiler | None = None
+
+
+def set_profiler(profiler: Profiler | None):
+    """Sets the profiler of `profile_phase`"""
+    global _profiler
+    _profiler = profiler
+
+
+def get_profiler() -> Profiler | None:
+    return _profiler
+
+
+@contextmanager
+def profile_phase(name: str):
+    """Times the block as the phase `name` of the profiler, if any"""
+    profiler = _profiler
+    if profiler is None:
+        yield
+        return
+    with profiler.phase(name):
+        yield
@@ -0,0 +1,278 @@
+"""Prompt templates of every LLM call.
+
+This module imports langchain, so the rest of the package only imports it
+right before calling a model.
+"""
+from langchain.prompts.chat import (
+    ChatPromptTemplate,
+    SystemMessagePromptTemplate,
+    HumanMessagePromptTemplate,
+)
+
+JOB_DESCRIPTION_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        template="You are a helpful Human Resources assistant who creates "
+                 "detailed job postings for {company} to attract talented "
+                 "candidates."
+    ),
+    HumanMessagePromptTemplate.from_template(
+        template="Create a job posting for a {job} position at "
+                 "{company}. The post must attract {job}s with at least "
+                 "{years_of_experience} years of experience, with "
+                 "relevant experience in {area}. The job posting must "
+                 "contain 'Job Title', 'About the Role', 'Responsibilities', "
+                 "'Requirements' and 'Why Work at {company}'."
+    )
+])
+
+RESUME_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        template="You are a creative assistant."
+    ),
+    HumanMessagePromptTemplate.from_template(
+        template="Create a resume for {name}, a talented {job} with "
+                 "{years_of_experience} years of experience in {area}.\n"
+                 "Be detailed in experiences and accomplishments.\n"
+                 "The resume must be a good fit for the following job "
+                 "requirements:\n{requirements}\n\nThe resume must show at "
+                 "least {work_experiences} work experiences.\nUse names of "
+                 "real companies in his work experiences.\nDo not use "
+                 "{company}, {name} never worked there."
+                 "The details of the work experiences must be different.\n"
+                 "The work experiences must reflect seniority and career "
+                 "progression. Older experiences must be compatible with "
+                 "more junior roles, while recent experiences must be "
+                 "compatible with more senior roles.\nThe details of each "
+                 "work experience must be related to the company where {name} "
+                 "worked at that time."
+    )
+])
+
+RESUMES_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        template="You are a creative assistant."
+    ),
+    HumanMessagePromptTemplate.from_template(
+        template="Create a resume for each of the following talented "
+                 "{job}s with experience in {area}:\n{candidates}\n\n"
+                 "Be detailed in experiences and accomplishments.\n"
+                 "Every resume must be a good fit for the following job "
+                 "requirements:\n{requirements}\n\nEach resume must show "
+                 "at least the number of work experiences given for its "
+                 "candidate.\nUse names of real companies in their work "
+                 "experiences.\nDo not use {company}, none of them worked "
+                 "there.\nThe candidates must be different people: their "
+                 "companies, roles, projects and accomplishments must not "
+                 "repeat across resumes.\nThe work experiences must reflect "
+                 "seniority and career progression.\nStart each resume with "
+                 "a line with only '### ' and the name of its candidate, and "
+                 "write nothing else before, between or after the resumes."
+    )
+])
+
+CONVERSATION_TEMPLATE = (
+    "Your name is {name}. You are being interviewed for a "
+    "{job} position at {company} to work with {area}. "
+    "You are a talented {job} with {years_of_experience} years "
+    "of experience in {area}. You are talkative and provides "
+    "lots of specific details from yourself, your work "
+    "experience and your personality. If you do not know the "
+    "answer to a question, you create an answer to the question "
+    "based on your resume. Here's your resume:\n\n"
+    "{resume}\n\n\nCurrent conversation:\n{history}\n"
+    "Interviewer: {input}\n{name}: "
+)
+
+MEMORY_SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    HumanMessagePromptTemplate.from_template(
+        template="Progressively summarize the lines of the job interview of "
+                 "{name} below, adding onto the current summary. Keep every "
+                 "fact {name} told about themselves (companies, projects, "
+                 "numbers, opinions), so their next answers can stay "
+                 "consistent with them. Write at most {num_words} words.\n\n"
+                 "Current summary:\n{summary}\n\nNew lines of the "
+                 "interview:\n{new_lines}\n\nNew summary:"
+    )
+])
+
+PERSONALIZE_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        template="You are an interviewer working at {company}. You are "
+                 "interviewing {name} for a {job} position. This is "
+                 "an ongoing interview. You are in the middle of it.\n"
+                 "Rewrite the question below, considering this. Do not "
+                 "change the meaning of the question. You may or may not "
+                 "mention the candidate's name. Make it friendly.\n\n"
+    ),
+    HumanMessagePromptTemplate.from_template(
+        template="Question: {question}"
+    )
+])
+
+FOLLOW_UP_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        template="You are an interviewer working at {company}. You are "
+                 "interviewing {name} for a {job} position.\n"
+                 "You must ask a follow-up question related to the "
+                 "conversation so far. The follow-up question must be "
+                 "related to {name}'s last answer.\n"
+    ),
+    HumanMessagePromptTemplate.from_template(
+        template="Conversation so far:\n{history}"
+    )
+])
+
+FOLLOW_UP_WITH_IDEA_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        template="You are an interviewer working at {company}. You are "
+                 "interviewing {name} for a {job} position.\n"
+                 "You must ask a follow-up question related to the "
+                 "conversation so far. The follow-up question must be "
+                 "related to {name}'s last answer.\n"
+                 "Use this follow-up question idea, and adapt it to "
+                 "the context of the current interview.\n\n"
+                 "Follow-up question idea:\n{raw_follow_up}\n"
+    ),
+    HumanMessagePromptTemplate.from_template(
+        template="Conversation so far:\n{history}"
+    )
+])
+
+ANSWER_CANDIDATE_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        template="You are an interviewer working at {company}. You are "
+                 "interviewing {name} for a {job} position.\n"
+                 "Answer the questions that the candidate is asking."
+                 "Be creative. Give a detailed answer.\n\n"
+    ),
+    HumanMessagePromptTemplate.from_template(
+        template="{name}: {question}\nInterviewer:"
+    )
+])
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        template="You are an interviewer working at {company}. You just "
+                 "interviewed {name} for a {job} position.\n"
+                 "You have the interview transcript.\n"
+                 "Your objective is to summarize the interview, "
+                 "answering questions about it.\n"
+                 "Your answers must only be based on the interview "
+                 "transcript. If you cannot answer the questions, "
+                 "just say that there is not enough evidence in the "
+                 "interview to assertively answer the questions.\n"
+                 "Your answer must be no longer than 1 paragraph.\n\n"
+    ),
+    HumanMessagePromptTemplate.from_template(
+        template="Interview transcript:\n\n{transcript}\n\n\n"
+                 "Based on the interview transcript, answer the following "
+                 "question:\n{question}\n{final_instruction}"
+    )
+])
+
+EVIDENCE_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        template="You are an interviewer working at {company}. You just "
+                 "interviewed {name} for a {job} position, to work with "
+                 "{area}.\nYou have a part of the interview transcript.\n"
+                 "Your objective is to extract from it the evidence about "
+                 "the candidate for the following criteria:\n{criteria}\n"
+                 "For each criterion, list the specific examples provided "
+                 "by the candidate: the companies, the projects and all "
+                 "details. Only use what is in the transcript. If there is "
+                 "no evidence for a criterion, just say so.\n\n"
+    ),
+    HumanMessagePromptTemplate.from_template(
+        template="Part of the interview transcript:\n\n{transcript}\n\n\n"
+                 "Extract the evidence for each criterion. Be concise."
+    )
+])
+
+EVIDENCE_SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        template="You are an interviewer working at {company}. You just "
+                 "interviewed {name} for a {job} position.\n"
+                 "You have the evidence extracted from each part of the "
+                 "interview transcript.\n"
+                 "Your objective is to summarize the interview, "
+                 "answering questions about it.\n"
+                 "Your answers must only be based on the evidence. If you "
+                 "cannot answer the questions, just say that there is not "
+                 "enough evidence in the interview to assertively answer "
+                 "the questions.\n"
+                 "Your answer must be no longer than 1 paragraph.\n\n"
+    ),
+    HumanMessagePromptTemplate.from_template(
+        template="Interview evidence:\n\n{transcript}\n\n\n"
+                 "Based on the interview evidence, answer the following "
+                 "question:\n{question}\n{final_instruction}"
+    )
+])
+
+EVIDENCE_MERGE_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        template="You are an interviewer working at {company}. You just "
+                 "interviewed {name} for a {job} position, to work with "
+                 "{area}.\nYou have the evidence extracted from each "
+                 "question of the interview.\n"
+                 "Your objective is to summarize the interview, "
+                 "answering questions about it.\n"
+                 "Your answers must only be based on the evidence. If you "
+                 "cannot answer a question, just say that there is not "
+                 "enough evidence in the interview to assertively answer "
+                 "it.\n\n"
+    ),
+    HumanMessagePromptTemplate.from_template(
+        template="Interview evidence:\n\n{evidence}\n\n\n"
+                 "Based on the interview evidence, answer the questions "
+                 "about each of these criteria:\n{criteria}\n\n"
+                 "Write the name of each criterion followed by a colon, "
+                 "then answer each of its questions in 1 paragraph. "
+                 "Support your answers with specific examples provided by "
+                 "the candidate: the companies, the projects and all "
+                 "details. Be critical."
+    )
+])
+
+EVALUATION_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        template="You are an interviewer working at {company}. You just "
+                 "interviewed {name} for a {job} position, to work with "
+                 "{area}.\nYou have the interview transcript.\n"
+                 "Your objective is to evaluate the candidate, answering "
+                 "questions about the interview.\n"
+                 "Your answers must only be based on the interview "
+                 "transcript. If you cannot answer a question, just say "
+                 "that there is not enough evidence in the interview to "
+                 "assertively answer it.\n"
+                 "Support your answers with specific examples provided by "
+                 "the candidate: the companies, the projects and all "
+                 "details. Be critical.\n"
+                 "Each answer must be no longer than 1 paragraph.\n\n"
+    ),
+    HumanMessagePromptTemplate.from_template(
+        template="Interview transcript:\n\n{transcript}\n\n\n"
+                 "Answer with a JSON object only, without any other text, "
+                 "following this JSON schema:\n{schema}"
+    )
+])
+
+RECOMMENDATION_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        template="You are an interviewer working at {company}. You just "
+                 "interviewed {name} for a {job} position, to work with "
+                 "{area}.\nYou have the interview summary.\n"
+                 "Your objective is to generate 1 paragraph with an "
+                 "overall recommendation of whether or not the candidate "
+                 "should be hired. Your answer must be no longer than 1 "
+                 "paragraph.\n\n"
+    ),
+    HumanMessagePromptTemplate.from_template(
+        template="Interview summary:\n\n{summary}\n\n\n"
+                 "Based on the interview summary, please provide an "
+                 "overall recommendation of whether or not the candidate "
+                 "should be hired. Provide strengths and weaknesses in "
+                 "your assessment. Be critical. Your answer must be no "
+                 "longer than 1 paragraph."
+    )
+])
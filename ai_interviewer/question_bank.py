@@ -1,13 +1,14 @@
-from dataclasses import dataclass, field
+import csv
+from dataclasses import dataclass, field, replace
 from enum import Enum
+import hashlib
+from pathlib import Path
+import pickle
+import random
 
-import pandas as pd
+from .util import BASE_DIR, split_punctuation, write_atomically
 
-from .util import BASE_DIR, split_punctuation
-
-questions = pd.read_csv(
-    BASE_DIR /'ai_interviewer'/'pbi_sample_questions.csv'
-).fillna('')
+QUESTIONS_FILE = BASE_DIR/'ai_interviewer'/'pbi_sample_questions.csv'
 
 
 class QuestionType(str, Enum):
@@ -31,19 +32,106 @@ class Question:
     text: str = ''
     follow_ups: list = field(default_factory=lambda: [])
     is_streamed: bool = False
+    is_personalized: bool = False
+
+
+class QuestionBank:
+    """Questions from a CSV file (Level, Type, Question, Follow-ups columns),
+    parsed once and indexed by question type.
+
+    The file is only read on first use. The parsed index is pickled in
+    `cache_dir` (by default, the `__pycache__` next to the CSV) and reused
+    while the CSV's modification time and size, or failing that its content
+    hash, are unchanged.
+    """
+    CACHE_VERSION = 1
+
+    def __init__(
+            self,
+            path: str | Path = QUESTIONS_FILE,
+            cache_dir: str | Path | None = None
+    ):
+        self.path = Path(path)
+        if cache_dir is None:
+            cache_dir = self.path.parent/'__pycache__'
+        self.cache_file = (Path(cache_dir) /
+                           f'{self.path.stem}.v{self.CACHE_VERSION}.pickle')
+        self._index = None
+
+    @property
+    def index(self) -> dict[str, list[Question]]:
+        if self._index is None:
+            self._index = self._load()
+        return self._index
+
+    def sample(
+            self,
+            question_type: QuestionType,
+            num_questions: int = 1
+    ) -> list[Question]:
+        templates = self.index.get(question_type, [])
+        # Each question is a copy: the simulator edits the ones it asks
+        return [replace(template, follow_ups=list(template.follow_ups))
+                for template in random.sample(templates, num_questions)]
+
+    def _load(self) -> dict[str, list[Question]]:
+        stat = self.path.stat()
+        cached = self._read_cache()
+        if cached is not None and (cached['mtime_ns'], cached['size']) == (
+                stat.st_mtime_ns, stat.st_size):
+            return cached['index']
+
+        content = self.path.read_bytes()
+        digest = hashlib.sha256(content).hexdigest()
+        if cached is not None and cached['sha256'] == digest:
+            index = cached['index']
+        else:
+            index = self._parse(content.decode('utf-8-sig'))
+        self._write_cache({
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'sha256': digest,
+            'index': index
+        })
+        return index
+
+    @staticmethod
+    def _parse(text: str) -> dict[str, list[Question]]:
+        index = {}
+        for row in csv.DictReader(text.splitlines()):
+            question = Question(
+                level=(row['Level'] or '').strip(),
+                question_type=(row['Type'] or '').strip(),
+                text=(row['Question'] or '').strip(),
+                follow_ups=split_punctuation(row['Follow-ups'] or '')
+            )
+            index.setdefault(question.question_type, []).append(question)
+        return index
+
+    def _read_cache(self) -> dict | None:
+        try:
+            with self.cache_file.open('rb') as file:
+                return pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+
+    def _write_cache(self, data: dict):
+        # The cache is an optimization: a read-only location just disables it
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            write_atomically(
+                self.cache_file,
+                pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+            )
+        except OSError:
+            pass
+
+
+question_bank = QuestionBank()
 
 
 def sample_questions(
         question_type: QuestionType,
         num_questions: int = 1
 ) -> list[Question]:
-    rows = questions[questions['Type'] == question_type].sample(num_questions)
-    qs = []
-    for index, row in rows.iterrows():
-        qs.append(Question(
-            level=row['Level'].strip(),
-            question_type=row['Type'].strip(),
-            text=row['Question'].strip(),
-            follow_ups=split_punctuation(row['Follow-ups'])
-        ))
-    return qs
+    return question_bank.sample(question_type, num_questions)
@@ -0,0 +1,323 @@
+"""Rate limiting of the LLM requests of the whole process, or of several.
+
+Set a limiter with `set_rate_limiter(RateLimiter(...))`: every OpenAI
+request of the chat models made by `create_chat_model` from then on waits
+for a request and its estimated tokens to be available in two token buckets,
+refilled at `requests_per_minute` and `tokens_per_minute`. With `path`, the
+buckets live in that file, so several processes share the limits.
+
+Failed requests (429s, timeouts, server errors) are retried after a jittered
+exponential backoff, or the `Retry-After` the server asked for. A 429 also
+empties the buckets, so every caller slows down, not just the one that got
+it.
+
+Requests made inside `priority_context(Priority.BATCH)` wait while an
+interactive request is waiting, so a live interview is not slowed down by a
+batch running at the same time.
+"""
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import Enum
+import json
+from pathlib import Path
+import random
+import threading
+import time
+from typing import Awaitable, Callable, TypeVar
+
+Result = TypeVar('Result')
+
+# Seconds an async caller waits before trying the buckets again, when
+# another thread or process holds them
+BUSY_DELAY = 0.001
+
+
+class Priority(str, Enum):
+    INTERACTIVE = 'interactive'
+    BATCH = 'batch'
+
+
+current_priority: ContextVar[Priority] = ContextVar(
+    'current_priority',
+    default=Priority.INTERACTIVE
+)
+
+
+@contextmanager
+def priority_context(priority: Priority):
+    """Gives `priority` to the LLM calls of the chat models created inside
+    the context"""
+    token = current_priority.set(Priority(priority))
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class RateLimiter:
+    """Token buckets of requests and tokens per minute, and the retry policy
+    of failed requests. A limit of `None` is no limit. Thread-safe.
+
+    The buckets hold `burst_seconds` of refill, a minute by default; servers
+    that enforce per-minute limits over shorter windows need less.
+    """
+
+    def __init__(
+            self,
+            requests_per_minute: float | None = None,
+            tokens_per_minute: float | None = None,
+            path: str | Path | None = None,
+            max_retries: int = 6,
+            base_delay: float = 1.0,
+            max_delay: float = 60.0,
+            burst_seconds: float = 60.0
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.path = None if path is None else Path(path)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.burst_seconds = burst_seconds
+        self.waited = 0.0
+        self.retries = 0
+        self.rate_limited = 0
+        self._state = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def _full_state(self, now: float) -> dict:
+        return {
+            'requests': self._capacity(self.requests_per_minute),
+            'tokens': self._capacity(self.tokens_per_minute),
+            'updated': now,
+            # Batch requests wait until then for an interactive one
+            'interactive_until': 0.0
+        }
+
+    @contextmanager
+    def _locked_state(self, blocking: bool = True):
+        """The state of the buckets, saved on exit. Without `blocking`, it
+        is `None` when another thread or process holds it, so that an event
+        loop never waits for a lock."""
+        now = time.time()
+        if not self._lock.acquire(blocking):
+            yield None
+            return
+        try:
+            if self.path is None:
+                if self._state is None:
+                    self._state = self._full_state(now)
+                yield self._state
+                return
+
+            import fcntl
+
+            with self.path.open('a+') as file:
+                try:
+                    fcntl.flock(file, fcntl.LOCK_EX if blocking
+                                else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield None
+                    return
+                file.seek(0)
+                try:
+                    state = json.loads(file.read())
+                except ValueError:
+                    state = self._full_state(now)
+                yield state
+                file.seek(0)
+                file.truncate()
+                json.dump(state, file)
+        finally:
+            self._lock.release()
+
+    def _capacity(self, limit: float | None) -> float:
+        return 0.0 if limit is None else limit * self.burst_seconds / 60
+
+    def _refill(self, state: dict, now: float):
+        elapsed = max(0.0, now - state['updated'])
+        state['updated'] = now
+        for key, limit in (('requests', self.requests_per_minute),
+                           ('tokens', self.tokens_per_minute)):
+            if limit is not None:
+                state[key] = min(self._capacity(limit),
+                                 state[key] + elapsed * limit / 60)
+
+    def _try_acquire(self, tokens: int, priority: Priority,
+                     blocking: bool = True) -> float | None:
+        """Takes a request and `tokens` from the buckets and returns 0, or
+        returns how long to wait before trying again. Without `blocking`,
+        returns `None` when the buckets are busy."""
+        with self._locked_state(blocking) as state:
+            if state is None:
+                return None
+            now = time.time()
+            self._refill(state, now)
+            if (priority != Priority.INTERACTIVE
+                    and now < state['interactive_until']):
+                return state['interactive_until'] - now
+
+            delay = 0.0
+            needs = []
+            for key, limit, amount in (
+                    ('requests', self.requests_per_minute, 1),
+                    ('tokens', self.tokens_per_minute, tokens)
+            ):
+                if limit is None:
+                    continue
+                # A call larger than the bucket waits for a full one
+                amount = min(amount, self._capacity(limit))
+                needs.append((key, amount))
+                if state[key] < amount:
+                    delay = max(delay, (amount - state[key]) * 60 / limit)
+            if delay == 0.0:
+                for key, amount in needs:
+                    state[key] -= amount
+            elif priority == Priority.INTERACTIVE:
+                # Keeps the refill for this request; the margin covers the
+                # time it takes to wake up
+                state['interactive_until'] = max(
+                    state['interactive_until'],
+                    now + delay + 0.05
+                )
+            return delay
+
+    def acquire(self, tokens: int = 0,
+                priority: Priority = Priority.INTERACTIVE):
+        """Waits until a request of `tokens` tokens is admitted"""
+        while (delay := self._try_acquire(tokens, priority)) > 0:
+            self._count('waited', delay)
+            time.sleep(delay)
+
+    async def aacquire(self, tokens: int = 0,
+                       priority: Priority = Priority.INTERACTIVE):
+        """`acquire` without blocking the event loop, on the buckets'
+        locks either"""
+        while True:
+            delay = self._try_acquire(tokens, priority, blocking=False)
+            if delay is None:
+                await asyncio.sleep(BUSY_DELAY)
+                continue
+            if delay == 0:
+                return
+            self._count('waited', delay)
+            await asyncio.sleep(delay)
+
+    def penalize(self):
+        """Empties the buckets, after the server said they were too full"""
+        self._penalize(blocking=True)
+
+    async def apenalize(self):
+        while not self._penalize(blocking=False):
+            await asyncio.sleep(BUSY_DELAY)
+
+    def _penalize(self, blocking: bool) -> bool:
+        with self._locked_state(blocking) as state:
+            if state is None:
+                return False
+            self._refill(state, time.time())
+            if self.requests_per_minute is not None:
+                state['requests'] = 0.0
+            if self.tokens_per_minute is not None:
+                state['tokens'] = 0.0
+            return True
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """Seconds to wait before retrying after the `attempt`-th failure
+        (from 0): a random delay up to an exponential cap, or longer if the
+        server asked for it"""
+        delay = random.uniform(
+            0,
+            min(self.max_delay, self.base_delay * 2 ** attempt)
+        )
+        headers = getattr(error, 'headers', None) or {}
+        try:
+            retry_after = float(headers.get('retry-after', 0))
+        except (TypeError, ValueError):
+            retry_after = 0.0
+        return max(delay, retry_after)
+
+    def _failed(self, attempt: int, error: Exception) -> float:
+        """The backoff before the next attempt, after the buckets were
+        emptied if it was a 429"""
+        if self._count_failure(attempt, error):
+            self.penalize()
+        return self.backoff(attempt, error)
+
+    async def _afailed(self, attempt: int, error: Exception) -> float:
+        if self._count_failure(attempt, error):
+            await self.apenalize()
+        return self.backoff(attempt, error)
+
+    def _count_failure(self, attempt: int, error: Exception) -> bool:
+        """Raises `error` after `max_retries` failures; returns whether it
+        was a 429"""
+        if attempt >= self.max_retries:
+            raise error
+        self._count('retries')
+        if getattr(error, 'http_status', None) == 429:
+            self._count('rate_limited')
+            return True
+        return False
+
+    def call(
+            self,
+            function: Callable[[], Result],
+            tokens: int = 0,
+            priority: Priority = Priority.INTERACTIVE,
+            retry_on: tuple[type[Exception], ...] = ()
+    ) -> Result:
+        """Calls `function` once admitted, and again after each failure
+        with one of the `retry_on` errors, up to `max_retries` times"""
+        attempt = 0
+        while True:
+            self.acquire(tokens, priority)
+            try:
+                return function()
+            except retry_on as e:
+                time.sleep(self._failed(attempt, e))
+            attempt += 1
+
+    async def acall(
+            self,
+            function: Callable[[], Awaitable[Result]],
+            tokens: int = 0,
+            priority: Priority = Priority.INTERACTIVE,
+            retry_on: tuple[type[Exception], ...] = ()
+    ) -> Result:
+        attempt = 0
+        while True:
+            await self.aacquire(tokens, priority)
+            try:
+                return await function()
+            except retry_on as e:
+                await asyncio.sleep(await self._afailed(attempt, e))
+            attempt += 1
+
+    def _count(self, name: str, amount: float = 1):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def stats(self) -> dict:
+        return {
+            'waited': self.waited,
+            'retries': self.retries,
+            'rate_limited': self.rate_limited
+        }
+
+
+_rate_limiter: RateLimiter | None = None
+
+
+def set_rate_limiter(limiter: RateLimiter | None):
+    """Sets the limiter of every chat model created from now on"""
+    global _rate_limiter
+    _rate_limiter = limiter
+
+
+def get_rate_limiter() -> RateLimiter | None:
+    return _rate_limiter
@@ -0,0 +1,175 @@
+"""Model, temperature and max tokens of each stage, with latency fallbacks.
+
+    set_router(Router({
+        Stage.PERSONALIZE: Route(model='gpt-3.5-turbo', max_tokens=120),
+        Stage.RECOMMENDATION: Route(model='gpt-4', latency_slo=30,
+                                    fallbacks=('gpt-3.5-turbo',)),
+    }))
+
+or `--routes routes.json` with the same routes by stage name (`default`
+applies to the stages not listed):
+
+    {"personalize": {"model": "gpt-3.5-turbo", "max_tokens": 120},
+     "recommendation": {"model": "gpt-4", "latency_slo": 30,
+                        "fallbacks": ["gpt-3.5-turbo"]}}
+
+Every chat model made by `create_chat_model` from then on uses the route of
+its stage; unset fields keep the values of the code. The router observes the
+latency of each call: when the `quantile` of the last `window` calls of a
+model exceeds the `latency_slo` of the stage, the next fallback is used
+instead, and the model is tried again after `retry_after` seconds.
+"""
+from collections import Counter, deque
+from dataclasses import asdict, dataclass, field
+import json
+from pathlib import Path
+import threading
+import time
+from typing import Iterable, Mapping
+
+from .metrics import percentile
+from .stages import Stage, stage_name
+
+DEFAULT_ROUTE = 'default'
+
+
+@dataclass(frozen=True)
+class Route:
+    # `None` keeps the default of the chat model or of the stage
+    model: str | None = None
+    temperature: float | None = None
+    max_tokens: int | None = None
+    # Seconds per call; `None` never falls back
+    latency_slo: float | None = None
+    fallbacks: tuple[str, ...] = field(default_factory=tuple)
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> 'Route':
+        return cls(**{**data, 'fallbacks': tuple(data.get('fallbacks', ()))})
+
+    def settings(self) -> dict:
+        """The fields that change the responses"""
+        return {key: value for key, value in asdict(self).items()
+                if key != 'latency_slo' and value not in (None, ())}
+
+
+class Router:
+    """Routes of each stage and the latencies observed per stage and model.
+    Thread-safe."""
+
+    def __init__(
+            self,
+            routes: Mapping[Stage | str, Route],
+            window: int = 20,
+            min_calls: int = 5,
+            quantile: float = 0.95,
+            retry_after: float = 60.0
+    ):
+        self.routes = {stage_name(stage): route
+                       for stage, route in routes.items()}
+        for stage in self.routes:
+            if stage != DEFAULT_ROUTE:
+                Stage(stage)
+        self.window = window
+        self.min_calls = min_calls
+        self.quantile = quantile
+        self.retry_after = retry_after
+        # (stage, model) -> latencies of the last calls
+        self._latencies: dict[tuple[str, str | None], deque] = {}
+        # (stage, model) -> when the model went over the SLO of the stage
+        self._over_slo: dict[tuple[str, str | None], float] = {}
+        self.calls = Counter()
+        self.fallbacks = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: str | Path, **kwargs) -> 'Router':
+        with Path(path).open('r') as file:
+            routes = json.load(file)
+        return cls({stage: Route.from_dict(route)
+                    for stage, route in routes.items()}, **kwargs)
+
+    def route(self, stage: Stage | str) -> Route:
+        return self.routes.get(stage_name(stage),
+                               self.routes.get(DEFAULT_ROUTE, Route()))
+
+    def settings(self, stages: Iterable[Stage | str]) -> dict[str, dict]:
+        """The routes of `stages` that change the responses, for the keys of
+        the artifacts built with them"""
+        settings = {stage_name(stage): self.route(stage).settings()
+                    for stage in stages}
+        return {stage: values for stage, values in settings.items()
+                if len(values) > 0}
+
+    def select(self, stage: Stage | str) -> str | None:
+        """The model to call now for `stage`: the first of the route's model
+        and fallbacks within the SLO, or else the fastest one"""
+        stage = stage_name(stage)
+        route = self.route(stage)
+        if route.latency_slo is None or len(route.fallbacks) == 0:
+            return route.model
+        models = (route.model, *route.fallbacks)
+        now = time.monotonic()
+        with self._lock:
+            for model in models:
+                over_slo = self._over_slo.get((stage, model))
+                if over_slo is not None:
+                    if now - over_slo < self.retry_after:
+                        continue
+                    # Tried again, judged on new calls only
+                    del self._over_slo[stage, model]
+                    self._latencies.pop((stage, model), None)
+                if model != route.model:
+                    self.fallbacks[stage] += 1
+                return model
+            self.fallbacks[stage] += 1
+            return min(models, key=lambda model: self._latency(stage, model))
+
+    def _latency(self, stage: str, model: str | None) -> float:
+        return percentile(list(self._latencies.get((stage, model), ())),
+                          self.quantile)
+
+    def observe(self, stage: Stage | str, model: str | None, latency: float):
+        """Records the latency of a call of `model` for `stage`"""
+        stage = stage_name(stage)
+        slo = self.route(stage).latency_slo
+        with self._lock:
+            latencies = self._latencies.setdefault(
+                (stage, model),
+                deque(maxlen=self.window)
+            )
+            latencies.append(latency)
+            self.calls[stage, model] += 1
+            if (slo is not None and len(latencies) >= self.min_calls
+                    and self._latency(stage, model) > slo):
+                self._over_slo.setdefault((stage, model), time.monotonic())
+
+    def stats(self) -> dict[str, dict]:
+        """Calls and latency quantile (of the last calls) of each model, and
+        fallbacks, per stage"""
+        with self._lock:
+            stats = {}
+            for (stage, model), calls in self.calls.items():
+                stats.setdefault(stage, {'models': {}, 'fallbacks': 0})
+                stats[stage]['models'][model or DEFAULT_ROUTE] = {
+                    'calls': calls,
+                    f'p{round(self.quantile * 100)}': self._latency(stage,
+                                                                    model)
+                }
+            for stage, fallbacks in self.fallbacks.items():
+                stats.setdefault(stage, {'models': {}, 'fallbacks': 0})
+                stats[stage]['fallbacks'] = fallbacks
+        return stats
+
+
+_router: Router | None = None
+
+
+def set_router(router: Router | None):
+    """Sets the routes of every chat model created from now on"""
+    global _router
+    _router = router
+
+
+def get_router() -> Router | None:
+    return _router
@@ -0,0 +1,42 @@
+import asyncio
+from typing import Iterable
+
+from .interview_simulator import InterviewSimulator
+from .metrics import interview_context
+from .ratelimit import Priority, priority_context
+
+
+async def arun_interviews(
+        simulators: Iterable[InterviewSimulator],
+        max_concurrency: int = 100
+) -> list[InterviewSimulator]:
+    """Runs many interviews concurrently on the current event loop.
+
+    At most `max_concurrency` interviews are in flight at the same time. The
+    simulators are returned in the same order they were given, with their
+    transcripts filled in. All of them share one pooled HTTP session. Their
+    LLM metrics are attributed to their index in `simulators`, and their
+    requests have batch priority in the rate limiter.
+    """
+    from .llm import pooled_http_session
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(i: int, simulator: InterviewSimulator) -> InterviewSimulator:
+        async with semaphore:
+            with interview_context(str(i)), priority_context(Priority.BATCH):
+                await simulator.astart()
+        return simulator
+
+    async with pooled_http_session(limit=max_concurrency):
+        return list(await asyncio.gather(
+            *[run(i, s) for i, s in enumerate(simulators)]
+        ))
+
+
+def run_interviews(
+        simulators: Iterable[InterviewSimulator],
+        max_concurrency: int = 100
+) -> list[InterviewSimulator]:
+    """Blocking wrapper around `arun_interviews`"""
+    return asyncio.run(arun_interviews(simulators, max_concurrency))
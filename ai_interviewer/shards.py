@@ -0,0 +1,511 @@
+"""Batches split in shards and run by a pool of worker processes.
+
+    python -m ai_interviewer shards candidates.jsonl --processes 4
+
+The candidates are split in shards of `shard_size`, in input order. Each
+worker process asks for the next shard as soon as it is done with its
+previous one, so fast workers take over the shards the slow ones would have
+run, and runs the candidates of the shard like `main_batch`, in a pool of
+`max_workers` threads. When a shard is done, its results (transcripts,
+summary, timings and LLM calls of each candidate) are written to
+`data_dir/shards/shard-NNNNN.jsonl`, then its timings to `shard-NNNNN.json`,
+which marks it done. `merge_shards` joins them into `data_dir/results.jsonl`
+and `data_dir/results_summary.json`.
+
+A worker that dies (crash, out of memory kill) is replaced, and only its
+shard is run again, up to `max_attempts` times: the candidates it had
+finished are loaded from the `ArtifactStore` and unfinished interviews
+resume from their checkpoints. Shards marked done are not run again, so an
+interrupted batch is resumed by running it again.
+
+Workers are forked where possible. Each one sets up the LLM backend,
+cassette, cache, model routes and hedging of the parent again, with its
+own SQLite connection, and gets `1/processes` of an in-process rate
+limiter; with a `RateLimiter` file, the processes share one budget.
+"""
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+import json
+import multiprocessing
+from multiprocessing.connection import Connection, wait
+import os
+from pathlib import Path
+import time
+
+from .artifacts import ArtifactStore
+from .batch import (
+    candidate_directories,
+    interview_id,
+    job_key,
+    load_candidates,
+    load_or_create_job_descriptions,
+    run_in_interview_context,
+)
+from .cache import get_llm_cache, LLMCache, set_llm_cache
+from .fake_llm import (
+    Cassette,
+    get_cassette,
+    get_llm_backend,
+    set_cassette,
+    set_llm_backend,
+)
+from .hedging import get_hedger, Hedger, set_hedger
+from .interviewer import SummaryMode
+from .job_description import JobDescription
+from .metrics import (
+    aggregate,
+    CallRecord,
+    get_metrics_recorder,
+    MetricsRecorder,
+    percentile,
+    QUANTILES,
+    set_metrics_recorder,
+)
+from .profiling import Profiler, set_profiler
+from .ratelimit import get_rate_limiter, RateLimiter, set_rate_limiter
+from .routing import get_router, Router, set_router
+from .streaming import set_stream_hub
+from .util import write_atomically
+
+
+@dataclass
+class Shard:
+    index: int
+    # Position in the candidates file, spec and directory of each candidate
+    candidates: list[tuple[int, dict, str]]
+
+    @property
+    def name(self) -> str:
+        return f'shard-{self.index:05d}'
+
+
+def split_shards(
+        specs: list[dict],
+        directories: list[Path],
+        shard_size: int
+) -> list[Shard]:
+    candidates = [(position, spec, str(directory))
+                  for position, (spec, directory)
+                  in enumerate(zip(specs, directories))]
+    return [Shard(index, candidates[start:start + shard_size])
+            for index, start in enumerate(range(0, len(candidates),
+                                                shard_size))]
+
+
+def shards_dir(data_dir: str | Path) -> Path:
+    return Path(data_dir)/'shards'
+
+
+def _is_done(shard: Shard, data_dir: Path) -> bool:
+    """Whether `shard` was run, with the same candidates"""
+    try:
+        with (shards_dir(data_dir)/f'{shard.name}.json').open('r') as file:
+            marker = json.load(file)
+    except FileNotFoundError:
+        return False
+    return marker['directories'] == [directory for _, _, directory
+                                     in shard.candidates]
+
+
+def _run_candidate(
+        position: int,
+        spec: dict,
+        directory: str,
+        store: ArtifactStore,
+        job_descriptions: dict[tuple, tuple[str, JobDescription]],
+        options: dict
+) -> dict:
+    job_description_key, job_description = job_descriptions[job_key(spec)]
+    started = time.time()
+    start = time.perf_counter()
+    try:
+        result = run_in_interview_context(spec, job_description,
+                                          Path(directory), store,
+                                          job_description_key, **options)
+        status, error = 'done', None
+    except Exception as e:
+        result = {**spec, 'directory': directory}
+        status, error = 'failed', repr(e)
+    return {
+        'position': position,
+        'status': status,
+        'error': error,
+        **result,
+        'started': started,
+        'wall_time': time.perf_counter() - start
+    }
+
+
+def run_shard(
+        shard: Shard,
+        data_dir: str | Path,
+        store: ArtifactStore,
+        job_descriptions: dict[tuple, tuple[str, JobDescription]],
+        max_workers: int = 4,
+        attempt: int = 1,
+        **options
+) -> tuple[int, int]:
+    """Runs the candidates of `shard` in `max_workers` threads and writes its
+    files. `options` are those of `run_candidate`. Returns the number of
+    candidates done and failed."""
+    recorder = MetricsRecorder()
+    set_metrics_recorder(recorder)
+    profiler = Profiler(recorder=recorder)
+    set_profiler(profiler)
+    profiler.start()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        records = list(executor.map(
+            lambda candidate: _run_candidate(*candidate, store,
+                                             job_descriptions, options),
+            shard.candidates
+        ))
+    profiler.stop()
+    set_profiler(None)
+    set_metrics_recorder(None)
+
+    calls = {}
+    for call in recorder.calls:
+        calls.setdefault(call.interview, []).append(asdict(call))
+    for record in records:
+        record['calls'] = calls.get(interview_id(Path(record['directory'])),
+                                    [])
+
+    output_dir = shards_dir(data_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    write_atomically(output_dir/f'{shard.name}.jsonl',
+                     ''.join(json.dumps(record) + '\n' for record in records))
+    report = profiler.report()
+    write_atomically(output_dir/f'{shard.name}.json', json.dumps({
+        'index': shard.index,
+        'directories': [directory for _, _, directory in shard.candidates],
+        'pid': os.getpid(),
+        'attempt': attempt,
+        'wall_time': report['wall_time'],
+        'cpu_time': report['cpu_time'],
+        'phases': report['phases']
+    }, indent=2))
+    failed = sum(record['status'] == 'failed' for record in records)
+    return len(records) - failed, failed
+
+
+def _worker_settings(processes: int) -> dict:
+    """What a worker process needs to make LLM calls like the parent"""
+    cassette = get_cassette()
+    cache = get_llm_cache()
+    limiter = get_rate_limiter()
+    router = get_router()
+    hedger = get_hedger()
+    settings = {
+        'backend': get_llm_backend(),
+        'cassette': (None if cassette is None
+                     else {'path': cassette.path, 'mode': cassette.mode}),
+        'cache': None if cache is None else {
+            'path': cache.path,
+            'stages': cache.stages,
+            'max_entries': cache.max_entries,
+            'max_bytes': cache.max_bytes,
+            'ttl': cache.ttl,
+            'stage_ttls': cache.stage_ttls
+        },
+        'limiter': None,
+        # The latencies are observed by each worker on its own
+        'router': None if router is None else {
+            'routes': router.routes,
+            'window': router.window,
+            'min_calls': router.min_calls,
+            'quantile': router.quantile,
+            'retry_after': router.retry_after
+        },
+        'hedger': None if hedger is None else {
+            'stages': hedger.stages,
+            'quantile': hedger.quantile,
+            'window': hedger.window,
+            'min_calls': hedger.min_calls,
+            'max_rate': hedger.max_rate,
+            'burst': hedger.burst
+        }
+    }
+    if limiter is not None:
+        # Without a file, each process gets its share of the limits
+        share = 1 if limiter.path is not None else processes
+        settings['limiter'] = {
+            'requests_per_minute': (
+                None if limiter.requests_per_minute is None
+                else limiter.requests_per_minute/share
+            ),
+            'tokens_per_minute': (
+                None if limiter.tokens_per_minute is None
+                else limiter.tokens_per_minute/share
+            ),
+            'path': limiter.path,
+            'max_retries': limiter.max_retries,
+            'base_delay': limiter.base_delay,
+            'max_delay': limiter.max_delay,
+            'burst_seconds': limiter.burst_seconds
+        }
+    return settings
+
+
+def _init_worker(settings: dict):
+    set_llm_backend(settings['backend'])
+    set_cassette(None if settings['cassette'] is None
+                 else Cassette(**settings['cassette']))
+    # A forked SQLite connection must not be used: the worker opens its own
+    set_llm_cache(None if settings['cache'] is None
+                  else LLMCache(**settings['cache']))
+    set_rate_limiter(None if settings['limiter'] is None
+                     else RateLimiter(**settings['limiter']))
+    set_router(None if settings['router'] is None
+               else Router(**settings['router']))
+    set_hedger(None if settings['hedger'] is None
+               else Hedger(**settings['hedger']))
+    set_stream_hub(None)
+    set_profiler(None)
+
+
+def _work(
+        connection: Connection,
+        settings: dict,
+        data_dir: str,
+        job_descriptions: dict[tuple, tuple[str, JobDescription]],
+        options: dict
+):
+    """Runs the shards sent by the parent until it sends `None`. Each
+    message back asks for the next shard."""
+    _init_worker(settings)
+    store = ArtifactStore(Path(data_dir)/'artifacts')
+    connection.send(None)
+    while (message := connection.recv()) is not None:
+        shard, attempt = message
+        counts = run_shard(shard, data_dir, store, job_descriptions,
+                           attempt=attempt, **options)
+        connection.send((shard.index, *counts))
+    connection.close()
+
+
+@dataclass
+class _Worker:
+    process: multiprocessing.Process
+    shard: Shard | None = None
+
+
+def _context():
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+
+def run_shards(
+        shards: list[Shard],
+        processes: int,
+        max_attempts: int,
+        worker_args: tuple
+) -> list[Shard]:
+    """Runs `shards` in `processes` worker processes, taking the next shard
+    from the queue whenever a worker is free. Returns the shards given up
+    after `max_attempts` dead workers."""
+    context = _context()
+    queue = deque(shards)
+    attempts = Counter()
+    workers: dict[Connection, _Worker] = {}
+    failed = []
+    finished = 0
+
+    def start_worker():
+        connection, child_connection = context.Pipe()
+        process = context.Process(target=_work,
+                                  args=(child_connection, *worker_args),
+                                  daemon=True)
+        process.start()
+        child_connection.close()
+        workers[connection] = _Worker(process)
+
+    for _ in range(min(processes, len(queue))):
+        start_worker()
+    while len(workers) > 0:
+        for connection in wait(list(workers)):
+            worker = workers[connection]
+            try:
+                message = connection.recv()
+            except EOFError:
+                # The worker died
+                worker.process.join()
+                del workers[connection]
+                connection.close()
+                shard = worker.shard
+                if shard is None:
+                    raise RuntimeError(
+                        f'Worker {worker.process.pid} died before running a '
+                        f'shard (exit code {worker.process.exitcode})'
+                    )
+                attempts[shard.index] += 1
+                print(f'{shard.name}: worker {worker.process.pid} died '
+                      f'(exit code {worker.process.exitcode}), attempt '
+                      f'{attempts[shard.index]}/{max_attempts}')
+                if attempts[shard.index] < max_attempts:
+                    queue.appendleft(shard)
+                else:
+                    failed.append(shard)
+                if len(queue) > 0:
+                    start_worker()
+                continue
+
+            if message is not None:
+                index, done, failures = message
+                finished += 1
+                print(f'[{finished}/{len(shards)}] {worker.shard.name}: '
+                      f'{done} candidate(s) done, {failures} failed')
+            worker.shard = queue.popleft() if len(queue) > 0 else None
+            if worker.shard is None:
+                connection.send(None)
+                worker.process.join()
+                del workers[connection]
+                connection.close()
+            else:
+                connection.send((worker.shard,
+                                 attempts[worker.shard.index] + 1))
+    return failed
+
+
+def merge_shards(
+        data_dir: str | Path,
+        recorder: MetricsRecorder | None = None
+) -> dict:
+    """Joins the done shards of `data_dir` into `results.jsonl`, in input
+    order, with the aggregated LLM metrics of each candidate instead of its
+    calls, and writes the aggregates of the batch to `results_summary.json`.
+    The calls are also recorded by `recorder`. Returns the aggregates."""
+    data_dir = Path(data_dir)
+    markers = []
+    records = []
+    for marker_file in sorted(shards_dir(data_dir).glob('shard-*.json')):
+        with marker_file.open('r') as file:
+            markers.append(json.load(file))
+        with marker_file.with_suffix('.jsonl').open('r') as file:
+            records.extend(json.loads(line) for line in file
+                           if line.strip() != '')
+    records.sort(key=lambda record: record['position'])
+
+    calls = MetricsRecorder()
+    lines = []
+    for record in records:
+        record_calls = [CallRecord(**call) for call in record.pop('calls')]
+        for call in record_calls:
+            calls.record(call)
+            if recorder is not None:
+                recorder.record(call)
+        record['llm'] = aggregate(record_calls)
+        lines.append(json.dumps(record) + '\n')
+    write_atomically(data_dir/'results.jsonl', ''.join(lines))
+
+    wall_times = [record['wall_time'] for record in records]
+    elapsed = 0.0
+    if len(records) > 0:
+        elapsed = (max(record['started'] + record['wall_time']
+                       for record in records)
+                   - min(record['started'] for record in records))
+    phases = {}
+    for marker in markers:
+        for name, phase in marker['phases'].items():
+            total = phases.setdefault(
+                name,
+                {'count': 0, 'wall_time': 0.0, 'cpu_time': 0.0}
+            )
+            for key in total:
+                total[key] += phase[key]
+    llm = calls.report()
+    del llm['interviews']
+    summary = {
+        'candidates': len(records),
+        'done': sum(record['status'] == 'done' for record in records),
+        'failed': sum(record['status'] == 'failed' for record in records),
+        'shards': len(markers),
+        'retried_shards': sum(marker['attempt'] > 1 for marker in markers),
+        'processes': len({marker['pid'] for marker in markers}),
+        'wall_time': elapsed,
+        'candidates_per_minute': (60 * len(records) / elapsed
+                                  if elapsed > 0 else 0.0),
+        'candidate_wall_time': {
+            'total': sum(wall_times),
+            **{f'p{round(q * 100)}': percentile(wall_times, q)
+               for q in QUANTILES}
+        },
+        'shard_wall_time': sum(marker['wall_time'] for marker in markers),
+        'shard_cpu_time': sum(marker['cpu_time'] for marker in markers),
+        'phases': phases,
+        'llm': llm
+    }
+    with (data_dir/'results_summary.json').open('w') as file:
+        json.dump(summary, file, indent=2)
+    return summary
+
+
+def main_shards(
+        candidates_file,
+        data_dir,
+        processes: int | None = None,
+        shard_size: int = 4,
+        max_workers: int = 4,
+        max_attempts: int = 3,
+        force_reload: bool = False,
+        summary_workers: int = 1,
+        prepersonalize: bool = False,
+        summary_mode: SummaryMode = SummaryMode.FULL,
+        summary_token_budget: int | None = None,
+        memory_token_budget: int | None = None,
+        pipelined: bool = False,
+        **defaults
+) -> dict:
+    """Screens every candidate in `candidates_file` like `main_batch`, in
+    shards of `shard_size` candidates run by `processes` worker processes
+    (one per CPU by default) of `max_workers` threads each, and merges the
+    results (see `merge_shards`, whose aggregates are returned)."""
+    data_dir = Path(data_dir)
+    processes = processes or os.cpu_count() or 1
+    store = ArtifactStore(data_dir/'artifacts')
+    specs = load_candidates(candidates_file, defaults)
+    shards = split_shards(specs, candidate_directories(specs, data_dir),
+                          shard_size)
+
+    # The job descriptions are created before the workers are, which only
+    # load them
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        job_descriptions = load_or_create_job_descriptions(
+            specs, data_dir, store, executor, force_reload
+        )
+
+    # Unfinished shards and those of a previous run with other candidates
+    # are removed
+    for path in shards_dir(data_dir).glob('shard-*'):
+        index = int(path.name.split('.')[0].split('-')[1])
+        if (force_reload or path.suffix == '.tmp' or index >= len(shards)
+                or not _is_done(shards[index], data_dir)):
+            path.unlink()
+    pending = [shard for shard in shards if not _is_done(shard, data_dir)]
+
+    print(f'Screening {len(specs)} candidate(s) in {len(shards)} shard(s), '
+          f'{len(shards) - len(pending)} already done...\n')
+    failed = run_shards(pending, processes, max_attempts, (
+        _worker_settings(processes),
+        str(data_dir),
+        job_descriptions,
+        {
+            'max_workers': max_workers,
+            'force_reload': force_reload,
+            'summary_workers': summary_workers,
+            'prepersonalize': prepersonalize,
+            'summary_mode': summary_mode,
+            'summary_token_budget': summary_token_budget,
+            'memory_token_budget': memory_token_budget,
+            'pipelined': pipelined
+        }
+    ))
+
+    summary = merge_shards(data_dir, get_metrics_recorder())
+    print(f'\n{summary["done"]} candidate(s) screened, {summary["failed"]} '
+          f'failed, {sum(len(shard.candidates) for shard in failed)} in '
+          f'shards given up, in {summary["wall_time"]:.1f} s '
+          f'({summary["candidates_per_minute"]:.1f} per minute).')
+    print(f'Results: {data_dir/"results.jsonl"}')
+    return summary
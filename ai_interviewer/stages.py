@@ -0,0 +1,22 @@
+from enum import Enum
+
+
+class Stage(str, Enum):
+    JOB_DESCRIPTION = 'job_description'
+    RESUME = 'resume'
+    RESUMES = 'resumes'
+    CANDIDATE_REPLY = 'candidate_reply'
+    MEMORY_SUMMARY = 'memory_summary'
+    PERSONALIZE = 'personalize'
+    FOLLOW_UP = 'follow_up'
+    ANSWER_CANDIDATE = 'answer_candidate'
+    EVIDENCE = 'evidence'
+    EVIDENCE_MERGE = 'evidence_merge'
+    CRITERION = 'criterion'
+    EVALUATION = 'evaluation'
+    RECOMMENDATION = 'recommendation'
+
+
+def stage_name(stage: Stage | str) -> str:
+    """The name of `stage`, given as a `Stage` or as its plain string value"""
+    return getattr(stage, 'value', stage)
@@ -0,0 +1,329 @@
+"""Buffered streaming of LLM tokens to several sinks.
+
+Each chat model line wraps its tokens as they arrive (see `LineWrapper`),
+and they are buffered per session (one session per interview). A session's
+buffer is written to every sink once it holds `max_chars` characters or its
+oldest text is `max_delay` seconds old (by a background thread when no
+token follows), and at the end of each LLM call.
+Sinks receive whole chunks instead of one write and flush per token, and the
+chunks of concurrent sessions do not mix.
+
+    hub = StreamHub([StdoutSink(), FileSink('streams/{session}.txt')])
+    set_stream_hub(hub)
+"""
+from abc import ABC, abstractmethod
+import asyncio
+import heapq
+import itertools
+import os
+from pathlib import Path
+import sys
+import threading
+import time
+from typing import Iterable, TextIO
+
+# Seconds without buffered text after which the flusher thread stops
+IDLE_TIMEOUT = 1.0
+
+
+class LineWrapper:
+    """Breaks lines longer than `limit` before the token that overflows
+    them. Only the length of the current line is kept, so each token costs
+    the same whatever the length of the text."""
+
+    def __init__(self, limit: int = 80):
+        self.limit = limit
+        self.column = 0
+
+    def wrap(self, token: str) -> str:
+        if '\n' in token:
+            self.column = 0
+        self.column += len(token)
+        if self.column > self.limit and len(token) > 1:
+            self.column = len(token)
+            return f'\n{token.strip()}'
+        return token
+
+
+class Sink(ABC):
+    """Destination of the text of every session"""
+
+    @abstractmethod
+    def write(self, session: str | None, text: str):
+        pass
+
+    def close(self):
+        pass
+
+
+class StdoutSink(Sink):
+    def __init__(self, stream: TextIO | None = None):
+        # By default, whatever `sys.stdout` is at the time of writing
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def write(self, session: str | None, text: str):
+        stream = self.stream or sys.stdout
+        with self._lock:
+            stream.write(text)
+            stream.flush()
+
+
+class FileSink(Sink):
+    """Appends to `path`; with a `{session}` field in it, to one file per
+    session"""
+
+    def __init__(self, path: str | Path):
+        self.path = str(path)
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def write(self, session: str | None, text: str):
+        path = self.path.replace('{session}', str(session))
+        with self._lock:
+            file = self._files.get(path)
+            if file is None:
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+                file = self._files[path] = open(path, 'a')
+            file.write(text)
+            file.flush()
+
+    def close(self):
+        with self._lock:
+            for file in self._files.values():
+                file.close()
+            self._files.clear()
+
+
+class QueueSink(Sink):
+    """Puts `(session, text)` in an asyncio queue, from any thread. Made in
+    the event loop of the queue, or else given that `loop`."""
+
+    def __init__(
+            self,
+            queue: asyncio.Queue,
+            loop: asyncio.AbstractEventLoop | None = None
+    ):
+        self.queue = queue
+        self.loop = loop or asyncio.get_running_loop()
+
+    def write(self, session: str | None, text: str):
+        _put(self.loop, self.queue, (session, text))
+
+
+class SubscriberSink(Sink):
+    """Publishes the text of every session to subscribers, like a websocket
+    server would: each subscriber gets its own queue of
+    `{'session': ..., 'text': ...}` messages, for one session or all."""
+
+    def __init__(self):
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(
+            self,
+            session: str | None = None,
+            maxsize: int = 0
+    ) -> asyncio.Queue:
+        """Called from the subscriber's event loop"""
+        queue = asyncio.Queue(maxsize=maxsize)
+        with self._lock:
+            self._subscribers.append(
+                (session, queue, asyncio.get_running_loop())
+            )
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers = [subscriber for subscriber in self._subscribers
+                                 if subscriber[1] is not queue]
+
+    def write(self, session: str | None, text: str):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        message = {'session': session, 'text': text}
+        for subscribed_session, queue, loop in subscribers:
+            if subscribed_session is None or subscribed_session == session:
+                _put(loop, queue, message)
+
+
+def _put(loop: asyncio.AbstractEventLoop, queue: asyncio.Queue, item):
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        queue.put_nowait(item)
+    else:
+        loop.call_soon_threadsafe(queue.put_nowait, item)
+
+
+class _LateFlusher:
+    """Flushes the sessions whose oldest text is `max_delay` old, from one
+    thread for all of them, which stops once none has text for
+    `IDLE_TIMEOUT` seconds"""
+
+    def __init__(self):
+        # (deadline, order, session), earliest first
+        self._deadlines = []
+        self._order = itertools.count()
+        self._condition = threading.Condition(threading.Lock())
+        self._thread: threading.Thread | None = None
+
+    def schedule(self, deadline: float, session: 'StreamSession'):
+        with self._condition:
+            heapq.heappush(self._deadlines,
+                           (deadline, next(self._order), session))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                daemon=True)
+                self._thread.start()
+            elif self._deadlines[0][2] is session:
+                self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                due = self._due()
+                if due is None:
+                    self._thread = None
+                    return
+            for session in due:
+                session.flush_late()
+
+    def _due(self) -> list['StreamSession'] | None:
+        """Waits for the next deadlines; `None` when idle"""
+        while True:
+            if len(self._deadlines) == 0:
+                if (not self._condition.wait(IDLE_TIMEOUT)
+                        and len(self._deadlines) == 0):
+                    return None
+                continue
+            now = time.monotonic()
+            if self._deadlines[0][0] > now:
+                self._condition.wait(self._deadlines[0][0] - now)
+                continue
+            due = []
+            while (len(self._deadlines) > 0
+                   and self._deadlines[0][0] <= now):
+                due.append(heapq.heappop(self._deadlines)[2])
+            return due
+
+
+_late_flusher = _LateFlusher()
+
+
+def _reset_late_flusher():
+    # A forked process has none of the threads of its parent
+    global _late_flusher
+    _late_flusher = _LateFlusher()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_late_flusher)
+
+
+class StreamSession:
+    """Buffered text stream of one session. Thread-safe."""
+
+    def __init__(
+            self,
+            session: str | None,
+            sinks: Iterable[Sink],
+            max_chars: int = 256,
+            max_delay: float = 0.05
+    ):
+        self.session = session
+        self.sinks = list(sinks)
+        self.max_chars = max_chars
+        self.max_delay = max_delay
+        self._buffer = []
+        self._size = 0
+        self._since = 0.0
+        self._lock = threading.Lock()
+
+    def write(self, text: str):
+        with self._lock:
+            if self._size == 0:
+                self._since = time.monotonic()
+                # In case no later token comes to flush it
+                _late_flusher.schedule(self._since + self.max_delay, self)
+            self._buffer.append(text)
+            self._size += len(text)
+            if (self._size >= self.max_chars
+                    or time.monotonic() - self._since >= self.max_delay):
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def flush_late(self):
+        """Flushes the buffer if its oldest text is `max_delay` old"""
+        with self._lock:
+            if time.monotonic() - self._since >= self.max_delay:
+                self._flush()
+
+    def _flush(self):
+        if self._size == 0:
+            return
+        text = ''.join(self._buffer)
+        self._buffer.clear()
+        self._size = 0
+        for sink in self.sinks:
+            sink.write(self.session, text)
+
+
+class StreamHub:
+    """Sinks shared by every session, and the session of each interview.
+    `limit` is the line length of the chat models streaming to it."""
+
+    def __init__(
+            self,
+            sinks: Iterable[Sink],
+            limit: int = 80,
+            max_chars: int = 256,
+            max_delay: float = 0.05
+    ):
+        self.sinks = list(sinks)
+        self.limit = limit
+        self.max_chars = max_chars
+        self.max_delay = max_delay
+        self.sessions = {}
+        self._lock = threading.Lock()
+
+    def session(self, session: str | None) -> StreamSession:
+        with self._lock:
+            if session not in self.sessions:
+                self.sessions[session] = StreamSession(
+                    session,
+                    self.sinks,
+                    max_chars=self.max_chars,
+                    max_delay=self.max_delay
+                )
+            return self.sessions[session]
+
+    def flush(self):
+        with self._lock:
+            sessions = list(self.sessions.values())
+        for session in sessions:
+            session.flush()
+
+    def close(self):
+        self.flush()
+        for sink in self.sinks:
+            sink.close()
+
+
+_stream_hub: StreamHub | None = None
+
+
+def set_stream_hub(hub: StreamHub | None):
+    """Streams the tokens of the chat models created from now on to `hub`.
+    With `None`, each model streams to stdout on its own."""
+    global _stream_hub
+    _stream_hub = hub
+
+
+def get_stream_hub() -> StreamHub | None:
+    return _stream_hub
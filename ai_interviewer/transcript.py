@@ -0,0 +1,156 @@
+from dataclasses import asdict, dataclass
+from enum import Enum
+import json
+from pathlib import Path
+import re
+from typing import Iterable
+
+
+class TurnKind(str, Enum):
+    QUESTION = 'question'
+    FOLLOW_UP = 'follow_up'
+    ANSWER = 'answer'
+
+
+@dataclass(slots=True)
+class Turn:
+    speaker: str
+    kind: str
+    text: str
+    question_type: str
+    question_index: int
+    follow_up_index: int | None = None
+    timestamp: float = 0.0
+    latency: float = 0.0
+
+    def render(self) -> str:
+        """Renders the turn as it appears in the text transcripts"""
+        if self.kind == TurnKind.FOLLOW_UP:
+            return f'\n\n{self.speaker} follow-up:\n{self.text}'
+        return f'\n\n{self.speaker}:\n{self.text}'
+
+
+class Transcript:
+    """Append-only list of interview turns.
+
+    The text views (`full_text`, and `short_text` with only the turns whose
+    question type is in `short_types`) are rendered on demand and cached
+    until the next turn. With `path`, each turn is also written to a JSON
+    lines file as soon as it is appended.
+    """
+
+    def __init__(
+            self,
+            short_types: Iterable[str] = (),
+            path: str | Path | None = None
+    ):
+        self.turns: list[Turn] = []
+        self.short_types = tuple(short_types)
+        self.path = None if path is None else Path(path)
+        self._full_text = None
+        self._short_text = None
+        self._file_started = False
+
+    def __len__(self):
+        return len(self.turns)
+
+    def __iter__(self):
+        return iter(self.turns)
+
+    def append(self, turn: Turn):
+        self.turns.append(turn)
+        self._full_text = None
+        self._short_text = None
+        if self.path is not None:
+            # The first turn starts the file over, later turns are appended
+            with self.path.open('a' if self._file_started else 'w') as file:
+                file.write(json.dumps(asdict(turn)) + '\n')
+            self._file_started = True
+
+    def restore(self, turns: Iterable[Turn]):
+        """Replaces the turns, and the file if any, by `turns`"""
+        self.turns = list(turns)
+        self._full_text = None
+        self._short_text = None
+        if self.path is not None:
+            with self.path.open('w') as file:
+                for turn in self.turns:
+                    file.write(json.dumps(asdict(turn)) + '\n')
+            self._file_started = True
+
+    def reload(self, count: int):
+        """Reads the first `count` turns back from the file, and drops the
+        turns written after them"""
+        turns = []
+        with self.path.open('r') as file:
+            for line in file:
+                if len(turns) == count:
+                    break
+                if line.strip() != '':
+                    turns.append(Turn(**json.loads(line)))
+        if len(turns) < count:
+            raise ValueError(f'{self.path} has {len(turns)} turns, '
+                             f'{count} expected')
+        self.restore(turns)
+
+    @property
+    def full_text(self) -> str:
+        if self._full_text is None:
+            self._full_text = ''.join(turn.render() for turn in self.turns)
+        return self._full_text
+
+    @property
+    def short_text(self) -> str:
+        if self._short_text is None:
+            self._short_text = ''.join(
+                turn.render() for turn in self.turns
+                if turn.question_type in self.short_types
+            )
+        return self._short_text
+
+    def select(
+            self,
+            question_type: str | None = None,
+            kind: str | None = None,
+            question_index: int | None = None
+    ) -> list[Turn]:
+        """Returns the turns matching every given filter"""
+        return [
+            turn for turn in self.turns
+            if (question_type is None or turn.question_type == question_type)
+            and (kind is None or turn.kind == kind)
+            and (question_index is None
+                 or turn.question_index == question_index)
+        ]
+
+    def blocks(self) -> list[str]:
+        """Renders the short view split by question: each block holds a
+        behavioral question, the answers and the follow-ups"""
+        blocks = {}
+        for turn in self.turns:
+            if turn.question_type in self.short_types:
+                blocks.setdefault(turn.question_index, []).append(
+                    turn.render()
+                )
+        return [''.join(block) for block in blocks.values()]
+
+    @classmethod
+    def load(
+            cls,
+            path: str | Path,
+            short_types: Iterable[str] = ()
+    ) -> 'Transcript':
+        """Reads a transcript written with `path`; new turns are appended"""
+        transcript = cls(short_types=short_types, path=path)
+        with Path(path).open('r') as file:
+            for line in file:
+                if line.strip() != '':
+                    transcript.turns.append(Turn(**json.loads(line)))
+        transcript._file_started = True
+        return transcript
+
+
+def split_blocks(text: str) -> list[str]:
+    """Splits a text transcript by question, like `Transcript.blocks`"""
+    return [block for block in re.split(r'(?=\n\nInterviewer:\n)', text)
+            if block.strip() != '']
@@ -1,31 +1,28 @@
+import os
 from pathlib import Path
-import sys
-from typing import Any
-
-from langchain.callbacks.base import BaseCallbackHandler
+import re
+import tempfile
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
-class StreamingStdOutLimitedCallbackHandler(BaseCallbackHandler):
-    def __init__(self, limit=80):
-        super().__init__()
-        self.line = ""
-        self.limit = limit
-
-    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
-        """Run on new LLM token. Only available when streaming is enabled."""
-        if token == '\n' or '\n' in token:
-            self.line = ""
-
-        self.line += token
-        if len(self.line) > self.limit and len(token) > 1:
-            sys.stdout.write(f'\n{token.strip()}')
-            sys.stdout.flush()
-            self.line = token
-        else:
-            sys.stdout.write(token)
-            sys.stdout.flush()
+def write_atomically(path: Path, data: str | bytes):
+    """Writes `data` to a temporary file next to `path`, with a unique
+    name, and renames it to `path`, so readers never see half a file and
+    concurrent writers of the same path do not mix"""
+    with tempfile.NamedTemporaryFile(
+            'wb' if isinstance(data, bytes) else 'w',
+            dir=path.parent,
+            prefix=f'{path.name}.',
+            suffix='.tmp',
+            delete=False
+    ) as file:
+        file.write(data)
+    try:
+        os.replace(file.name, path)
+    except OSError:
+        os.unlink(file.name)
+        raise
 
 
 def print_limit(text, line_limit=80):
@@ -61,3 +58,44 @@ def split_punctuation(text):
             i = j + 1
 
     return result
+
+
+def slugify(text):
+    return re.sub(r'[^a-z0-9]+', '_', str(text).lower()).strip('_')
+
+
+def estimate_tokens(text):
+    # About 4 characters per token for English text, without a tokenizer
+    return len(text) // 4 + 1
+
+
+def chunk_text(text, token_budget):
+    """Splits `text` at paragraph boundaries into chunks that fit in
+    `token_budget` tokens. Paragraphs longer than that are cut."""
+    max_chars = token_budget * 4
+    pieces = []
+    for paragraph in re.split(r'(?=\n\n)', text):
+        while len(paragraph) > max_chars:
+            pieces.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        if paragraph != '':
+            pieces.append(paragraph)
+
+    chunks = []
+    chunk = ''
+    for piece in pieces:
+        if chunk != '' and len(chunk) + len(piece) > max_chars:
+            chunks.append(chunk)
+            chunk = ''
+        chunk = f'{chunk}{piece}'
+    if chunk != '':
+        chunks.append(chunk)
+    return chunks
+
+
+def __getattr__(name):
+    # The streaming handler moved to `callbacks`, which imports langchain
+    if name == 'StreamingStdOutLimitedCallbackHandler':
+        from .callbacks import StreamingStdOutLimitedCallbackHandler
+        return StreamingStdOutLimitedCallbackHandler
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
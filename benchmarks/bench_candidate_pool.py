@@ -0,0 +1,112 @@
+"""Cost of creating a pool of candidates, one resume per request or several.
+
+Runs on the fake LLM backend (`ai_interviewer.fake_llm`), and compares
+creating `--size` candidates one `Candidate` at a time with
+`create_candidate_pool`, which asks for `--resumes_per_request` resumes per
+request. For each it reports the requests, the prompt and completion tokens
+(estimated) and the time. A share of the fake resumes (`--duplicate_rate`)
+are clones of the same one, to measure the near-duplicate rejection.
+
+    python -m benchmarks.bench_candidate_pool [--size 200]
+        [--resumes_per_request 4] [--max_workers 8]
+        [--first_token_latency 0.3] [--token_latency 0.0]
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import random
+import time
+
+from ai_interviewer import (
+    Candidate,
+    create_candidate_pool,
+    FakeBackend,
+    MetricsRecorder,
+    set_llm_backend,
+    set_metrics_recorder,
+)
+from ai_interviewer.candidate_pool import candidate_names, parse_resumes
+from ai_interviewer.fake_llm import fake_resumes, JOB_DESCRIPTION_TEXT
+
+JOB = {
+    'job': 'software engineer',
+    'area': 'Machine Learning and Artificial Intelligence',
+    'company': 'OpenAI',
+    'requirements': JOB_DESCRIPTION_TEXT.split('Requirements:\n')[1]
+}
+
+
+def cloning_resumes(duplicate_rate: float):
+    """Fake `resumes` response in which the resume of some candidates is
+    the same as everyone else's, apart from the name"""
+    clone = parse_resumes(fake_resumes(
+        '- Clone, 5 years of experience, 3 work experiences'
+    ))['Clone'].split('\n', 1)[1]
+
+    def respond(prompt: str) -> str:
+        resumes = []
+        for name, resume in parse_resumes(fake_resumes(prompt)).items():
+            if random.Random(name).random() < duplicate_rate:
+                resume = f'{name}\n{clone}'
+            resumes.append(f'### {name}\n{resume.split(chr(10), 1)[1]}')
+        return '\n'.join(resumes)
+    return respond
+
+
+def run_single(size: int, max_workers: int) -> int:
+    names = candidate_names(size, random.Random(0))
+
+    def create(name):
+        return Candidate(name=name, years_of_experience=5,
+                         work_experiences=3, **JOB)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return len(list(executor.map(create, names)))
+
+
+def run_pool(size: int, max_workers: int, resumes_per_request: int) -> int:
+    return len(create_candidate_pool(
+        size,
+        resumes_per_request=resumes_per_request,
+        max_workers=max_workers,
+        seed=0,
+        **JOB
+    ))
+
+
+def report(name: str, recorder: MetricsRecorder, elapsed: float,
+           candidates: int):
+    total = recorder.report()['total']
+    print(f'{name:<24} {candidates:5d} candidates  {total["calls"]:5d} '
+          f'requests  {total["prompt_tokens"]:8d} prompt tokens  '
+          f'{total["completion_tokens"]:8d} completion tokens  '
+          f'{elapsed:7.2f} s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--size', type=int, default=200)
+    parser.add_argument('--resumes_per_request', type=int, default=4)
+    parser.add_argument('--max_workers', type=int, default=8)
+    parser.add_argument('--first_token_latency', type=float, default=0.3)
+    parser.add_argument('--token_latency', type=float, default=0.0)
+    parser.add_argument('--duplicate_rate', type=float, default=0.1)
+    args = parser.parse_args()
+
+    set_llm_backend(FakeBackend(
+        first_token_latency=args.first_token_latency,
+        token_latency=args.token_latency,
+        responses={'resumes': cloning_resumes(args.duplicate_rate)}
+    ))
+
+    for name, run in (
+            ('one per request', lambda: run_single(args.size,
+                                                   args.max_workers)),
+            (f'{args.resumes_per_request} per request',
+             lambda: run_pool(args.size, args.max_workers,
+                              args.resumes_per_request))
+    ):
+        recorder = MetricsRecorder()
+        set_metrics_recorder(recorder)
+        start = time.perf_counter()
+        candidates = run()
+        report(name, recorder, time.perf_counter() - start, candidates)
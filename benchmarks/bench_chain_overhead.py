@@ -0,0 +1,84 @@
+"""Per-turn framework overhead of the interviewer chains.
+
+Compares building the prompt template, chat model and chain on every turn
+(how the interviewer used to work) with reusing the chain built once per
+`Interviewer`. Only the local work is timed: the prompt is rendered but no
+request is sent, so no API key or network is needed.
+
+    python -m benchmarks.bench_chain_overhead [--turns 2000]
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-benchmark')
+
+from langchain import LLMChain  # noqa: E402
+from langchain.prompts.chat import (  # noqa: E402
+    ChatPromptTemplate,
+    SystemMessagePromptTemplate,
+    HumanMessagePromptTemplate,
+)
+
+from ai_interviewer import Interviewer  # noqa: E402
+from ai_interviewer.prompts import PERSONALIZE_PROMPT  # noqa: E402
+from ai_interviewer.llm import create_chat_model, Stage  # noqa: E402
+
+
+def chain_per_turn(interviewer):
+    """The chain construction done on every turn before precompiling"""
+    system_message_prompt = SystemMessagePromptTemplate.from_template(
+        template=PERSONALIZE_PROMPT.messages[0].prompt.template
+    )
+    human_message_prompt = HumanMessagePromptTemplate.from_template(
+        template=PERSONALIZE_PROMPT.messages[1].prompt.template
+    )
+    chat_prompt = ChatPromptTemplate.from_messages([
+        system_message_prompt,
+        human_message_prompt
+    ])
+    return LLMChain(llm=create_chat_model(
+        Stage.PERSONALIZE,
+        temperature=0.5,
+        streaming=interviewer.streaming
+    ), prompt=chat_prompt
+    )
+
+
+def precompiled_chain(interviewer):
+    return interviewer._personalize_chain()
+
+
+def run(get_chain, interviewer, turns):
+    start = time.perf_counter()
+    for i in range(turns):
+        chain = get_chain(interviewer)
+        chain.prep_prompts([{
+            'company': interviewer.company,
+            'job': interviewer.job,
+            'name': interviewer.candidate_name,
+            'question': f'Tell me about a time you failed ({i}).'
+        }])
+    return (time.perf_counter() - start) / turns
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--turns', type=int, default=2000)
+    args = parser.parse_args()
+
+    interviewer = Interviewer(
+        candidate_name='Alan Bradley',
+        job='software engineer',
+        area='Machine Learning',
+        company='OpenAI'
+    )
+    # Warm up imports and caches
+    run(chain_per_turn, interviewer, 10)
+    run(precompiled_chain, interviewer, 10)
+
+    before = run(chain_per_turn, interviewer, args.turns)
+    after = run(precompiled_chain, interviewer, args.turns)
+    print(f'chain per turn:    {before * 1e6:8.1f} us/turn')
+    print(f'precompiled chain: {after * 1e6:8.1f} us/turn')
+    print(f'speed-up:          {before / after:8.1f}x')
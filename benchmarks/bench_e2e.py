@@ -0,0 +1,219 @@
+"""End-to-end throughput, latency and memory of the simulator, offline.
+
+Runs the whole pipeline on the fake LLM backend (`ai_interviewer.fake_llm`),
+so no API key or network is needed, and only the simulated model latency
+plus the framework's own overhead are measured:
+- single: one candidate, job description to summary, with the sync API;
+- batch: `main_batch` over `--interviews` candidates;
+- concurrent: `--interviews` interviews on one event loop (`run_interviews`).
+
+For each mode it reports interviews/sec, the latency of each phase and of
+the turns, and the memory peak (with `--trace_memory`, which slows the run).
+
+    python -m benchmarks.bench_e2e [--mode all] [--interviews 20]
+        [--first_token_latency 0.0] [--token_latency 0.0]
+"""
+import argparse
+import contextlib
+import io
+import json
+from pathlib import Path
+import random
+import resource
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from ai_interviewer import (
+    Candidate,
+    create_job_description,
+    FakeBackend,
+    InterviewSimulator,
+    Interviewer,
+    main_batch,
+    run_interviews,
+    set_llm_backend,
+)
+
+SPEC = {
+    'company': 'OpenAI',
+    'job': 'software engineer',
+    'area': 'Machine Learning and Artificial Intelligence',
+    'years_of_experience_job': 5,
+    'candidate_name': 'Alan Bradley',
+    'years_of_experience_candidate': 7,
+    'work_experiences': 3
+}
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def create_interview(job_description) -> InterviewSimulator:
+    candidate = Candidate(
+        name=SPEC['candidate_name'],
+        job=SPEC['job'],
+        years_of_experience=SPEC['years_of_experience_candidate'],
+        area=SPEC['area'],
+        requirements=job_description.requirements,
+        work_experiences=SPEC['work_experiences'],
+        company=SPEC['company']
+    )
+    interviewer = Interviewer(
+        candidate_name=SPEC['candidate_name'],
+        job=SPEC['job'],
+        area=SPEC['area'],
+        company=SPEC['company']
+    )
+    return InterviewSimulator(
+        interviewer=interviewer,
+        candidate=candidate,
+        job_description=job_description,
+        verbose=False
+    )
+
+
+def run_single(num_interviews: int) -> dict:
+    phases = {'job_description': [], 'candidate': [], 'interview': [],
+              'summary': []}
+    turns = []
+    for _ in range(num_interviews):
+        start = time.perf_counter()
+        job_description = create_job_description(
+            company=SPEC['company'],
+            job=SPEC['job'],
+            years_of_experience=SPEC['years_of_experience_job'],
+            area=SPEC['area']
+        )
+        phases['job_description'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        simulator = create_interview(job_description)
+        phases['candidate'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        simulator.start()
+        phases['interview'].append(time.perf_counter() - start)
+        turns.extend(turn.latency for turn in simulator.transcript)
+
+        start = time.perf_counter()
+        simulator.interviewer.summarize_interview(
+            simulator.short_transcript,
+            verbose=False
+        )
+        phases['summary'].append(time.perf_counter() - start)
+    return {'phases': phases, 'turns': turns}
+
+
+def run_batch(num_interviews: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        candidates_file = Path(directory)/'candidates.jsonl'
+        with candidates_file.open('w') as file:
+            for i in range(num_interviews):
+                file.write(json.dumps(
+                    {'candidate_name': f'Candidate {i}'}) + '\n')
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            main_batch(
+                candidates_file,
+                Path(directory)/'data',
+                max_workers=num_interviews,
+                **SPEC
+            )
+
+        turns = []
+        for transcript_file in Path(directory).glob('**/transcript.jsonl'):
+            with transcript_file.open('r') as file:
+                turns.extend(json.loads(line)['latency'] for line in file)
+    return {'phases': {}, 'turns': turns}
+
+
+def run_concurrent(num_interviews: int) -> dict:
+    start = time.perf_counter()
+    job_description = create_job_description(
+        company=SPEC['company'],
+        job=SPEC['job'],
+        years_of_experience=SPEC['years_of_experience_job'],
+        area=SPEC['area']
+    )
+    job_description_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    simulators = [create_interview(job_description)
+                  for _ in range(num_interviews)]
+    candidate_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    run_interviews(simulators)
+    interview_time = time.perf_counter() - start
+    return {
+        'phases': {
+            'job_description': [job_description_time],
+            'candidate': [candidate_time],
+            'interview': [interview_time]
+        },
+        'turns': [turn.latency for simulator in simulators
+                  for turn in simulator.transcript]
+    }
+
+
+MODES = {'single': run_single, 'batch': run_batch,
+         'concurrent': run_concurrent}
+
+
+def report(mode: str, result: dict, elapsed: float, num_interviews: int,
+           memory_peak: int | None):
+    print(f'{mode}: {num_interviews} interview(s) in {elapsed:.2f} s, '
+          f'{num_interviews / elapsed:.2f} interviews/s')
+    for phase, times in result['phases'].items():
+        print(f'  {phase:<16} mean {statistics.mean(times) * 1e3:9.1f} ms   '
+              f'max {max(times) * 1e3:9.1f} ms')
+    turns = result['turns']
+    if len(turns) > 0:
+        print(f'  {"turn":<16} p50  {percentile(turns, 0.5) * 1e3:9.1f} ms   '
+              f'p95 {percentile(turns, 0.95) * 1e3:9.1f} ms   '
+              f'({len(turns)} turns)')
+    if memory_peak is not None:
+        print(f'  {"memory peak":<16} {memory_peak / 2 ** 20:9.1f} MiB')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--mode', choices=['all', *MODES], default='all')
+    parser.add_argument('--interviews', type=int, default=20)
+    parser.add_argument('--first_token_latency', type=float, default=0.0)
+    parser.add_argument('--token_latency', type=float, default=0.0)
+    parser.add_argument('--trace_memory', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    set_llm_backend(FakeBackend(
+        first_token_latency=args.first_token_latency,
+        token_latency=args.token_latency
+    ))
+
+    # Import the LLM libraries outside of the measured runs
+    create_job_description('Acme', 'engineer', 1, 'software')
+
+    modes = list(MODES) if args.mode == 'all' else [args.mode]
+    for mode in modes:
+        # The single mode is sequential: a few interviews are enough
+        num_interviews = (min(3, args.interviews) if mode == 'single'
+                          else args.interviews)
+        if args.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = MODES[mode](num_interviews)
+        elapsed = time.perf_counter() - start
+        memory_peak = None
+        if args.trace_memory:
+            memory_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        report(mode, result, elapsed, num_interviews, memory_peak)
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f'max RSS: {max_rss / 2 ** 10:.1f} MiB')
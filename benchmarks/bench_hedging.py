@@ -0,0 +1,95 @@
+"""Tail latency of the candidate's replies, with and without hedging.
+
+Starts a local stand-in of the OpenAI API (`benchmarks.openai_stub`) whose
+responses are slow to start once in a while (`--slow_rate`), and makes
+streamed candidate reply calls one after the other:
+
+- unhedged: every call waits for its response;
+- hedged: a call without a first token after the `--quantile` of the
+  recent times to the first token is sent again, within `--max_rate`;
+- hedged async: the same with async calls, whose losers are cancelled as
+  soon as the other request streams.
+
+Reports the quantiles of the call latency, the hedged calls and the hedges
+that won, and the requests the server got per call. The first calls are
+not hedged, until the hedger has timed enough of them.
+
+    python -m benchmarks.bench_hedging [--calls 200] [--slow_rate 0.05]
+        [--slow_latency 1.0]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import time
+
+from langchain.schema import HumanMessage
+
+from ai_interviewer import Hedger, set_hedger
+from ai_interviewer.llm import create_chat_model
+from ai_interviewer.metrics import percentile
+from ai_interviewer.stages import Stage
+from benchmarks.openai_stub import OpenAIStub
+
+MESSAGES = [[HumanMessage(content='Tell me about yourself.')]]
+
+
+def call(asynchronous: bool) -> float:
+    model = create_chat_model(Stage.CANDIDATE_REPLY, streaming=True)
+    start = time.perf_counter()
+    # The tokens are streamed to stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        if asynchronous:
+            asyncio.run(model.agenerate(MESSAGES))
+        else:
+            model.generate(MESSAGES)
+    return time.perf_counter() - start
+
+
+def run(name: str, server: OpenAIStub, calls: int,
+        hedger: Hedger | None = None, asynchronous: bool = False):
+    set_hedger(hedger)
+    server.requests = server.slow = 0
+    latencies = [call(asynchronous) for _ in range(calls)]
+    set_hedger(None)
+
+    line = (f'{name:<13} ' + '  '.join(
+        f'p{round(q * 100)} {percentile(latencies, q) * 1e3:5.0f} ms'
+        for q in (0.5, 0.95, 0.99)
+    ) + f'  max {max(latencies) * 1e3:5.0f} ms  '
+        f'{server.requests / calls:.2f} requests per call')
+    if hedger is not None:
+        stats = hedger.stats()[Stage.CANDIDATE_REPLY.value]
+        line += (f'  {stats["hedged"]} hedged, {stats["hedge_wins"]} won by '
+                 f'the hedge')
+    print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--slow_rate', type=float, default=0.05)
+    parser.add_argument('--slow_latency', type=float, default=1.0)
+    parser.add_argument('--quantile', type=float, default=0.9)
+    parser.add_argument('--max_rate', type=float, default=0.15)
+    args = parser.parse_args()
+
+    server = OpenAIStub(
+        latency=0.05,
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+        token_latency=0.002
+    )
+    server.start()
+    os.environ['OPENAI_API_BASE'] = server.url
+    os.environ.setdefault('OPENAI_API_KEY', 'stub')
+
+    print(f'{args.calls} calls, {args.slow_rate:.0%} of the responses '
+          f'{args.slow_latency} s late')
+    run('unhedged', server, args.calls)
+    for name, asynchronous in (('hedged', False), ('hedged async', True)):
+        run(name, server, args.calls,
+            Hedger(quantile=args.quantile, max_rate=args.max_rate),
+            asynchronous)
+    server.stop()
@@ -0,0 +1,123 @@
+"""Prompt tokens of the candidate's replies with each memory.
+
+Runs the same interviews on the fake LLM backend (`ai_interviewer.fake_llm`)
+with the window memory of the last four exchanges and with the rolling
+summary memory of `--memory_token_budget` tokens, making the candidate's
+answers `--answer_words` words long. Reports the estimated prompt tokens of
+the candidate's replies (median, p95, max and total), those of the summary
+calls, and the interview time, which should not grow since summaries are
+written in the background.
+
+    python -m benchmarks.bench_memory [--interviews 3] [--answer_words 300]
+        [--memory_token_budget 1000] [--first_token_latency 0.05]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from ai_interviewer import (
+    Candidate,
+    FakeBackend,
+    InterviewSimulator,
+    Interviewer,
+    JobDescription,
+    MetricsRecorder,
+    set_llm_backend,
+    set_metrics_recorder,
+)
+from ai_interviewer.fake_llm import JOB_DESCRIPTION_TEXT, RESUME_TEXT
+from ai_interviewer.metrics import percentile
+from ai_interviewer.stages import Stage
+
+JOB_DESCRIPTION = JobDescription(
+    title='Software Engineer',
+    about='',
+    responsibilities='',
+    requirements=JOB_DESCRIPTION_TEXT.split('Requirements:\n')[1],
+    why='',
+    text=JOB_DESCRIPTION_TEXT
+)
+
+
+def long_answer(words: int):
+    sentences = [
+        'At Initech I split the billing platform into services.',
+        'I wrote the design document and led the migration for {digest}.',
+        'The number of incidents dropped by half within three months.',
+        'I would involve the operations team earlier next time.',
+    ]
+
+    def respond(prompt: str) -> str:
+        import hashlib
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        text = []
+        while len(text) < words:
+            text.extend(sentences[len(text) % 4].replace(
+                '{digest}', digest).split(' '))
+        return ' '.join(text[:words])
+    return respond
+
+
+def run(memory_token_budget: int | None, interviews: int, seed: int):
+    recorder = MetricsRecorder()
+    set_metrics_recorder(recorder)
+    random.seed(seed)
+    start = time.perf_counter()
+    for _ in range(interviews):
+        InterviewSimulator(
+            interviewer=Interviewer('Alan Bradley', 'software engineer',
+                                    'Machine Learning', 'Acme'),
+            candidate=Candidate(
+                name='Alan Bradley',
+                job='software engineer',
+                years_of_experience=7,
+                area='Machine Learning',
+                requirements=JOB_DESCRIPTION.requirements,
+                work_experiences=3,
+                company='Acme',
+                resume=RESUME_TEXT,
+                memory_token_budget=memory_token_budget
+            ),
+            job_description=JOB_DESCRIPTION,
+            verbose=False
+        ).start()
+    elapsed = time.perf_counter() - start
+    replies = [call.prompt_tokens for call in recorder.calls
+               if call.stage == Stage.CANDIDATE_REPLY.value]
+    summaries = [call.prompt_tokens for call in recorder.calls
+                 if call.stage == Stage.MEMORY_SUMMARY.value]
+    return replies, summaries, elapsed / interviews
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--interviews', type=int, default=3)
+    parser.add_argument('--answer_words', type=int, default=300)
+    parser.add_argument('--memory_token_budget', type=int, default=1000)
+    parser.add_argument('--first_token_latency', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    set_llm_backend(FakeBackend(
+        first_token_latency=args.first_token_latency,
+        responses={'candidate_reply': long_answer(args.answer_words)}
+    ))
+
+    results = {}
+    for name, budget in (('last 4 exchanges', None),
+                         (f'rolling, {args.memory_token_budget} tokens',
+                          args.memory_token_budget)):
+        replies, summaries, interview_time = run(budget, args.interviews,
+                                                 args.seed)
+        results[name] = sum(replies) + sum(summaries)
+        print(f'{name:<24} reply prompt tokens: median '
+              f'{statistics.median(replies):6.0f}  p95 '
+              f'{percentile(replies, 0.95):6.0f}  max {max(replies):6d}  '
+              f'total {sum(replies):8d}   summaries: {len(summaries):3d} '
+              f'calls, {sum(summaries):7d} tokens   '
+              f'{interview_time:5.2f} s/interview')
+
+    window, rolling = results.values()
+    print(f'prompt tokens saved, summaries included: '
+          f'{(1 - rolling / window) * 100:.0f}%')
@@ -0,0 +1,88 @@
+"""Interview time, sequential and pipelined.
+
+Runs the same interviews (same seeds) on the fake LLM backend
+(`ai_interviewer.fake_llm`) one turn after the other, then with
+`InterviewSimulator(pipelined=True)`, which personalizes the upcoming
+questions while the candidate replies. Reports the time per interview of
+each and checks that the transcripts are the same.
+
+    python -m benchmarks.bench_pipeline [--interviews 3]
+        [--first_token_latency 0.2] [--token_latency 0.0]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from ai_interviewer import (
+    Candidate,
+    FakeBackend,
+    InterviewSimulator,
+    Interviewer,
+    JobDescription,
+    set_llm_backend,
+)
+from ai_interviewer.fake_llm import JOB_DESCRIPTION_TEXT, RESUME_TEXT
+
+JOB_DESCRIPTION = JobDescription(
+    title='Software Engineer',
+    about='',
+    responsibilities='',
+    requirements=JOB_DESCRIPTION_TEXT.split('Requirements:\n')[1],
+    why='',
+    text=JOB_DESCRIPTION_TEXT
+)
+
+
+def run(seed: int, pipelined: bool) -> tuple[str, float]:
+    random.seed(seed)
+    simulator = InterviewSimulator(
+        interviewer=Interviewer('Alan Bradley', 'software engineer',
+                                'Machine Learning', 'Acme'),
+        candidate=Candidate(
+            name='Alan Bradley',
+            job='software engineer',
+            years_of_experience=7,
+            area='Machine Learning',
+            requirements=JOB_DESCRIPTION.requirements,
+            work_experiences=3,
+            company='Acme',
+            resume=RESUME_TEXT
+        ),
+        job_description=JOB_DESCRIPTION,
+        verbose=False,
+        pipelined=pipelined
+    )
+    start = time.perf_counter()
+    simulator.start()
+    return simulator.full_transcript, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--interviews', type=int, default=3)
+    parser.add_argument('--first_token_latency', type=float, default=0.2)
+    parser.add_argument('--token_latency', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    set_llm_backend(FakeBackend(
+        first_token_latency=args.first_token_latency,
+        token_latency=args.token_latency
+    ))
+
+    times = {'sequential': [], 'pipelined': []}
+    same = 0
+    for seed in range(args.seed, args.seed + args.interviews):
+        transcript, elapsed = run(seed, pipelined=False)
+        times['sequential'].append(elapsed)
+        pipelined_transcript, elapsed = run(seed, pipelined=True)
+        times['pipelined'].append(elapsed)
+        same += transcript == pipelined_transcript
+
+    for name, values in times.items():
+        print(f'{name:<12} {statistics.mean(values):6.2f} s/interview')
+    sequential, pipelined = (statistics.mean(values)
+                             for values in times.values())
+    print(f'time saved: {(1 - pipelined / sequential) * 100:.0f}%   '
+          f'identical transcripts: {same}/{args.interviews}')
@@ -0,0 +1,124 @@
+"""LLM calls under a rate limit, with and without `RateLimiter`.
+
+Starts a local stand-in of the OpenAI API (`benchmarks.openai_stub`) that
+allows `--server_rpm` requests per minute, enforced per second, and makes a
+share of its responses slow. Then, from `--workers` threads:
+- uncoordinated: every call retries 429s on its own (langchain's retries);
+- limited: calls are admitted by a shared `RateLimiter` a bit below the
+  server limit, and retried with jittered backoff;
+- priority: the limited run again, plus one interactive caller making calls
+  one after the other while the workers flood the limiter as a batch. Its
+  latency is compared with the same caller at batch priority.
+
+For each it reports the time, the failed calls and the 429s of the server.
+
+    python -m benchmarks.bench_rate_limit [--calls 200] [--workers 16]
+        [--server_rpm 600]
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import os
+import statistics
+import threading
+import time
+
+from langchain.schema import HumanMessage
+
+from ai_interviewer import (
+    Priority,
+    priority_context,
+    RateLimiter,
+    set_rate_limiter,
+)
+from ai_interviewer.llm import create_chat_model
+from ai_interviewer.stages import Stage
+from benchmarks.openai_stub import OpenAIStub
+
+
+def call() -> bool:
+    model = create_chat_model(Stage.CANDIDATE_REPLY)
+    try:
+        model([HumanMessage(content='Tell me about yourself.')])
+        return True
+    except Exception:
+        return False
+
+
+def run_batch(calls: int, workers: int) -> list[bool]:
+    def batch_call(_):
+        with priority_context(Priority.BATCH):
+            return call()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(batch_call, range(calls)))
+
+
+def run_interactive(calls: int, priority: Priority,
+                    done: threading.Event) -> list[float]:
+    latencies = []
+    with priority_context(priority):
+        for _ in range(calls):
+            if done.is_set():
+                break
+            start = time.perf_counter()
+            call()
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run(name: str, server: OpenAIStub, calls: int, workers: int,
+        interactive: Priority | None = None):
+    server.requests = server.rate_limited = 0
+    start = time.perf_counter()
+    done = threading.Event()
+    latencies = []
+    caller = None
+    if interactive is not None:
+        caller = threading.Thread(target=lambda: latencies.extend(
+            run_interactive(10, interactive, done)))
+        caller.start()
+    results = run_batch(calls, workers)
+    done.set()
+    if caller is not None:
+        caller.join()
+    elapsed = time.perf_counter() - start
+
+    line = (f'{name:<28} {elapsed:6.1f} s  {results.count(False):3d} failed  '
+            f'{server.rate_limited:4d} 429s  {server.requests:5d} requests')
+    if len(latencies) > 0:
+        line += (f'  interactive latency mean '
+                 f'{statistics.mean(latencies) * 1e3:.0f} ms')
+    print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--server_rpm', type=float, default=600)
+    parser.add_argument('--slow_rate', type=float, default=0.05)
+    args = parser.parse_args()
+
+    server = OpenAIStub(
+        requests_per_minute=args.server_rpm,
+        window=1.0,
+        slow_rate=args.slow_rate,
+        slow_latency=1.0
+    )
+    server.start()
+    os.environ['OPENAI_API_BASE'] = server.url
+    os.environ.setdefault('OPENAI_API_KEY', 'stub')
+
+    run('uncoordinated', server, args.calls, args.workers)
+
+    limiter_rpm = args.server_rpm * 0.95
+    for name, interactive in (('limited', None),
+                              ('interactive, batch priority', Priority.BATCH),
+                              ('interactive priority', Priority.INTERACTIVE)):
+        set_rate_limiter(RateLimiter(
+            requests_per_minute=limiter_rpm,
+            burst_seconds=1.0,
+            base_delay=0.1
+        ))
+        run(name, server, args.calls, args.workers, interactive)
+    server.stop()
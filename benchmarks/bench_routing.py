@@ -0,0 +1,135 @@
+"""Interview and summary time with every stage on one model, and routed.
+
+Runs the same interview (same seed) on the fake LLM backend
+(`ai_interviewer.fake_llm`), where a large model is slower than a small
+one, with:
+
+- single: every stage on the large model;
+- tiered: the conversational stages on the small model, with a cap on
+  the tokens of the short rewrites, and the summary on the large model;
+- spike: tiered, but the large model is much slower than usual;
+- spike with SLO: the same, but the summary stages fall back to the small
+  model once they exceed their latency SLO.
+
+Reports the mean latency of the interviewer's turns, the time of the
+interview and of the summary, and the completion tokens per model.
+
+    python -m benchmarks.bench_routing [--seed 0]
+"""
+import argparse
+import random
+import time
+
+from ai_interviewer import (
+    Candidate,
+    create_job_description,
+    FakeBackend,
+    InterviewSimulator,
+    Interviewer,
+    JobDescription,
+    MetricsRecorder,
+    Route,
+    Router,
+    set_llm_backend,
+    set_metrics_recorder,
+    set_router,
+)
+from ai_interviewer.fake_llm import JOB_DESCRIPTION_TEXT, RESUME_TEXT
+from ai_interviewer.stages import Stage
+
+LARGE = 'large'
+SMALL = 'small'
+# (first token, between tokens), in seconds
+LATENCIES = {LARGE: (0.1, 0.004), SMALL: (0.03, 0.001)}
+SPIKE_LATENCIES = {LARGE: (1.0, 0.004), SMALL: (0.03, 0.001)}
+
+# The interviewer's own turns
+TURN_STAGES = {Stage.PERSONALIZE, Stage.FOLLOW_UP, Stage.ANSWER_CANDIDATE}
+SUMMARY_STAGES = (Stage.CRITERION, Stage.RECOMMENDATION)
+
+SINGLE = {'default': Route(model=LARGE)}
+TIERED = {
+    'default': Route(model=SMALL),
+    Stage.PERSONALIZE: Route(model=SMALL, max_tokens=80),
+    Stage.FOLLOW_UP: Route(model=SMALL, max_tokens=60),
+    Stage.ANSWER_CANDIDATE: Route(model=SMALL, max_tokens=120),
+    **{stage: Route(model=LARGE) for stage in SUMMARY_STAGES}
+}
+TIERED_SLO = {
+    **TIERED,
+    **{stage: Route(model=LARGE, latency_slo=0.5, fallbacks=(SMALL,))
+       for stage in SUMMARY_STAGES}
+}
+
+JOB_DESCRIPTION = JobDescription(
+    title='Software Engineer',
+    about='',
+    responsibilities='',
+    requirements=JOB_DESCRIPTION_TEXT.split('Requirements:\n')[1],
+    why='',
+    text=JOB_DESCRIPTION_TEXT
+)
+
+
+def run(routes: dict, latencies: dict, seed: int):
+    set_llm_backend(FakeBackend(model_latencies=latencies))
+    set_router(Router(routes, min_calls=3))
+    recorder = MetricsRecorder()
+    set_metrics_recorder(recorder)
+    random.seed(seed)
+    interviewer = Interviewer('Alan Bradley', 'software engineer',
+                              'Machine Learning', 'Acme')
+    simulator = InterviewSimulator(
+        interviewer=interviewer,
+        candidate=Candidate(
+            name='Alan Bradley',
+            job='software engineer',
+            years_of_experience=7,
+            area='Machine Learning',
+            requirements=JOB_DESCRIPTION.requirements,
+            work_experiences=3,
+            company='Acme',
+            resume=RESUME_TEXT
+        ),
+        job_description=JOB_DESCRIPTION,
+        verbose=False
+    )
+    start = time.perf_counter()
+    simulator.start()
+    interview_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    interviewer.summarize_interview(simulator.transcript, verbose=False)
+    summary_time = time.perf_counter() - start
+    set_metrics_recorder(None)
+    set_router(None)
+    return interview_time, summary_time, recorder.calls
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # Import the LLM libraries outside of the measured runs
+    set_llm_backend(FakeBackend())
+    create_job_description('Acme', 'engineer', 1, 'software')
+
+    for name, routes, latencies in (
+            ('single', SINGLE, LATENCIES),
+            ('tiered', TIERED, LATENCIES),
+            ('spike', TIERED, SPIKE_LATENCIES),
+            ('spike with SLO', TIERED_SLO, SPIKE_LATENCIES)
+    ):
+        interview_time, summary_time, calls = run(routes, latencies,
+                                                  args.seed)
+        turns = [call.latency for call in calls if call.stage in TURN_STAGES]
+        tokens = {}
+        for call in calls:
+            tokens[call.model] = (tokens.get(call.model, 0)
+                                  + call.completion_tokens)
+        print(f'{name:<14} turn {sum(turns) / len(turns):5.3f} s   '
+              f'interview {interview_time:6.2f} s   '
+              f'summary {summary_time:6.2f} s   completion tokens '
+              + ', '.join(f'{model} {count}'
+                          for model, count in sorted(tokens.items())))
@@ -0,0 +1,75 @@
+"""Throughput of the sharded runner by number of worker processes.
+
+Screens the same candidates on the fake LLM backend (`ai_interviewer.fake_llm`)
+with `main_shards` and 1, 2, 4... worker processes, each in a new data
+directory, and reports the candidates per minute and the speedup over one
+process. With a latency, the workers mostly wait for the (simulated) API;
+without one, they are CPU-bound and scale with the number of cores at best.
+
+    python -m benchmarks.bench_shards [--candidates 16] [--processes 1,2,4]
+        [--first_token_latency 0.02] [--max_workers 1]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+from pathlib import Path
+import tempfile
+
+from ai_interviewer import FakeBackend, main_shards, set_llm_backend
+
+DEFAULTS = {
+    'company': 'Acme',
+    'job': 'software engineer',
+    'area': 'Machine Learning',
+    'years_of_experience_job': 5,
+    'candidate_name': 'Alan Bradley',
+    'years_of_experience_candidate': 7,
+    'work_experiences': 3
+}
+
+
+def run(candidates_file: Path, processes: int, shard_size: int,
+        max_workers: int) -> dict:
+    with tempfile.TemporaryDirectory() as data_dir:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return main_shards(candidates_file, data_dir,
+                               processes=processes, shard_size=shard_size,
+                               max_workers=max_workers, **DEFAULTS)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--candidates', type=int, default=16)
+    parser.add_argument('--processes', type=str, default='1,2,4')
+    parser.add_argument('--shard_size', type=int, default=2)
+    parser.add_argument('--max_workers', type=int, default=1)
+    parser.add_argument('--first_token_latency', type=float, default=0.02)
+    parser.add_argument('--token_latency', type=float, default=0.0)
+    args = parser.parse_args()
+
+    set_llm_backend(FakeBackend(
+        first_token_latency=args.first_token_latency,
+        token_latency=args.token_latency
+    ))
+
+    print(f'{os.cpu_count()} CPU(s), {args.candidates} candidates, '
+          f'{args.first_token_latency} s to the first token')
+    with tempfile.TemporaryDirectory() as directory:
+        candidates_file = Path(directory)/'candidates.jsonl'
+        with candidates_file.open('w') as file:
+            for i in range(args.candidates):
+                file.write(json.dumps({'candidate_name': f'Candidate {i}'})
+                           + '\n')
+
+        baseline = None
+        for processes in (int(p) for p in args.processes.split(',')):
+            summary = run(candidates_file, processes, args.shard_size,
+                          args.max_workers)
+            throughput = summary['candidates_per_minute']
+            baseline = baseline or throughput
+            print(f'{processes:2d} process(es): {summary["wall_time"]:6.2f} s, '
+                  f'{throughput:7.1f} candidates per minute, '
+                  f'x{throughput / baseline:.2f}, '
+                  f'{summary["shard_cpu_time"]:6.2f} s CPU')
@@ -0,0 +1,158 @@
+"""CLI startup time and heavy imports of a fully cached run.
+
+Measures, in fresh interpreters:
+- the time to `import ai_interviewer`;
+- the time to the first line of output and to the end of
+  `python -m ai_interviewer` on a data directory whose artifact store
+  already holds every stage, so no LLM call is made;
+- which LLM libraries that cached run imported. There should be none, and
+  the script exits with an error otherwise, so it can guard regressions.
+
+    python -m benchmarks.bench_startup [--runs 5] [--max_first_output 1.0]
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from ai_interviewer.artifacts import ArtifactStore
+from ai_interviewer.util import BASE_DIR
+
+HEAVY_MODULES = ('langchain', 'openai', 'aiohttp', 'tiktoken', 'pandas')
+
+CHECK_IMPORTS = (
+    'import runpy, sys, json\n'
+    'sys.argv = ["ai_interviewer", "--data_dir", sys.argv[1]]\n'
+    'runpy.run_module("ai_interviewer", run_name="__main__")\n'
+    'heavy = sorted({m.split(".")[0] for m in sys.modules} & set(%r))\n'
+    'print("HEAVY=" + json.dumps(heavy))\n'
+) % (HEAVY_MODULES,)
+
+
+def create_cached_data_dir(data_dir: Path):
+    """Stores the artifacts of a finished run with the default options, as
+    `main` would"""
+    store = ArtifactStore(data_dir/'artifacts')
+    job_description = {
+        'title': 'Software Engineer',
+        'about': 'About the role.',
+        'responsibilities': '- Build things.',
+        'requirements': '- 5 years of experience.',
+        'why': 'Great team.',
+        'text': 'Job Title: Software Engineer\n\nAbout the Role: ...'
+    }
+    candidate = {
+        'name': 'Alan Bradley',
+        'job': 'software engineer',
+        'years_of_experience': 7,
+        'area': 'Machine Learning and Artificial Intelligence',
+        'requirements': '- 5 years of experience.',
+        'work_experiences': 3,
+        'company': 'OpenAI',
+        'resume': 'Alan Bradley\nSoftware Engineer'
+    }
+    transcript = '\n\nInterviewer:\nHi!\n\nAlan Bradley:\nHello!'
+    artifacts = (
+        ('job_description',
+         {'company': 'OpenAI', 'job': 'software engineer',
+          'years_of_experience': 5, 'area': candidate['area']},
+         job_description, ()),
+        ('candidate',
+         {key: candidate[key] for key in ('name', 'job',
+                                          'years_of_experience', 'area',
+                                          'work_experiences', 'company')},
+         candidate, ('job_description',)),
+        ('interview',
+         {'candidate_name': 'Alan Bradley', 'job': 'software engineer',
+          'area': candidate['area'], 'company': 'OpenAI',
+          'memory_token_budget': None},
+         {'full_transcript': transcript, 'short_transcript': transcript,
+          'turns': []},
+         ('job_description', 'candidate')),
+        ('summary', {'mode': 'full', 'token_budget': None},
+         {'summary': 'Recommendation:\n\nHire.'}, ('interview',)),
+    )
+    keys = {}
+    for stage, inputs, value, deps in artifacts:
+        deps = {dep: keys[dep] for dep in deps}
+        keys[stage] = store.key(stage, inputs, deps)
+        store.save(keys[stage], stage, value, inputs, deps)
+
+
+def time_import(runs: int) -> list[float]:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'import ai_interviewer'],
+                       cwd=BASE_DIR, check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def time_cached_run(data_dir: Path, runs: int) -> tuple[list, list]:
+    first_output, total = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'ai_interviewer', '--data_dir', data_dir],
+            cwd=BASE_DIR,
+            stdout=subprocess.PIPE,
+            env={**os.environ, 'PYTHONUNBUFFERED': '1'}
+        )
+        process.stdout.readline()
+        first_output.append(time.perf_counter() - start)
+        process.stdout.read()
+        process.wait()
+        total.append(time.perf_counter() - start)
+    return first_output, total
+
+
+def heavy_imports(data_dir: Path) -> list[str]:
+    output = subprocess.run(
+        [sys.executable, '-c', CHECK_IMPORTS, data_dir],
+        cwd=BASE_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    line = [line for line in output.splitlines() if line.startswith('HEAVY=')]
+    return json.loads(line[-1][len('HEAVY='):])
+
+
+def report(name: str, times: list[float]):
+    print(f'{name:<28} median {statistics.median(times) * 1e3:8.1f} ms   '
+          f'min {min(times) * 1e3:8.1f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument(
+        '--max_first_output',
+        type=float,
+        default=None,
+        help='Fail if the median time to first output exceeds this, in s')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        data_dir = Path(directory)
+        create_cached_data_dir(data_dir)
+
+        report('import ai_interviewer', time_import(args.runs))
+        first_output, total = time_cached_run(data_dir, args.runs)
+        report('cached run, first output', first_output)
+        report('cached run, total', total)
+        heavy = heavy_imports(data_dir)
+
+    print(f'LLM libraries imported by the cached run: {heavy or "none"}')
+    failed = len(heavy) > 0
+    if (args.max_first_output is not None
+            and statistics.median(first_output) > args.max_first_output):
+        print(f'Time to first output above {args.max_first_output}s')
+        failed = True
+    sys.exit(1 if failed else 0)
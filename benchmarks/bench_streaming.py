@@ -0,0 +1,89 @@
+"""Cost of streaming the tokens of many concurrent sessions.
+
+Compares the former stdout handler, which wrote and flushed every token and
+rebuilt the current line by concatenation, with the buffered sessions of
+`ai_interviewer.streaming`. Both write to the null device, so the time is
+the handler and syscall overhead only.
+
+    python -m benchmarks.bench_streaming [--sessions 200] [--tokens 500]
+"""
+import argparse
+import os
+import time
+
+from ai_interviewer.streaming import LineWrapper, StdoutSink, StreamHub
+
+TOKENS = [' Sure', '.', ' At', ' Initech', ' our', ' billing', ' platform',
+          ' kept', ' failing', ' under', ' load', '.\n', 'I', ' proposed']
+
+
+class PerTokenHandler:
+    """The stdout handler before the streaming sessions"""
+
+    def __init__(self, stream, limit=80):
+        self.stream = stream
+        self.line = ''
+        self.limit = limit
+
+    def on_llm_new_token(self, token):
+        if token == '\n' or '\n' in token:
+            self.line = ''
+        self.line += token
+        if len(self.line) > self.limit and len(token) > 1:
+            self.stream.write(f'\n{token.strip()}')
+            self.stream.flush()
+            self.line = token
+        else:
+            self.stream.write(token)
+            self.stream.flush()
+
+
+class CountingStream:
+    def __init__(self, stream):
+        self.stream = stream
+        self.flushes = 0
+
+    def write(self, text):
+        self.stream.write(text)
+
+    def flush(self):
+        self.flushes += 1
+        self.stream.flush()
+
+
+def run_per_token(stream, sessions, tokens):
+    handlers = [PerTokenHandler(stream) for _ in range(sessions)]
+    for i in range(tokens):
+        token = TOKENS[i % len(TOKENS)]
+        for handler in handlers:
+            handler.on_llm_new_token(token)
+
+
+def run_buffered(stream, sessions, tokens):
+    hub = StreamHub([StdoutSink(stream)])
+    streams = [(LineWrapper(hub.limit), hub.session(str(i)))
+               for i in range(sessions)]
+    for i in range(tokens):
+        token = TOKENS[i % len(TOKENS)]
+        for wrapper, session in streams:
+            session.write(wrapper.wrap(token))
+    hub.flush()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--tokens', type=int, default=500)
+    args = parser.parse_args()
+
+    with open(os.devnull, 'w') as devnull:
+        for name, run in (('per-token write+flush', run_per_token),
+                          ('buffered sessions', run_buffered)):
+            stream = CountingStream(devnull)
+            start = time.perf_counter()
+            run(stream, args.sessions, args.tokens)
+            elapsed = time.perf_counter() - start
+            total = args.sessions * args.tokens
+            print(f'{name:<22} {elapsed * 1e3:8.1f} ms  '
+                  f'{elapsed / total * 1e6:6.2f} us/token  '
+                  f'{stream.flushes:7d} flushes')
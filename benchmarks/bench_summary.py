@@ -0,0 +1,114 @@
+"""Time from the last turn of an interview to its report, by summary mode.
+
+Runs the same interview (same seed) on the fake LLM backend
+(`ai_interviewer.fake_llm`) for each summary mode, and measures the
+interview and the summary that follows it, with the LLM calls and prompt
+tokens of the summary. In incremental mode, the evidence of each question
+block is extracted in the background while the interview goes on
+(`EvidenceCollector`), so only the merge and the recommendation are left
+after the last turn. In structured mode, the whole evaluation is one call.
+
+    python -m benchmarks.bench_summary [--first_token_latency 0.2]
+        [--summary_workers 1]
+"""
+import argparse
+import random
+import time
+
+from ai_interviewer import (
+    Candidate,
+    create_job_description,
+    EvidenceCollector,
+    FakeBackend,
+    InterviewSimulator,
+    Interviewer,
+    JobDescription,
+    MetricsRecorder,
+    set_llm_backend,
+    set_metrics_recorder,
+    SummaryMode,
+)
+from ai_interviewer.fake_llm import JOB_DESCRIPTION_TEXT, RESUME_TEXT
+from ai_interviewer.stages import Stage
+
+# Calls counted as the summary's, wherever they are made
+SUMMARY_STAGES = {Stage.EVIDENCE, Stage.EVIDENCE_MERGE, Stage.CRITERION,
+                  Stage.EVALUATION, Stage.RECOMMENDATION}
+
+JOB_DESCRIPTION = JobDescription(
+    title='Software Engineer',
+    about='',
+    responsibilities='',
+    requirements=JOB_DESCRIPTION_TEXT.split('Requirements:\n')[1],
+    why='',
+    text=JOB_DESCRIPTION_TEXT
+)
+
+
+def run(mode: SummaryMode, seed: int, summary_workers: int):
+    random.seed(seed)
+    interviewer = Interviewer('Alan Bradley', 'software engineer',
+                              'Machine Learning', 'Acme')
+    evidence = None
+    if mode == SummaryMode.INCREMENTAL:
+        evidence = EvidenceCollector(interviewer)
+    simulator = InterviewSimulator(
+        interviewer=interviewer,
+        candidate=Candidate(
+            name='Alan Bradley',
+            job='software engineer',
+            years_of_experience=7,
+            area='Machine Learning',
+            requirements=JOB_DESCRIPTION.requirements,
+            work_experiences=3,
+            company='Acme',
+            resume=RESUME_TEXT
+        ),
+        job_description=JOB_DESCRIPTION,
+        verbose=False,
+        on_block_complete=None if evidence is None else evidence.add_block
+    )
+    recorder = MetricsRecorder()
+    set_metrics_recorder(recorder)
+    start = time.perf_counter()
+    simulator.start()
+    interview_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    interviewer.summarize_interview(
+        simulator.transcript,
+        verbose=False,
+        max_workers=summary_workers,
+        mode=mode,
+        evidence=evidence
+    )
+    report_time = time.perf_counter() - start
+    set_metrics_recorder(None)
+    return interview_time, report_time, [
+        call for call in recorder.calls if call.stage in SUMMARY_STAGES
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--first_token_latency', type=float, default=0.2)
+    parser.add_argument('--token_latency', type=float, default=0.0)
+    parser.add_argument('--summary_workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    set_llm_backend(FakeBackend(
+        first_token_latency=args.first_token_latency,
+        token_latency=args.token_latency
+    ))
+
+    # Import the LLM libraries outside of the measured runs
+    create_job_description('Acme', 'engineer', 1, 'software')
+
+    for mode in SummaryMode:
+        interview_time, report_time, calls = run(mode, args.seed,
+                                                 args.summary_workers)
+        print(f'{mode.value:<12} interview {interview_time:6.2f} s   '
+              f'report after the last turn {report_time:6.2f} s   '
+              f'{len(calls):3d} summary calls, '
+              f'{sum(call.prompt_tokens for call in calls):6d} prompt tokens')
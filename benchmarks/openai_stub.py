@@ -0,0 +1,196 @@
+"""Local stand-in for the OpenAI chat completions API.
+
+Answers `POST /v1/chat/completions`, streamed or not, with a fixed text. It
+enforces its own requests and tokens per minute over a sliding `window` of
+seconds (like the real API, which enforces them over less than a minute)
+and answers 429 with a `Retry-After` above them, and makes a share of the
+responses slow, so clients can be tested against rate limits and latency
+spikes without the real API.
+
+    server = OpenAIStub(requests_per_minute=60, slow_rate=0.1)
+    server.start()
+    os.environ['OPENAI_API_BASE'] = server.url
+    ...
+    server.stop()
+"""
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+
+TEXT = ('Sure. At Initech I split the billing platform into services and '
+        'led the migration, which halved the incidents.')
+
+
+class OpenAIStub:
+    def __init__(
+            self,
+            requests_per_minute: float | None = None,
+            tokens_per_minute: float | None = None,
+            latency: float = 0.05,
+            slow_rate: float = 0.0,
+            slow_latency: float = 2.0,
+            token_latency: float = 0.0,
+            text: str = TEXT,
+            window: float = 60.0,
+            seed: int = 0
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.token_latency = token_latency
+        self.text = text
+        self.window = window
+        self.requests = 0
+        self.rate_limited = 0
+        self.slow = 0
+        self._random = random.Random(seed)
+        # (time, tokens) of the requests admitted in the window
+        self._window = deque()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_address[1]}/v1'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _admit(self, tokens: int) -> float:
+        """0 when the request is within the limits, or else the seconds
+        until it would be"""
+        now = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            while (len(self._window) > 0
+                   and self._window[0][0] <= now - self.window):
+                self._window.popleft()
+            used = sum(amount for _, amount in self._window)
+            scale = self.window / 60
+            if ((self.requests_per_minute is not None
+                 and len(self._window) + 1 > self.requests_per_minute * scale)
+                    or (self.tokens_per_minute is not None
+                        and used + tokens > self.tokens_per_minute * scale)):
+                self.rate_limited += 1
+                oldest = self._window[0][0] if self._window else now
+                return max(0.1, oldest + self.window - now)
+            self._window.append((now, tokens))
+            return 0.0
+
+    def _latency(self) -> float:
+        with self._lock:
+            if self._random.random() < self.slow_rate:
+                self.slow += 1
+                return self.slow_latency
+        return self.latency
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, body: dict, headers=()):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                request = json.loads(
+                    self.rfile.read(int(self.headers['Content-Length']))
+                )
+                prompt_tokens = sum(
+                    len(message.get('content', '')) // 4 + 1
+                    for message in request.get('messages', [])
+                )
+                completion_tokens = len(stub.text) // 4 + 1
+                retry_after = stub._admit(prompt_tokens + completion_tokens)
+                if retry_after > 0:
+                    self._send_json(429, {'error': {
+                        'message': 'Rate limit reached',
+                        'type': 'requests',
+                        'param': None,
+                        'code': None
+                    }}, headers=[('Retry-After', f'{retry_after:.1f}')])
+                    return
+
+                time.sleep(stub._latency())
+                if request.get('stream'):
+                    try:
+                        self._stream(request)
+                    except ConnectionError:
+                        # The client gave up on the stream, e.g. a hedge
+                        # that lost
+                        self.close_connection = True
+                    return
+                self._send_json(200, {
+                    'id': 'chatcmpl-stub',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': request.get('model'),
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant',
+                                    'content': stub.text},
+                        'finish_reason': 'stop'
+                    }],
+                    'usage': {
+                        'prompt_tokens': prompt_tokens,
+                        'completion_tokens': completion_tokens,
+                        'total_tokens': prompt_tokens + completion_tokens
+                    }
+                })
+
+            def _stream(self, request: dict):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                words = stub.text.split(' ')
+                tokens = words[:1] + [f' {word}' for word in words[1:]]
+                for i, token in enumerate(tokens):
+                    if i > 0:
+                        time.sleep(stub.token_latency)
+                    self._chunk({'choices': [{
+                        'index': 0,
+                        'delta': {'content': token},
+                        'finish_reason': None
+                    }], 'model': request.get('model')})
+                self._chunk({'choices': [{
+                    'index': 0,
+                    'delta': {},
+                    'finish_reason': 'stop'
+                }], 'model': request.get('model')})
+                self._write(b'data: [DONE]\n\n')
+                self._write(b'')
+
+            def _chunk(self, body: dict):
+                self._write(f'data: {json.dumps(body)}\n\n'.encode())
+
+            def _write(self, data: bytes):
+                self.wfile.write(f'{len(data):x}\r\n'.encode() + data
+                                 + b'\r\n')
+                self.wfile.flush()
+
+        return Handler
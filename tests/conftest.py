@@ -0,0 +1,70 @@
+import pytest
+
+from ai_interviewer import (
+    main,
+    set_cassette,
+    set_hedger,
+    set_llm_backend,
+    set_llm_cache,
+    set_rate_limiter,
+    set_router,
+    set_stream_hub,
+)
+from ai_interviewer.metrics import set_metrics_recorder
+from benchmarks.openai_stub import OpenAIStub
+
+
+@pytest.fixture(autouse=True)
+def no_global_services():
+    """Every test starts and ends with the real backend and no cache,
+    cassette, limiter, hedger, router, metrics or stream hub"""
+    set_llm_backend(None)
+    yield
+    set_llm_cache(None)
+    set_cassette(None)
+    set_rate_limiter(None)
+    set_hedger(None)
+    set_router(None)
+    set_metrics_recorder(None)
+    set_stream_hub(None)
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    """Starts a local stand-in of the OpenAI API, with the given
+    `OpenAIStub` class and options, for the chat models created next"""
+    servers = []
+
+    def start(server_class=OpenAIStub, *args, **kwargs) -> OpenAIStub:
+        server = server_class(*args, **kwargs)
+        server.start()
+        servers.append(server)
+        monkeypatch.setenv('OPENAI_API_BASE', server.url)
+        monkeypatch.setenv('OPENAI_API_KEY', 'stub')
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def run_main():
+    """Runs `main` for one candidate, without streaming; keyword arguments
+    override its defaults"""
+    def run(data_dir, **kwargs):
+        main(**{
+            'company': 'Acme',
+            'job': 'software engineer',
+            'area': 'Machine Learning',
+            'years_of_experience_job': 5,
+            'candidate_name': 'Alan Bradley',
+            'years_of_experience_candidate': 7,
+            'work_experiences': 3,
+            'data_dir': data_dir,
+            'force_reload': False,
+            'streaming': False,
+            **kwargs
+        })
+
+    return run
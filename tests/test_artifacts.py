@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+from ai_interviewer import (
+    artifacts,
+    ArtifactStore,
+    FakeBackend,
+    set_llm_backend,
+)
+from ai_interviewer.fake_llm import JOB_DESCRIPTION_TEXT
+
+INPUTS = {'company': 'Acme', 'job': 'software engineer',
+          'years_of_experience': 5, 'area': 'Machine Learning'}
+
+
+def test_the_fake_backend_has_its_own_keys(tmp_path):
+    store = ArtifactStore(tmp_path)
+    real = store.key('job_description', INPUTS)
+    set_llm_backend(FakeBackend())
+
+    assert store.key('job_description', INPUTS) != real
+
+
+def test_a_fake_build_is_never_reused_by_a_real_run(tmp_path, stub_server,
+                                                    run_main):
+    set_llm_backend(FakeBackend())
+    run_main(tmp_path)
+    set_llm_backend(None)
+    server = stub_server(latency=0.0,
+                         text=JOB_DESCRIPTION_TEXT.replace('Acme', 'Initech'))
+
+    run_main(tmp_path)
+
+    assert server.requests > 0
+    job_description = json.loads((tmp_path/'job_description.json').read_text())
+    assert job_description['text'].endswith(
+        'Why Work at Initech:\nA friendly team, hard problems and a lot of '
+        'autonomy.'
+    )
+
+
+@pytest.fixture
+def built(monkeypatch) -> list[str]:
+    """The stages built, in order"""
+    stages = []
+    save = ArtifactStore.save
+
+    def record(self, key, stage, *args, **kwargs):
+        stages.append(stage)
+        save(self, key, stage, *args, **kwargs)
+
+    monkeypatch.setattr(ArtifactStore, 'save', record)
+    return stages
+
+
+def change_prompt(monkeypatch, name: str):
+    sources = artifacts.prompt_sources()
+    monkeypatch.setattr(artifacts, 'prompt_sources',
+                        lambda: {**sources, name: sources[name] + ' '})
+
+
+@pytest.mark.parametrize('change, rebuilt', [
+    ({}, []),
+    ({'years_of_experience_job': 8},
+     ['job_description', 'candidate', 'interview', 'summary']),
+    ({'work_experiences': 4}, ['candidate', 'interview', 'summary']),
+    ({'memory_token_budget': 500}, ['interview', 'summary']),
+    ({'summary_mode': 'map_reduce'}, ['summary']),
+])
+def test_only_the_changed_stage_and_those_after_it_are_built_again(
+        tmp_path, run_main, built, change, rebuilt):
+    set_llm_backend(FakeBackend())
+    run_main(tmp_path)
+    assert built == ['job_description', 'candidate', 'interview', 'summary']
+    built.clear()
+
+    run_main(tmp_path, **change)
+
+    assert built == rebuilt
+
+
+@pytest.mark.parametrize('prompt, rebuilt', [
+    ('RESUME_PROMPT', ['candidate', 'interview', 'summary']),
+    ('FOLLOW_UP_PROMPT', ['interview', 'summary']),
+    ('SUMMARY_PROMPT', ['summary']),
+])
+def test_a_changed_prompt_builds_its_stage_again(
+        tmp_path, monkeypatch, run_main, built, prompt, rebuilt):
+    set_llm_backend(FakeBackend())
+    run_main(tmp_path)
+    built.clear()
+    change_prompt(monkeypatch, prompt)
+
+    run_main(tmp_path)
+
+    assert built == rebuilt
@@ -0,0 +1,144 @@
+import time
+
+from langchain.schema import HumanMessage
+import pytest
+
+from ai_interviewer import (
+    Cassette,
+    CassetteMode,
+    FakeBackend,
+    LLMCache,
+    set_cassette,
+    set_llm_backend,
+    set_llm_cache,
+)
+from ai_interviewer.fake_llm import CassetteMiss
+from ai_interviewer.llm import create_chat_model
+from ai_interviewer.stages import Stage
+from benchmarks.openai_stub import TEXT
+
+MESSAGES = [HumanMessage(content='Write a job description.')]
+
+STAGE = Stage.CRITERION
+
+
+def call(stage: Stage = Stage.JOB_DESCRIPTION, messages=MESSAGES) -> str:
+    return create_chat_model(stage)(messages).content
+
+
+def update(cache: LLMCache, key: str, text: str, stage: Stage = STAGE):
+    cache.update(key, stage, [text])
+    # Distinct access times
+    time.sleep(0.002)
+
+
+class Responses:
+    """Responses of the fake backend, counted"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, prompt: str) -> str:
+        self.calls += 1
+        return f'Response {self.calls}'
+
+
+def test_responses_are_persisted(tmp_path):
+    cache = LLMCache(tmp_path/'cache.db')
+    update(cache, 'a', 'A')
+    cache.close()
+
+    assert LLMCache(tmp_path/'cache.db').lookup('a', STAGE) == ['A']
+
+
+def test_the_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = LLMCache(tmp_path/'cache.db', max_entries=2)
+    update(cache, 'a', 'A')
+    update(cache, 'b', 'B')
+    cache.lookup('a', STAGE)
+    time.sleep(0.002)
+    update(cache, 'c', 'C')
+
+    assert cache.lookup('b', STAGE) is None
+    assert cache.lookup('a', STAGE) == ['A']
+    assert cache.lookup('c', STAGE) == ['C']
+
+
+def test_entries_are_evicted_over_max_bytes(tmp_path):
+    size = len('["AAAA"]')
+    cache = LLMCache(tmp_path/'cache.db', max_bytes=2 * size)
+    for key in ('a', 'b', 'c'):
+        update(cache, key, key.upper() * 4)
+
+    assert [cache.lookup(key, STAGE) for key in ('a', 'b', 'c')] == [
+        None, ['BBBB'], ['CCCC']
+    ]
+
+
+def test_entries_expire_after_their_stage_ttl(tmp_path):
+    cache = LLMCache(tmp_path/'cache.db', ttl=0.05,
+                     stage_ttls={Stage.JOB_DESCRIPTION: None})
+    update(cache, 'a', 'A')
+    update(cache, 'b', 'B', Stage.JOB_DESCRIPTION)
+    time.sleep(0.1)
+
+    assert cache.lookup('a', STAGE) is None
+    assert cache.lookup('b', Stage.JOB_DESCRIPTION) == ['B']
+
+
+def test_candidate_replies_are_only_cached_when_listed(tmp_path):
+    responses = Responses()
+    set_llm_backend(FakeBackend(responses={
+        Stage.JOB_DESCRIPTION: responses,
+        Stage.CANDIDATE_REPLY: responses
+    }))
+    set_llm_cache(LLMCache(tmp_path/'default.db'))
+
+    assert call() == call() == 'Response 1'
+    assert call(Stage.CANDIDATE_REPLY) != call(Stage.CANDIDATE_REPLY)
+
+    set_llm_cache(LLMCache(tmp_path/'replies.db',
+                           stages=[Stage.CANDIDATE_REPLY]))
+    assert call(Stage.CANDIDATE_REPLY) == call(Stage.CANDIDATE_REPLY)
+    assert call() != call()
+
+
+def test_hits_and_misses_are_counted_per_stage(tmp_path):
+    cache = LLMCache(tmp_path/'cache.db')
+    set_llm_cache(cache)
+    set_llm_backend(FakeBackend())
+    for _ in range(3):
+        call()
+    call(Stage.RECOMMENDATION,
+         [HumanMessage(content='Should we hire the candidate?')])
+
+    assert cache.stats() == {
+        'job_description': {'hits': 2, 'misses': 1},
+        'recommendation': {'hits': 0, 'misses': 1}
+    }
+
+
+def test_fake_responses_are_not_replayed_by_a_real_run(tmp_path,
+                                                       stub_server):
+    set_llm_cache(LLMCache(tmp_path/'cache.db'))
+    set_llm_backend(FakeBackend())
+    fake = call()
+    set_llm_backend(None)
+    server = stub_server(latency=0.0)
+
+    assert call() == TEXT != fake
+    assert server.requests == 1
+
+
+def test_fake_responses_are_not_replayed_from_a_cassette(tmp_path):
+    path = tmp_path/'cassette.jsonl'
+    set_cassette(Cassette(path, CassetteMode.RECORD))
+    set_llm_backend(FakeBackend())
+    fake = call()
+    set_cassette(Cassette(path, CassetteMode.REPLAY))
+
+    # Still replayed offline
+    assert call() == fake
+    set_llm_backend(None)
+    with pytest.raises(CassetteMiss):
+        call()
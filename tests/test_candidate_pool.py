@@ -0,0 +1,76 @@
+import re
+
+from ai_interviewer import create_candidate_pool, FakeBackend, set_llm_backend
+from ai_interviewer.candidate_pool import parse_resumes
+from ai_interviewer.fake_llm import fake_resumes
+from ai_interviewer.minhash import MinHashIndex
+from ai_interviewer.stages import Stage
+
+NAMES = ('Alan Bradley', 'Grace Hopper', 'Edsger Dijkstra')
+
+
+def resume(name: str) -> str:
+    return parse_resumes(fake_resumes(
+        f'- {name}, 7 years of experience, 3 work experiences'
+    ))[name]
+
+
+class Resumes:
+    """Resumes of the fake backend. In the first response, every resume but
+    the first is a copy of it under another name."""
+
+    def __init__(self):
+        self.calls = 0
+        self.clones = []
+
+    def __call__(self, prompt: str) -> str:
+        self.calls += 1
+        text = fake_resumes(prompt)
+        if self.calls > 1:
+            return text
+        first, *others = re.findall(r'^### (.+)$', text, flags=re.MULTILINE)
+        self.clones = others
+        original = parse_resumes(text)[first].split('\n', 1)[1]
+        return '\n'.join(f'### {name}\n{original}'
+                         for name in [first, *others])
+
+
+def test_a_near_duplicate_is_rejected():
+    index = MinHashIndex()
+    for name in NAMES:
+        assert index.add(name, resume(name)) is None
+
+    # Another name, and a few words changed
+    text = resume('Grace Hopper').replace('Grace Hopper', 'Ada Lovelace')
+    text = text.replace('BSc in Computer Science', 'MSc in Mathematics')
+
+    assert index.find(text) == 'Grace Hopper'
+    assert index.add('Ada Lovelace', text) == 'Grace Hopper'
+    assert list(index.signatures) == list(NAMES)
+
+
+def test_distinct_resumes_are_kept():
+    index = MinHashIndex()
+
+    assert [index.add(name, resume(name)) for name in NAMES] == [None] * 3
+    assert index.find(resume('Ada Lovelace')) is None
+
+
+def test_the_pool_replaces_near_duplicates(capsys):
+    resumes = Resumes()
+    set_llm_backend(FakeBackend(responses={Stage.RESUMES: resumes}))
+
+    pool = create_candidate_pool(4, 'software engineer', 'Machine Learning',
+                                 'Acme', 'Python', resumes_per_request=4,
+                                 seed=0)
+
+    assert len(pool) == 4
+    assert len(resumes.clones) == 3
+    # The clones are left out and replaced by new candidates
+    names = [candidate.name for candidate in pool]
+    assert not set(resumes.clones) & set(names)
+    assert resumes.calls == 2
+    assert '3 near-duplicate(s) rejected' in capsys.readouterr().out
+    index = MinHashIndex()
+    assert all(index.add(candidate.name, candidate.resume) is None
+               for candidate in pool)
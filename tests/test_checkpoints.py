@@ -0,0 +1,69 @@
+import hashlib
+import json
+import random
+
+import pytest
+
+from ai_interviewer import FakeBackend, set_llm_backend
+from ai_interviewer.stages import Stage
+
+
+class Crash(Exception):
+    pass
+
+
+class Replies:
+    """Candidate replies of the fake backend, which crash the interview
+    instead of giving reply number `crash_at`"""
+
+    def __init__(self, crash_at: int | None = None):
+        self.crash_at = crash_at
+        self.calls = 0
+
+    def __call__(self, prompt: str) -> str:
+        if self.calls == self.crash_at:
+            raise Crash()
+        self.calls += 1
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        return f'At Initech I led the billing migration. ({digest})'
+
+
+def use_replies(replies: Replies) -> Replies:
+    set_llm_backend(FakeBackend(
+        responses={Stage.CANDIDATE_REPLY: replies}
+    ))
+    return replies
+
+
+def turns(data_dir) -> list[tuple[str, str]]:
+    with (data_dir/'transcript.jsonl').open('r') as file:
+        return [(turn['speaker'], turn['text'])
+                for turn in map(json.loads, file)]
+
+
+def test_a_crashed_interview_resumes_where_it_stopped(tmp_path, run_main):
+    reference, data_dir = tmp_path/'reference', tmp_path/'data'
+    reference.mkdir()
+    data_dir.mkdir()
+    # The questions of the plan are drawn at random
+    random.seed(0)
+    replies = use_replies(Replies())
+    run_main(reference)
+    total = replies.calls
+
+    random.seed(0)
+    use_replies(Replies(crash_at=3))
+    with pytest.raises(Crash):
+        run_main(data_dir)
+    # Another candidate runs in the same directory in the meantime
+    use_replies(Replies())
+    run_main(data_dir, candidate_name='Grace Hopper')
+    replies = use_replies(Replies())
+    run_main(data_dir)
+
+    # Only the replies after the crash were asked for
+    assert replies.calls == total - 3
+    assert ((data_dir/'full_transcript.txt').read_text()
+            == (reference/'full_transcript.txt').read_text())
+    assert turns(data_dir) == turns(reference)
+    assert list((data_dir/'artifacts'/'checkpoints').iterdir()) == []
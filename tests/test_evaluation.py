@@ -0,0 +1,106 @@
+import json
+
+from ai_interviewer import (
+    FakeBackend,
+    Interviewer,
+    set_llm_backend,
+    SummaryMode,
+)
+from ai_interviewer.evaluation import (
+    evaluation_fields,
+    parse_evaluation,
+    RECOMMENDATION,
+)
+from ai_interviewer.fake_llm import fake_evaluation
+from ai_interviewer.stages import Stage
+
+TRANSCRIPT = ''.join(
+    f'\n\nInterviewer:\nQuestion {i}?\n\nAlan Bradley:\nAnswer {i}.'
+    for i in range(3)
+)
+
+
+class Evaluation:
+    """Evaluations of the fake backend. The first `bad_answers` leave out
+    `dropped` fields and give an empty `q2`."""
+
+    def __init__(self, bad_answers: int = 1,
+                 dropped: tuple[str, ...] = ('q1', RECOMMENDATION)):
+        self.bad_answers = bad_answers
+        self.dropped = dropped
+        self.asked = []
+
+    def __call__(self, prompt: str) -> str:
+        schema = json.loads(prompt[prompt.rindex('\n{') + 1:])
+        self.asked.append(set(schema['properties']))
+        answers = json.loads(fake_evaluation(prompt))
+        if len(self.asked) <= self.bad_answers:
+            for field in self.dropped:
+                answers.pop(field, None)
+            if 'q2' in answers:
+                answers['q2'] = ' '
+        return f'Here is the evaluation:\n```json\n{json.dumps(answers)}\n```'
+
+
+class Responses:
+    """Responses of the fake backend, counted"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, prompt: str) -> str:
+        self.calls += 1
+        return f'Response {self.calls}'
+
+
+def summarize(max_reasks: int = 2) -> str:
+    interviewer = Interviewer(candidate_name='Alan Bradley',
+                              job='software engineer',
+                              area='Machine Learning', company='Acme',
+                              streaming=False)
+    return interviewer.summarize_interview(TRANSCRIPT, verbose=False,
+                                           mode=SummaryMode.STRUCTURED,
+                                           max_reasks=max_reasks)
+
+
+def test_only_valid_fields_are_parsed():
+    text = ('Sure!\n```json\n{"q1": " Led the migration. ", "q2": "", '
+            '"q3": 3, "other": "Unasked"}\n```')
+
+    assert parse_evaluation(text, ['q1', 'q2', 'q3', 'q4']) == {
+        'q1': 'Led the migration.'
+    }
+    assert parse_evaluation('{"q1": "Cut off', ['q1']) == {}
+    assert parse_evaluation('["q1"]', ['q1']) == {}
+
+
+def test_missing_fields_are_asked_again():
+    evaluation = Evaluation()
+    set_llm_backend(FakeBackend(responses={Stage.EVALUATION: evaluation}))
+
+    summary = summarize()
+
+    assert evaluation.asked == [set(evaluation_fields()),
+                                {'q1', 'q2', RECOMMENDATION}]
+    assert summary.startswith('Recommendation:\n\nThe candidate gave')
+    assert summary.count('Initech') == len(evaluation_fields())
+
+
+def test_fields_still_missing_are_asked_one_by_one():
+    evaluation = Evaluation(bad_answers=3)
+    criterion = Responses()
+    recommendation = Responses()
+    set_llm_backend(FakeBackend(responses={
+        Stage.EVALUATION: evaluation,
+        Stage.CRITERION: criterion,
+        Stage.RECOMMENDATION: recommendation
+    }))
+
+    summary = summarize(max_reasks=2)
+
+    assert len(evaluation.asked) == 3
+    assert evaluation.asked[1:] == [{'q1', 'q2', RECOMMENDATION}] * 2
+    assert criterion.calls == 2
+    assert recommendation.calls == 1
+    assert summary.startswith('Recommendation:\n\nResponse 1')
+    assert 'Response 2' in summary
@@ -0,0 +1,217 @@
+import asyncio
+from collections import deque
+import threading
+import time
+
+from langchain.schema import HumanMessage
+
+from ai_interviewer import Hedger, set_hedger
+from ai_interviewer.hedging import HedgeCancelled
+from ai_interviewer.llm import create_chat_model
+from ai_interviewer.metrics import MetricsRecorder, set_metrics_recorder
+from ai_interviewer.stages import Stage
+from benchmarks.openai_stub import OpenAIStub, TEXT
+
+STAGE = Stage.CANDIDATE_REPLY.value
+
+
+class Tokens:
+    """Run manager of the caller, which gets the winner's tokens"""
+
+    def __init__(self):
+        self.tokens = []
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        self.tokens.append(token)
+
+
+class AsyncTokens(Tokens):
+    async def on_llm_new_token(self, token: str, **kwargs):
+        self.tokens.append(token)
+
+
+def hedger_with_deadline(deadline: float, **kwargs) -> Hedger:
+    hedger = Hedger(min_calls=1, **kwargs)
+    hedger.observe(STAGE, deadline)
+    return hedger
+
+
+def streamed(primary_latency: float, hedge_latency: float = 0.0):
+    """A request streaming 'a b' after its latency, and the starts and
+    cancellations of its attempts"""
+    starts = {}
+    cancelled = {}
+
+    def request(attempt) -> str:
+        name = 'hedge' if attempt.hedge else 'primary'
+        starts[name] = time.perf_counter()
+        cancelled[name] = threading.Event()
+        time.sleep(hedge_latency if attempt.hedge else primary_latency)
+        try:
+            for token in ('a', ' b'):
+                attempt.on_llm_new_token(token)
+        except HedgeCancelled:
+            cancelled[name].set()
+            raise
+        return name
+
+    return request, starts, cancelled
+
+
+def test_a_slow_call_is_hedged_after_the_deadline():
+    hedger = hedger_with_deadline(0.1, max_rate=1.0)
+    request, starts, cancelled = streamed(primary_latency=0.5)
+    tokens = Tokens()
+
+    start = time.perf_counter()
+    result, hedged = hedger.run(STAGE, request, tokens)
+    elapsed = time.perf_counter() - start
+
+    assert (result, hedged) == ('hedge', True)
+    assert starts['hedge'] - starts['primary'] >= 0.1
+    assert elapsed < 0.4
+    # Only the winner's tokens reach the caller
+    assert tokens.tokens == ['a', ' b']
+    # The loser stops at its first token
+    assert cancelled['primary'].wait(timeout=1.0)
+    assert not cancelled['hedge'].is_set()
+    assert hedger.stats()[STAGE]['hedge_wins'] == 1
+
+
+def test_a_call_with_its_first_token_in_time_is_not_hedged():
+    hedger = hedger_with_deadline(0.2, max_rate=1.0)
+    request, starts, _ = streamed(primary_latency=0.01)
+
+    assert hedger.run(STAGE, request, Tokens()) == ('primary', False)
+    assert list(starts) == ['primary']
+
+
+def test_no_hedge_before_min_calls():
+    hedger = Hedger(min_calls=3, max_rate=1.0)
+    for _ in range(2):
+        hedger.observe(STAGE, 0.001)
+    request, starts, _ = streamed(primary_latency=0.1)
+
+    assert hedger.run(STAGE, request, Tokens()) == ('primary', False)
+    assert list(starts) == ['primary']
+    # It was timed, for the next calls
+    assert hedger.deadline(STAGE) is not None
+
+
+def test_a_non_streamed_sync_loser_runs_to_completion():
+    hedger = hedger_with_deadline(0.05, max_rate=1.0)
+    finished = threading.Event()
+
+    def request(attempt) -> str:
+        if attempt.hedge:
+            return 'hedge'
+        time.sleep(0.3)
+        finished.set()
+        return 'primary'
+
+    start = time.perf_counter()
+    assert hedger.run(STAGE, request) == ('hedge', True)
+    assert time.perf_counter() - start < 0.2
+    # Nothing stops it: its response is dropped when it comes
+    assert not finished.is_set()
+    assert finished.wait(timeout=1.0)
+
+
+def test_an_async_loser_is_cancelled_right_away():
+    hedger = hedger_with_deadline(0.05, max_rate=1.0)
+    cancelled = asyncio.Event()
+    tokens = AsyncTokens()
+
+    async def request(attempt) -> str:
+        if attempt.hedge:
+            for token in ('a', ' b'):
+                await attempt.on_llm_new_token(token)
+            return 'hedge'
+        try:
+            # Not streamed: there is no token to stop at
+            await asyncio.sleep(1.0)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return 'primary'
+
+    async def main():
+        result = await hedger.arun(STAGE, request, tokens)
+        await asyncio.wait_for(cancelled.wait(), timeout=0.1)
+        return result
+
+    assert asyncio.run(main()) == ('hedge', True)
+    assert tokens.tokens == ['a', ' b']
+
+
+def test_hedges_are_capped_by_max_rate():
+    hedger = Hedger(min_calls=1, quantile=0.5, max_rate=0.25, burst=1.0,
+                    window=1000)
+    for _ in range(100):
+        hedger.observe(STAGE, 0.001)
+
+    results = [hedger.run(STAGE, streamed(primary_latency=0.05)[0])[1]
+               for _ in range(20)]
+
+    # One hedge per four calls
+    assert results == [False, False, False, True] * 5
+    stats = hedger.stats()[STAGE]
+    assert (stats['calls'], stats['hedged'], stats['denied']) == (20, 5, 15)
+
+
+def test_unused_hedges_are_capped_by_burst():
+    hedger = Hedger(min_calls=1, quantile=0.5, max_rate=0.5, burst=2.0,
+                    window=1000)
+    for _ in range(100):
+        hedger.observe(STAGE, 0.02)
+    # Fast calls add to the budget without using it, up to `burst`
+    for _ in range(10):
+        hedger.run(STAGE, streamed(primary_latency=0.0)[0])
+
+    results = [hedger.run(STAGE, streamed(primary_latency=0.1)[0])[1]
+               for _ in range(4)]
+
+    # 2 saved, then 0.5 per call
+    assert results == [True, True, True, False]
+    assert hedger.stats()[STAGE]['denied'] == 1
+
+
+class SpikeStub(OpenAIStub):
+    """`OpenAIStub` whose first responses have the given latencies"""
+
+    def __init__(self, latencies: list[float], **kwargs):
+        super().__init__(**kwargs)
+        self.latencies = deque(latencies)
+
+    def _latency(self) -> float:
+        with self._lock:
+            if self.latencies:
+                return self.latencies.popleft()
+        return self.latency
+
+
+def test_a_latency_spike_is_hedged_against_the_api(stub_server, capsys):
+    server = stub_server(SpikeStub, [0.01] * 5 + [1.0], latency=0.01,
+                         token_latency=0.001)
+    hedger = Hedger(min_calls=5, max_rate=0.2)
+    set_hedger(hedger)
+    recorder = MetricsRecorder()
+    set_metrics_recorder(recorder)
+    messages = [HumanMessage(content='Tell me about yourself.')]
+
+    for _ in range(5):
+        create_chat_model(Stage.CANDIDATE_REPLY, streaming=True)(messages)
+    capsys.readouterr()
+    start = time.perf_counter()
+    reply = create_chat_model(Stage.CANDIDATE_REPLY, streaming=True)(messages)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.5
+    assert reply.content == TEXT
+    # The reply was streamed once, by the hedge
+    assert ' '.join(capsys.readouterr().out.split()) == TEXT
+    assert server.requests == 7
+    stats = hedger.stats()[STAGE]
+    assert (stats['hedged'], stats['hedge_wins']) == (1, 1)
+    assert recorder.calls[-1].hedged
+    assert not any(call.hedged for call in recorder.calls[:-1])
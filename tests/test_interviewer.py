@@ -0,0 +1,57 @@
+import threading
+import time
+
+import pytest
+
+from ai_interviewer import FakeBackend, Interviewer, set_llm_backend
+from ai_interviewer.interviewer import CRITERIA_AND_QUESTIONS
+from ai_interviewer.stages import Stage
+
+TRANSCRIPT = ''.join(
+    f'\n\nInterviewer:\nQuestion {i}?\n\nAlan Bradley:\nAnswer {i}.'
+    for i in range(6)
+)
+
+
+def test_the_questions_of_every_criterion_are_a_tuple_of_str():
+    # Without its trailing comma, a one-question tuple is a str, and each of
+    # its characters would be asked as a question
+    for questions in CRITERIA_AND_QUESTIONS.values():
+        assert isinstance(questions, tuple)
+        assert all(isinstance(question, str) for question in questions)
+
+
+def create_interviewer() -> Interviewer:
+    return Interviewer(candidate_name='Alan Bradley', job='software engineer',
+                       area='Machine Learning', company='Acme',
+                       streaming=False)
+
+
+class Evidence:
+    """Evidence of the fake backend, which counts the requests in flight"""
+
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt: str) -> str:
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.02)
+        with self._lock:
+            self.running -= 1
+        return '- Leadership: led the migration.'
+
+
+@pytest.mark.parametrize('max_workers', [1, 3])
+def test_evidence_is_extracted_max_workers_at_a_time(max_workers):
+    evidence = Evidence()
+    set_llm_backend(FakeBackend(responses={Stage.EVIDENCE: evidence}))
+
+    text = create_interviewer().extract_evidence(TRANSCRIPT,
+                                                 max_workers=max_workers)
+
+    assert text.count('Part ') == 6
+    assert evidence.max_running == max_workers
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from ai_interviewer.pipeline import run_steps, Step
+
+
+class Log:
+    """Steps that log when they start and end"""
+
+    def __init__(self):
+        self.events = []
+        self.running = 0
+        self.max_running = 0
+
+    def step(self, name: str, *deps: str, delay: float = 0.01,
+             background: bool = False, error: Exception | None = None):
+        async def run():
+            self.events.append(f'start {name}')
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            try:
+                await asyncio.sleep(delay)
+                if error is not None:
+                    raise error
+            except asyncio.CancelledError:
+                self.events.append(f'cancel {name}')
+                raise
+            finally:
+                self.running -= 1
+            self.events.append(f'end {name}')
+            return name.upper()
+
+        return Step(name, run, deps, background)
+
+
+def test_steps_start_once_their_dependencies_are_done():
+    log = Log()
+
+    results = asyncio.run(run_steps([
+        log.step('reply', 'ask'),
+        log.step('ask', 'personalize', 'greet'),
+        log.step('greet', delay=0.03),
+        log.step('personalize', background=True),
+    ]))
+
+    assert results == {'reply': 'REPLY', 'ask': 'ASK', 'greet': 'GREET',
+                       'personalize': 'PERSONALIZE'}
+    events = log.events
+    # Independent steps run at once
+    assert events.index('start personalize') < events.index('end greet')
+    assert events.index('end greet') < events.index('start ask')
+    assert events.index('end personalize') < events.index('start ask')
+    assert events.index('end ask') < events.index('start reply')
+
+
+def test_unknown_dependencies_are_rejected():
+    with pytest.raises(ValueError, match='unknown'):
+        asyncio.run(run_steps([Log().step('ask', 'personalize')]))
+
+
+def test_background_steps_run_max_background_at_a_time():
+    background = Log()
+    foreground = Log()
+
+    asyncio.run(run_steps(
+        [background.step(f'b{i}', background=True) for i in range(5)]
+        + [foreground.step(f'f{i}') for i in range(3)],
+        max_background=2
+    ))
+
+    assert background.max_running == 2
+    # The other steps are not held back by them
+    assert foreground.max_running == 3
+
+
+def test_a_failure_cancels_the_other_steps():
+    log = Log()
+
+    with pytest.raises(RuntimeError, match='No reply'):
+        asyncio.run(run_steps([
+            log.step('ask', error=RuntimeError('No reply')),
+            log.step('personalize', delay=1.0, background=True),
+            log.step('reply', 'ask'),
+        ]))
+
+    assert 'cancel personalize' in log.events
+    assert 'end personalize' not in log.events
+    assert 'start reply' not in log.events
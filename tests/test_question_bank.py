@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from ai_interviewer.question_bank import QuestionBank, QuestionType
+
+HEADER = 'Level,Type,Question,Follow-ups\n'
+
+
+def write_questions(path, *questions: str):
+    path.write_text(HEADER + ''.join(
+        f'I,Creative Thinking,{question},What happened?  What did you '
+        f'learn?\n'
+        for question in questions
+    ))
+
+
+def sample(bank: QuestionBank) -> list[str]:
+    questions = bank.sample(QuestionType.CREATIVE_THINKING,
+                            len(bank.index[QuestionType.CREATIVE_THINKING]))
+    return sorted(question.text for question in questions)
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path/'questions.csv'
+    write_questions(path, 'What projects have you started on your own?')
+    return path
+
+
+def no_parse(monkeypatch):
+    def parse(text):
+        raise AssertionError('The CSV was parsed again')
+
+    monkeypatch.setattr(QuestionBank, '_parse', staticmethod(parse))
+
+
+def test_questions_are_indexed_by_type(csv_file, tmp_path):
+    bank = QuestionBank(csv_file, cache_dir=tmp_path/'cache')
+
+    question, = bank.sample(QuestionType.CREATIVE_THINKING)
+
+    assert question.text == 'What projects have you started on your own?'
+    assert question.follow_ups == ['What happened?', 'What did you learn?']
+    assert list(bank.index) == [QuestionType.CREATIVE_THINKING]
+    # The simulator edits the questions it asks, not the bank's
+    question.follow_ups.clear()
+    assert bank.sample(QuestionType.CREATIVE_THINKING)[0].follow_ups != []
+
+
+def test_the_parsed_questions_are_reused(csv_file, tmp_path, monkeypatch):
+    sample(QuestionBank(csv_file, cache_dir=tmp_path/'cache'))
+    no_parse(monkeypatch)
+
+    assert sample(QuestionBank(csv_file, cache_dir=tmp_path/'cache')) == [
+        'What projects have you started on your own?'
+    ]
+    # Touched but with the same content
+    os.utime(csv_file, ns=(0, csv_file.stat().st_mtime_ns + 10**9))
+    assert len(sample(QuestionBank(csv_file,
+                                   cache_dir=tmp_path/'cache'))) == 1
+
+
+def test_an_edited_csv_is_parsed_again(csv_file, tmp_path):
+    sample(QuestionBank(csv_file, cache_dir=tmp_path/'cache'))
+    mtime_ns = csv_file.stat().st_mtime_ns
+
+    write_questions(csv_file, 'What projects have you started on your own?',
+                    'Tell me about an idea nobody listened to.')
+    os.utime(csv_file, ns=(mtime_ns, mtime_ns + 10**9))
+
+    assert sample(QuestionBank(csv_file, cache_dir=tmp_path/'cache')) == [
+        'Tell me about an idea nobody listened to.',
+        'What projects have you started on your own?'
+    ]
@@ -0,0 +1,186 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import fcntl
+import random
+import statistics
+import threading
+import time
+
+from langchain.schema import HumanMessage
+import pytest
+
+from ai_interviewer import (
+    Priority,
+    priority_context,
+    RateLimiter,
+    set_rate_limiter,
+)
+from ai_interviewer.llm import create_chat_model
+from ai_interviewer.stages import Stage
+
+
+def call() -> str:
+    model = create_chat_model(Stage.CANDIDATE_REPLY)
+    return model([HumanMessage(content='Tell me about yourself.')]).content
+
+
+def test_admitted_requests_stay_under_the_server_limit(stub_server):
+    # 20 requests in any second; the limiter admits 18 per second
+    server = stub_server(requests_per_minute=1200, window=1.0, latency=0.01)
+    set_rate_limiter(RateLimiter(requests_per_minute=1080,
+                                 burst_seconds=0.1))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: call(), range(30)))
+    elapsed = time.perf_counter() - start
+
+    assert all(result != '' for result in results)
+    assert server.rate_limited == 0
+    assert server.requests == 30
+    # The first request uses the burst, the others come at the refill rate
+    assert elapsed >= 0.9 * 29 / 18
+
+
+def test_a_429_is_retried_after_its_retry_after(stub_server):
+    # One request per second
+    server = stub_server(requests_per_minute=60, window=1.0, latency=0.0)
+    limiter = RateLimiter(base_delay=0.01, max_retries=3)
+    set_rate_limiter(limiter)
+
+    call()
+    start = time.perf_counter()
+    assert call() != ''
+    elapsed = time.perf_counter() - start
+
+    assert server.rate_limited == 1
+    assert limiter.stats()['rate_limited'] == 1
+    assert limiter.stats()['retries'] == 1
+    # Much later than the backoff of 0.01 s alone
+    assert elapsed >= 0.8
+
+
+def test_backoff_is_jittered_capped_and_honours_retry_after():
+    limiter = RateLimiter(base_delay=0.5, max_delay=4.0)
+    random.seed(0)
+    for attempt in range(8):
+        cap = min(4.0, 0.5 * 2 ** attempt)
+        delays = [limiter.backoff(attempt, Exception()) for _ in range(200)]
+        assert all(0 <= delay <= cap for delay in delays)
+        assert max(delays) > cap / 2
+
+    error = Exception()
+    error.headers = {'retry-after': '7'}
+    assert limiter.backoff(0, error) == 7.0
+
+
+def test_gives_up_after_max_retries():
+    class RateLimited(Exception):
+        http_status = 429
+
+    limiter = RateLimiter(max_retries=2, base_delay=0.001)
+    attempts = []
+
+    def send():
+        attempts.append(time.perf_counter())
+        raise RateLimited()
+
+    with pytest.raises(RateLimited):
+        limiter.call(send, retry_on=(RateLimited,))
+    assert len(attempts) == 3
+    assert limiter.stats()['retries'] == 2
+    assert limiter.stats()['rate_limited'] == 2
+
+
+def test_a_waiting_interactive_request_goes_before_batch_ones():
+    # One request every 0.1 s, and a bucket of one
+    limiter = RateLimiter(requests_per_minute=600, burst_seconds=0.1)
+    limiter.acquire()
+    order = []
+
+    def batch():
+        limiter.acquire(priority=Priority.BATCH)
+        order.append(Priority.BATCH)
+
+    thread = threading.Thread(target=batch)
+    thread.start()
+    # The batch request waits for the refill first
+    time.sleep(0.02)
+    limiter.acquire(priority=Priority.INTERACTIVE)
+    order.append(Priority.INTERACTIVE)
+    thread.join()
+
+    assert order == [Priority.INTERACTIVE, Priority.BATCH]
+
+
+def test_interactive_calls_are_not_slowed_down_by_a_batch(stub_server):
+    stub_server(latency=0.01)
+    set_rate_limiter(RateLimiter(requests_per_minute=600,
+                                 burst_seconds=0.1))
+    done = threading.Event()
+    batch_latencies = []
+
+    def batch():
+        with priority_context(Priority.BATCH):
+            while not done.is_set():
+                start = time.perf_counter()
+                call()
+                batch_latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=batch) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.3)
+    interactive_latencies = []
+    for _ in range(5):
+        start = time.perf_counter()
+        call()
+        interactive_latencies.append(time.perf_counter() - start)
+    done.set()
+    for thread in threads:
+        thread.join()
+
+    # At most one refill of the bucket, while six batch callers share it
+    assert max(interactive_latencies) < 0.3
+    assert (statistics.mean(batch_latencies)
+            > 2 * statistics.mean(interactive_latencies))
+
+
+@pytest.mark.parametrize('shared', [False, True])
+def test_async_acquire_does_not_block_the_event_loop(tmp_path, shared):
+    limiter = RateLimiter(
+        requests_per_minute=600,
+        path=tmp_path/'limits.json' if shared else None
+    )
+    if shared:
+        # Another process holding the file lock
+        file = (tmp_path/'limits.json').open('a+')
+        hold = lambda: fcntl.flock(file, fcntl.LOCK_EX)
+        release = lambda: fcntl.flock(file, fcntl.LOCK_UN)
+    else:
+        # Another thread holding the lock
+        hold = limiter._lock.acquire
+        release = limiter._lock.release
+
+    async def main() -> tuple[float, int]:
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        hold()
+        asyncio.get_running_loop().call_later(0.2, release)
+        start = time.perf_counter()
+        await limiter.aacquire()
+        elapsed = time.perf_counter() - start
+        ticker.cancel()
+        return elapsed, ticks
+
+    elapsed, ticks = asyncio.run(main())
+    assert elapsed >= 0.2
+    # The loop kept running while the lock was held
+    assert ticks >= 10
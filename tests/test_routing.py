@@ -0,0 +1,90 @@
+import time
+
+from langchain.schema import HumanMessage
+
+from ai_interviewer import (
+    FakeBackend,
+    Route,
+    Router,
+    set_llm_backend,
+    set_router,
+)
+from ai_interviewer.llm import create_chat_model
+from ai_interviewer.stages import Stage
+
+STAGE = Stage.RECOMMENDATION.value
+
+MESSAGES = [HumanMessage(content='Should we hire the candidate?')]
+
+
+def create_router(**kwargs) -> Router:
+    router = Router({Stage.RECOMMENDATION: Route(
+        model='gpt-4',
+        latency_slo=0.03,
+        fallbacks=('gpt-3.5-turbo',)
+    )}, min_calls=2, **kwargs)
+    set_router(router)
+    return router
+
+
+def call(count: int = 1):
+    for _ in range(count):
+        create_chat_model(Stage.RECOMMENDATION)(MESSAGES)
+
+
+def test_a_model_over_its_slo_falls_back():
+    set_llm_backend(FakeBackend(model_latencies={
+        'gpt-4': (0.06, 0.0),
+        'gpt-3.5-turbo': (0.0, 0.0)
+    }))
+    router = create_router()
+
+    call(5)
+
+    # Judged over `min_calls` calls, then left for the fallback
+    assert router.calls == {(STAGE, 'gpt-4'): 2,
+                            (STAGE, 'gpt-3.5-turbo'): 3}
+    assert router.stats()[STAGE]['fallbacks'] == 3
+
+
+def test_a_model_within_its_slo_is_kept():
+    set_llm_backend(FakeBackend(model_latencies={'gpt-4': (0.0, 0.0)}))
+    router = create_router()
+
+    call(5)
+
+    assert router.calls == {(STAGE, 'gpt-4'): 5}
+    assert router.fallbacks[STAGE] == 0
+
+
+def test_the_model_is_tried_again_after_retry_after():
+    backend = FakeBackend(model_latencies={
+        'gpt-4': (0.06, 0.0),
+        'gpt-3.5-turbo': (0.0, 0.0)
+    })
+    set_llm_backend(backend)
+    router = create_router(retry_after=0.1)
+    call(3)
+    assert router.select(STAGE) == 'gpt-3.5-turbo'
+
+    time.sleep(0.1)
+    # Fast again, so it is kept
+    backend.model_latencies['gpt-4'] = (0.0, 0.0)
+    call(3)
+
+    assert router.calls == {(STAGE, 'gpt-4'): 5,
+                            (STAGE, 'gpt-3.5-turbo'): 1}
+
+
+def test_the_fastest_model_is_used_when_all_are_over_the_slo():
+    set_llm_backend(FakeBackend(model_latencies={
+        'gpt-4': (0.08, 0.0),
+        'gpt-3.5-turbo': (0.04, 0.0)
+    }))
+    router = create_router()
+
+    call(6)
+
+    assert router.calls == {(STAGE, 'gpt-4'): 2,
+                            (STAGE, 'gpt-3.5-turbo'): 4}
+    assert router.select(STAGE) == 'gpt-3.5-turbo'
@@ -0,0 +1,107 @@
+from collections import Counter
+import json
+import os
+import re
+
+from ai_interviewer import FakeBackend, main_shards, set_llm_backend
+from ai_interviewer.fake_llm import RESUME_TEXT
+from ai_interviewer.stages import Stage
+
+DEFAULTS = {
+    'company': 'Acme',
+    'job': 'software engineer',
+    'area': 'Machine Learning',
+    'years_of_experience_job': 5,
+    'candidate_name': 'Alan Bradley',
+    'years_of_experience_candidate': 7,
+    'work_experiences': 3
+}
+
+NAMES = ('Ada Lovelace', 'Alan Turing', 'Grace Hopper', 'Edsger Dijkstra',
+         'Barbara Liskov', 'Donald Knuth')
+
+
+class Resumes:
+    """Resumes of the fake backend, each logged to a file shared by the
+    workers. The worker asked for the resume of `crash_name` dies the first
+    time."""
+
+    def __init__(self, tmp_path, crash_name: str | None = None):
+        self.log = tmp_path/'resumes.log'
+        self.crashed = tmp_path/'crashed'
+        self.crash_name = crash_name
+
+    def __call__(self, prompt: str) -> str:
+        name = re.search(r'resume for (.+?), a talented', prompt).group(1)
+        with self.log.open('a') as file:
+            file.write(name + '\n')
+        if name == self.crash_name and not self.crashed.exists():
+            self.crashed.touch()
+            os._exit(1)
+        return RESUME_TEXT
+
+    def calls(self) -> Counter:
+        return Counter(self.log.read_text().splitlines())
+
+
+def run(tmp_path, resumes: Resumes) -> dict:
+    candidates_file = tmp_path/'candidates.jsonl'
+    candidates_file.write_text(''.join(
+        json.dumps({'candidate_name': name}) + '\n' for name in NAMES
+    ))
+    set_llm_backend(FakeBackend(responses={Stage.RESUME: resumes}))
+    return main_shards(candidates_file, tmp_path/'data', processes=2,
+                       shard_size=2, max_workers=2, **DEFAULTS)
+
+
+def attempts(tmp_path) -> dict[int, int]:
+    markers = sorted((tmp_path/'data'/'shards').glob('shard-*.json'))
+    return {marker['index']: marker['attempt']
+            for marker in (json.loads(path.read_text())
+                           for path in markers)}
+
+
+def results(tmp_path) -> list[dict]:
+    with (tmp_path/'data'/'results.jsonl').open('r') as file:
+        return [json.loads(line) for line in file]
+
+
+def test_shards_are_run_and_merged_in_input_order(tmp_path):
+    summary = run(tmp_path, Resumes(tmp_path))
+
+    assert (summary['candidates'], summary['done'], summary['shards']) == (
+        6, 6, 3
+    )
+    assert attempts(tmp_path) == {0: 1, 1: 1, 2: 1}
+    assert [(record['position'], record['candidate_name'])
+            for record in results(tmp_path)] == list(enumerate(NAMES))
+    assert all(record['llm']['calls'] > 0 for record in results(tmp_path))
+
+
+def test_only_the_shard_of_a_dead_worker_is_run_again(tmp_path):
+    resumes = Resumes(tmp_path, crash_name='Edsger Dijkstra')
+    summary = run(tmp_path, resumes)
+
+    assert (summary['done'], summary['failed']) == (6, 0)
+    assert summary['retried_shards'] == 1
+    assert attempts(tmp_path) == {0: 1, 1: 2, 2: 1}
+    calls = resumes.calls()
+    assert calls['Edsger Dijkstra'] == 2
+    # The other shards were not run again
+    assert all(calls[name] == 1 for name in NAMES if name not in (
+        'Grace Hopper', 'Edsger Dijkstra'
+    ))
+    assert [record['candidate_name']
+            for record in results(tmp_path)] == list(NAMES)
+
+
+def test_done_shards_are_not_run_again(tmp_path):
+    resumes = Resumes(tmp_path)
+    run(tmp_path, resumes)
+    first = results(tmp_path)
+
+    summary = run(tmp_path, resumes)
+
+    assert resumes.calls() == Counter(NAMES)
+    assert summary['done'] == 6
+    assert results(tmp_path) == first
@@ -0,0 +1,149 @@
+import asyncio
+import threading
+import time
+
+from langchain.schema import HumanMessage
+import pytest
+
+from ai_interviewer import (
+    FakeBackend,
+    FileSink,
+    QueueSink,
+    set_llm_backend,
+    set_stream_hub,
+    streaming,
+    StreamHub,
+)
+from ai_interviewer.fake_llm import JOB_DESCRIPTION_TEXT
+from ai_interviewer.llm import create_chat_model
+from ai_interviewer.stages import Stage
+from ai_interviewer.streaming import Sink, StreamSession
+
+
+class ListSink(Sink):
+    """Keeps the chunks written, with the time they were"""
+
+    def __init__(self):
+        self.chunks = []
+        self.written = threading.Event()
+
+    def write(self, session, text):
+        self.chunks.append((session, text, time.monotonic()))
+        self.written.set()
+
+    def texts(self) -> list[str]:
+        return [text for _, text, _ in self.chunks]
+
+
+def test_a_sink_must_write():
+    with pytest.raises(TypeError):
+        Sink()
+
+
+def test_the_buffer_is_written_once_it_holds_max_chars():
+    sink = ListSink()
+    session = StreamSession('a', [sink], max_chars=10, max_delay=10.0)
+
+    session.write('abcd')
+    session.write('efgh')
+    assert sink.chunks == []
+    session.write('ijkl')
+
+    assert sink.texts() == ['abcdefghijkl']
+    session.write('mn')
+    session.flush()
+    assert sink.texts() == ['abcdefghijkl', 'mn']
+
+
+def test_the_buffer_is_written_max_delay_after_its_oldest_text():
+    sink = ListSink()
+    session = StreamSession('a', [sink], max_delay=0.05)
+
+    start = time.monotonic()
+    session.write('Hello')
+    session.write(' there')
+
+    # No token follows: the late flusher writes it
+    assert sink.written.wait(timeout=1.0)
+    assert sink.texts() == ['Hello there']
+    assert sink.chunks[0][2] - start >= 0.05
+
+
+def test_a_late_flush_waits_for_the_delay_of_the_new_text():
+    sink = ListSink()
+    session = StreamSession('a', [sink], max_delay=0.1)
+    session.write('a')
+    session.flush()
+    time.sleep(0.05)
+
+    start = time.monotonic()
+    # Still due at the deadline of 'a', which was flushed already
+    session.write('b')
+    time.sleep(0.2)
+
+    assert sink.texts() == ['a', 'b']
+    assert sink.chunks[1][2] - start >= 0.1
+
+
+def test_the_flusher_thread_stops_when_idle(monkeypatch):
+    monkeypatch.setattr(streaming, 'IDLE_TIMEOUT', 0.05)
+    monkeypatch.setattr(streaming, '_late_flusher', streaming._LateFlusher())
+    sink = ListSink()
+    session = StreamSession('a', [sink], max_delay=0.01)
+
+    session.write('a')
+    assert sink.written.wait(timeout=1.0)
+    time.sleep(0.2)
+
+    assert streaming._late_flusher._thread is None
+    sink.written.clear()
+    session.write('b')
+    assert sink.written.wait(timeout=1.0)
+
+
+def test_sessions_are_written_apart(tmp_path):
+    hub = StreamHub([FileSink(tmp_path/'{session}.txt')], max_delay=10.0)
+
+    for i in range(3):
+        hub.session('alan').write(f'Alan {i}. ')
+        hub.session('grace').write(f'Grace {i}. ')
+    hub.close()
+
+    assert (tmp_path/'alan.txt').read_text() == 'Alan 0. Alan 1. Alan 2. '
+    assert (tmp_path/'grace.txt').read_text() == (
+        'Grace 0. Grace 1. Grace 2. '
+    )
+
+
+def test_a_queue_sink_is_made_in_its_event_loop():
+    with pytest.raises(RuntimeError):
+        QueueSink(asyncio.Queue())
+
+    async def main():
+        queue = asyncio.Queue()
+        session = StreamSession('a', [QueueSink(queue)])
+        # From another thread, like the callbacks of sync calls
+        thread = threading.Thread(target=lambda: (session.write('Hi'),
+                                                  session.flush()))
+        thread.start()
+        thread.join()
+        return await asyncio.wait_for(queue.get(), timeout=1.0)
+
+    assert asyncio.run(main()) == ('a', 'Hi')
+
+
+def test_chat_models_stream_to_the_hub():
+    sink = ListSink()
+    hub = StreamHub([sink], limit=40)
+    set_stream_hub(hub)
+    set_llm_backend(FakeBackend())
+
+    create_chat_model(Stage.JOB_DESCRIPTION, streaming=True)(
+        [HumanMessage(content='Write a job description.')]
+    )
+
+    text = ''.join(sink.texts())
+    assert text.split() == JOB_DESCRIPTION_TEXT.split()
+    # Fewer writes than tokens
+    assert len(sink.chunks) < len(JOB_DESCRIPTION_TEXT.split(' '))
+    assert all(len(line) <= 40 for line in text.splitlines())
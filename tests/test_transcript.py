@@ -0,0 +1,113 @@
+import pytest
+
+from ai_interviewer import Transcript, Turn
+from ai_interviewer.transcript import split_blocks, TurnKind
+
+
+def turns() -> list[Turn]:
+    return [
+        Turn('Interviewer', TurnKind.QUESTION, 'Hi!', 'Ice breakers', 0),
+        Turn('Alan', TurnKind.ANSWER, 'Hello!', 'Ice breakers', 0),
+        Turn('Interviewer', TurnKind.QUESTION, 'A hard problem?',
+             'Creative Thinking', 1),
+        Turn('Alan', TurnKind.ANSWER, 'The billing migration.',
+             'Creative Thinking', 1),
+        Turn('Interviewer', TurnKind.FOLLOW_UP, 'What did you learn?',
+             'Creative Thinking', 1, follow_up_index=0),
+        Turn('Alan', TurnKind.ANSWER, 'To ask early.', 'Creative Thinking',
+             1, follow_up_index=0),
+        Turn('Interviewer', TurnKind.QUESTION, 'A conflict?', 'Teamwork', 2),
+        Turn('Alan', TurnKind.ANSWER, 'We talked it out.', 'Teamwork', 2),
+    ]
+
+
+def create_transcript(path=None) -> Transcript:
+    transcript = Transcript(short_types=('Creative Thinking', 'Teamwork'),
+                            path=path)
+    for turn in turns():
+        transcript.append(turn)
+    return transcript
+
+
+def test_render():
+    question, answer, _, _, follow_up, *_ = turns()
+
+    assert question.render() == '\n\nInterviewer:\nHi!'
+    assert answer.render() == '\n\nAlan:\nHello!'
+    assert (follow_up.render()
+            == '\n\nInterviewer follow-up:\nWhat did you learn?')
+
+
+def test_full_and_short_text():
+    transcript = create_transcript()
+
+    assert transcript.full_text == ''.join(turn.render() for turn in turns())
+    assert transcript.short_text == ''.join(turn.render()
+                                            for turn in turns()[2:])
+    # The cached views follow new turns
+    transcript.append(Turn('Interviewer', TurnKind.QUESTION, 'Bye!',
+                           'Wrap up', 3))
+    assert transcript.full_text.endswith('\n\nInterviewer:\nBye!')
+    assert not transcript.short_text.endswith('Bye!')
+
+
+def test_select():
+    transcript = create_transcript()
+
+    assert [turn.text for turn in transcript.select(
+        question_type='Creative Thinking',
+        kind=TurnKind.ANSWER
+    )] == ['The billing migration.', 'To ask early.']
+    assert [turn.text for turn in transcript.select(question_index=2)] == [
+        'A conflict?', 'We talked it out.'
+    ]
+    assert len(transcript.select()) == 8
+
+
+def test_blocks():
+    transcript = create_transcript()
+
+    blocks = transcript.blocks()
+
+    assert blocks == [
+        ''.join(turn.render() for turn in turns()[2:6]),
+        ''.join(turn.render() for turn in turns()[6:]),
+    ]
+    # The follow-ups stay in the block of their question
+    assert split_blocks(transcript.short_text) == blocks
+
+
+def test_turns_are_written_and_loaded(tmp_path):
+    path = tmp_path/'transcript.jsonl'
+    create_transcript(path)
+
+    loaded = Transcript.load(path, short_types=('Teamwork',))
+
+    assert loaded.turns == turns()
+    assert loaded.short_text == ''.join(turn.render()
+                                        for turn in turns()[6:])
+
+
+def test_reload_keeps_the_first_turns(tmp_path):
+    path = tmp_path/'transcript.jsonl'
+    create_transcript(path)
+    transcript = Transcript(path=path)
+
+    transcript.reload(3)
+
+    assert transcript.turns == turns()[:3]
+    # The turns after them are dropped from the file
+    assert Transcript.load(path).turns == turns()[:3]
+    transcript.append(turns()[3])
+    assert Transcript.load(path).turns == turns()[:4]
+
+
+def test_reload_from_a_short_file_fails(tmp_path):
+    path = tmp_path/'transcript.jsonl'
+    create_transcript(path)
+    transcript = Transcript(path=path)
+
+    with pytest.raises(ValueError):
+        transcript.reload(9)
+    # The file is left as it was
+    assert Transcript.load(path).turns == turns()